@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark: threaded vs asyncio CollaborationServer
+
+Starts the server in a child process for each mode, connects N simulated
+clients (control + chat connection each) and broadcasts chat messages.
+Reports server threads, resident memory, CPU seconds per delivered message
+and fan-out latency, so the two modes can be compared per core.
+
+Usage: python3 benchmarks/bench_server_modes.py [--clients 50,200,500] [--rounds 50]
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def raise_fd_limit():
+    """Allow enough sockets for a few hundred clients"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def run_server(config_path: str, workdir: str):
+    """Child process target: run the server until terminated"""
+    raise_fd_limit()
+    os.chdir(workdir)
+    sys.stdout = open(os.devnull, 'w')
+    
+    from src.server import create_server
+    
+    server = create_server(config_path)
+    server.start()
+    while True:
+        time.sleep(1)
+
+
+def proc_stats(pid: int) -> dict:
+    """Read thread count, RSS and CPU time of a process from /proc"""
+    stats = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('Threads:'):
+                stats['threads'] = int(line.split()[1])
+            elif line.startswith('VmRSS:'):
+                stats['rss_mb'] = int(line.split()[1]) / 1024
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    stats['cpu_s'] = (int(fields[11]) + int(fields[12])) / ticks
+    return stats
+
+
+async def connect_client(host: str, ports: dict, index: int):
+    """Open the control and chat connections of one simulated client"""
+    reader, writer = await asyncio.open_connection(host, ports['control_port'])
+    info = {'client_id': f"bench-{index:05d}", 'username': f"user{index}"}
+    writer.write(json.dumps(info).encode('utf-8'))
+    await writer.drain()
+    await reader.read(65536)
+    
+    chat_reader, chat_writer = await asyncio.open_connection(host, ports['chat_port'])
+    return (reader, writer, chat_reader, chat_writer)
+
+
+async def drain_control(reader):
+    """Discard join/leave broadcasts so control buffers never fill"""
+    try:
+        while await reader.read(65536):
+            pass
+    except Exception:
+        pass
+
+
+async def run_load(host: str, ports: dict, num_clients: int, rounds: int, pid: int) -> dict:
+    """Connect clients, broadcast chat messages and measure the server"""
+    clients = []
+    for i in range(num_clients):
+        clients.append(await connect_client(host, ports, i))
+    drainers = [asyncio.create_task(drain_control(c[0])) for c in clients]
+    await asyncio.sleep(1.0)
+    
+    before = proc_stats(pid)
+    latencies = []
+    payload = b'x' * 200 + b'\n'
+    
+    for r in range(rounds):
+        sender = clients[r % num_clients]
+        receivers = [c for c in clients if c is not sender]
+        
+        start = time.perf_counter()
+        sender[3].write(payload)
+        await sender[3].drain()
+        await asyncio.gather(*(c[2].readexactly(len(payload)) for c in receivers))
+        latencies.append(time.perf_counter() - start)
+    
+    after = proc_stats(pid)
+    
+    for task in drainers:
+        task.cancel()
+    for reader, writer, chat_reader, chat_writer in clients:
+        writer.close()
+        chat_writer.close()
+    
+    delivered = rounds * (num_clients - 1)
+    latencies.sort()
+    return {
+        'threads': after['threads'],
+        'rss_mb': after['rss_mb'],
+        'cpu_us_per_msg': (after['cpu_s'] - before['cpu_s']) / delivered * 1e6,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def bench_mode(mode: str, num_clients: int, rounds: int, base_port: int) -> dict:
+    """Run one mode at one client count in a fresh server process"""
+    ports = {
+        'video_port': base_port,
+        'audio_port': base_port + 1,
+        'screen_port': base_port + 2,
+        'chat_port': base_port + 3,
+        'file_port': base_port + 4,
+        'control_port': base_port + 5,
+    }
+    config = {'server': dict(host='127.0.0.1', mode=mode, **ports)}
+    
+    workdir = tempfile.mkdtemp(prefix='bench_server_')
+    config_path = os.path.join(workdir, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+    
+    proc = multiprocessing.Process(target=run_server, args=(config_path, workdir), daemon=True)
+    proc.start()
+    time.sleep(1.5)
+    
+    try:
+        return asyncio.run(run_load('127.0.0.1', ports, num_clients, rounds, proc.pid))
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--clients', default='50,200,500',
+                        help='comma separated client counts')
+    parser.add_argument('--rounds', type=int, default=50,
+                        help='chat broadcasts per measurement')
+    parser.add_argument('--base-port', type=int, default=16000)
+    args = parser.parse_args()
+    
+    raise_fd_limit()
+    counts = [int(c) for c in args.clients.split(',')]
+    
+    print(f"{'mode':<10}{'clients':>8}{'threads':>9}{'rss MB':>9}"
+          f"{'cpu us/msg':>12}{'p50 ms':>9}{'p99 ms':>9}")
+    
+    port = args.base_port
+    for num_clients in counts:
+        for mode in ('threaded', 'asyncio'):
+            result = bench_mode(mode, num_clients, args.rounds, port)
+            port += 10
+            print(f"{mode:<10}{num_clients:>8}{result['threads']:>9}{result['rss_mb']:>9.1f}"
+                  f"{result['cpu_us_per_msg']:>12.1f}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
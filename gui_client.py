@@ -20,7 +20,7 @@ import sys
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.video_conferencing import VideoCapture, VideoStreamer
+from src.video_conferencing import VideoCapture, VideoStreamer, VideoPipeline
 from src.audio_conferencing import AudioCapture, AudioPlayback, AudioStreamer
 from src.text_chat import ChatManager, MessageHandler
 from src.screen_sharing import ScreenCapture, ScreenStreamer
@@ -119,13 +119,16 @@ class LoginDialog:
 class ClientVideoBox(tk.Frame):
     """Video box for each client in the grid"""
     
-    def __init__(self, parent, client_id, username):
+    def __init__(self, parent, client_id, username, pinned=False, on_pin=None):
         super().__init__(parent, bg="#2c3e50", relief=tk.RAISED, borderwidth=2)
         
         self.client_id = client_id
         self.username = username
+        self.pinned = pinned
+        self.on_pin = on_pin  # Called with client_id when the name bar is double-clicked
         self.video_label = None
         self.name_label = None
+        self.display_size = None  # (width, height) frames are shown at, read by the receiver
         
         self._create_widgets()
         
@@ -133,13 +136,15 @@ class ClientVideoBox(tk.Frame):
         # Name label at top
         self.name_label = tk.Label(
             self,
-            text=self.username,
+            text=f"📌 {self.username}" if self.pinned else self.username,
             bg="#34495e",
             fg="white",
             font=("Arial", 10, "bold"),
             pady=5
         )
         self.name_label.pack(fill=tk.X)
+        if self.on_pin:
+            self.name_label.bind("<Double-Button-1>", lambda e: self.on_pin(self.client_id))
         
         # Video display area
         self.video_label = tk.Label(self, bg="#000000")
@@ -147,6 +152,10 @@ class ClientVideoBox(tk.Frame):
         
         # Show placeholder initially
         self._show_placeholder()
+    
+    def set_speaking(self, speaking: bool):
+        """Highlight the name bar while this participant is the dominant speaker"""
+        self.name_label.config(bg="#27ae60" if speaking else "#34495e")
         
     def _show_placeholder(self):
         """Show placeholder when no video"""
@@ -188,6 +197,8 @@ class ClientVideoBox(tk.Frame):
             label_height = self.video_label.winfo_height()
             
             if label_width > 1 and label_height > 1:
+                self.display_size = (label_width, label_height)
+                
                 # Resize maintaining aspect ratio
                 height, width = frame.shape[:2]
                 scale_w = label_width / width
@@ -240,12 +251,21 @@ class CollaborationGUI:
         # Components
         self.video_capture = None
         self.video_streamer = None
+        self.video_pipeline = None
+        self.video_receiver = None
         self.audio_capture = None
         self.audio_playback = None
         self.audio_streamer = None
         
         # Client tracking
         self.clients = {}  # client_id -> {username, video_box}
+        self.stream_id = 0  # Numeric media stream ID assigned by the server
+        self.audio_codec = 'pcm16'  # Audio codec the server picked at join
+        self.stream_owners = {}  # stream_id -> client_id, for incoming media headers
+        self.pinned = set()  # client_ids kept on every gallery page
+        self.gallery_page = 0
+        self.subscribed = None  # (streams, pinned, max_fps, transcode) last sent in a subscribe message
+        self.dominant_client = None  # client_id of the current dominant speaker
         self.video_frames = queue.Queue()  # Queue of (client_id, frame) tuples
         
         # Queues
@@ -282,7 +302,8 @@ class CollaborationGUI:
                     "file_port": 5004,
                     "control_port": 5005
                 },
-                "video": {"resolution": [640, 480], "fps": 30, "quality": 80},
+                "video": {"resolution": [640, 480], "fps": 30, "quality": 80,
+                          "gallery_page_size": 9},
                 "audio": {"sample_rate": 44100, "channels": 1, "chunk_size": 2048}
             }
         
@@ -390,6 +411,33 @@ class CollaborationGUI:
         )
         self.file_btn.pack(side=tk.LEFT, padx=3)
         
+        # Gallery paging (only senders on the visible page are forwarded to us)
+        self.prev_page_btn = tk.Button(
+            btn_frame,
+            text="◀",
+            command=lambda: self.change_page(-1),
+            bg="#7f8c8d",
+            fg="white",
+            state=tk.DISABLED,
+            **btn_config
+        )
+        self.prev_page_btn.pack(side=tk.LEFT, padx=3)
+        
+        self.page_label = tk.Label(btn_frame, text="", bg="#34495e", fg="white",
+                                   font=("Arial", 10, "bold"))
+        self.page_label.pack(side=tk.LEFT, padx=3)
+        
+        self.next_page_btn = tk.Button(
+            btn_frame,
+            text="▶",
+            command=lambda: self.change_page(1),
+            bg="#7f8c8d",
+            fg="white",
+            state=tk.DISABLED,
+            **btn_config
+        )
+        self.next_page_btn.pack(side=tk.LEFT, padx=3)
+        
         # Main content area
         print("[_create_gui] Creating main content area...")
         main_frame = tk.Frame(self.root)
@@ -581,7 +629,8 @@ class CollaborationGUI:
             # Send client info
             info = {
                 'client_id': self.client_id,
-                'username': self.username
+                'username': self.username,
+                'audio_codecs': self.config['audio'].get('codecs', ['pcm16'])
             }
             self.control_socket.sendall(json.dumps(info).encode('utf-8'))
             
@@ -590,8 +639,12 @@ class CollaborationGUI:
             response = json.loads(data.decode('utf-8'))
             
             if response.get('status') == 'connected':
+                self.stream_id = response.get('stream_id', 0)
+                self.audio_codec = response.get('audio_codec', 'pcm16')
+                
                 # Add other clients to grid
                 for client in response.get('clients', []):
+                    self.stream_owners[client.get('stream_id')] = client['client_id']
                     if client['client_id'] != self.client_id:
                         self.clients[client['client_id']] = {
                             'username': client['username'],
@@ -628,6 +681,7 @@ class CollaborationGUI:
             except:
                 pass
             self.control_socket = None
+        self.subscribed = None
     
     def handle_control_messages(self):
         """Handle control messages from server"""
@@ -660,9 +714,12 @@ class CollaborationGUI:
                     client_id = message.get('client_id')
                     username = message.get('username')
                     
+                    stream_id = message.get('stream_id')
+                    
                     print(f"[CLIENT] Received {action} notification for {username} (ID: {client_id})")
                     
                     if action == 'joined':
+                        self.stream_owners[stream_id] = client_id
                         if client_id not in self.clients:
                             print(f"[CLIENT] Adding {username} to clients list")
                             self.clients[client_id] = {
@@ -675,6 +732,9 @@ class CollaborationGUI:
                             print(f"[CLIENT] {username} already in clients list")
                         
                     elif action == 'left':
+                        self.stream_owners.pop(stream_id, None)
+                        if self.video_receiver:
+                            self.video_receiver.set_display_size(stream_id, None)
                         if client_id in self.clients:
                             user = self.clients[client_id]['username']
                             print(f"[CLIENT] Removing {user} from clients list")
@@ -682,6 +742,16 @@ class CollaborationGUI:
                             self._update_video_grid()
                             self._display_chat_message(f"*** {user} left the session ***")
                 
+                elif msg_type == 'dominant_speaker':
+                    # Highlight whoever the server hears most
+                    speaker = self.stream_owners.get(message.get('stream_id'))
+                    if speaker != self.dominant_client:
+                        for client_id in (self.dominant_client, speaker):
+                            video_box = self.clients.get(client_id, {}).get('video_box')
+                            if video_box:
+                                video_box.set_speaking(client_id == speaker)
+                        self.dominant_client = speaker
+                
                 elif msg_type == 'file_notification':
                     file_id = message.get('file_id')
                     filename = message.get('filename')
@@ -712,7 +782,12 @@ class CollaborationGUI:
         for widget in self.video_container.winfo_children():
             widget.destroy()
         
-        num_clients = len(self.clients)
+        for client_info in self.clients.values():
+            client_info['video_box'] = None
+        
+        shown = self._visible_clients()
+        self._send_subscriptions(shown)
+        num_clients = len(shown)
         if num_clients == 0:
             return
         
@@ -721,8 +796,8 @@ class CollaborationGUI:
         rows = int(np.ceil(num_clients / cols))
         
         # Create grid
-        client_list = list(self.clients.items())
-        for idx, (client_id, client_info) in enumerate(client_list):
+        for idx, client_id in enumerate(shown):
+            client_info = self.clients[client_id]
             row = idx // cols
             col = idx % cols
             
@@ -730,8 +805,12 @@ class CollaborationGUI:
             video_box = ClientVideoBox(
                 self.video_container,
                 client_id,
-                client_info['username']
+                client_info['username'],
+                pinned=client_id in self.pinned,
+                on_pin=self.toggle_pin
             )
+            if client_id == self.dominant_client:
+                video_box.set_speaking(True)
             
             video_box.grid(
                 row=row,
@@ -749,6 +828,66 @@ class CollaborationGUI:
             self.video_container.grid_rowconfigure(i, weight=1)
         for i in range(cols):
             self.video_container.grid_columnconfigure(i, weight=1)
+    
+    def _visible_clients(self) -> list:
+        """client_ids on the current gallery page, pinned participants first"""
+        page_size = max(1, self.config['video'].get('gallery_page_size', 9))
+        self.pinned &= set(self.clients)
+        pinned = [cid for cid in self.clients if cid in self.pinned]
+        others = [cid for cid in self.clients if cid not in self.pinned]
+        
+        slots = max(1, page_size - len(pinned))
+        pages = max(1, int(np.ceil(len(others) / slots)))
+        self.gallery_page = min(self.gallery_page, pages - 1)
+        
+        self.page_label.config(text=f"{self.gallery_page + 1}/{pages}" if pages > 1 else "")
+        self.prev_page_btn.config(state=tk.NORMAL if self.gallery_page > 0 else tk.DISABLED)
+        self.next_page_btn.config(state=tk.NORMAL if self.gallery_page < pages - 1 else tk.DISABLED)
+        
+        start = self.gallery_page * slots
+        return pinned + others[start:start + slots]
+    
+    def _send_subscriptions(self, shown: list):
+        """Ask the relay to forward video only from the senders we show"""
+        owners = {cid: sid for sid, cid in self.stream_owners.items()}
+        streams = sorted(owners[cid] for cid in shown if cid != self.client_id and cid in owners)
+        pinned = sorted(owners[cid] for cid in self.pinned if cid in owners)
+        
+        # Thin clients cap every sender but the pinned ones
+        cap = self.config['video'].get('receive_max_fps', 0)
+        max_fps = {str(s): cap for s in streams if s not in pinned} if cap else {}
+        
+        if self.video_receiver:
+            for stream_id, client_id in self.stream_owners.items():
+                if client_id not in shown:
+                    self.video_receiver.set_display_size(stream_id, None)
+            self.video_receiver.thinned_streams = {int(s) for s in max_fps}
+        
+        # Slow machines can have the relay transcode every sender to a smaller variant
+        transcode = self.config['video'].get('receive_transcode')
+        
+        if self.control_socket is None or (streams, pinned, max_fps, transcode) == self.subscribed:
+            return
+        try:
+            message = {'type': 'subscribe', 'streams': streams, 'pinned': pinned,
+                       'max_fps': max_fps, 'transcode': transcode}
+            self.control_socket.sendall((json.dumps(message) + '\n').encode('utf-8'))
+            self.subscribed = (streams, pinned, max_fps, transcode)
+        except Exception as e:
+            print(f"Error sending subscriptions: {e}")
+    
+    def change_page(self, delta: int):
+        """Show the previous or next page of the gallery"""
+        self.gallery_page = max(0, self.gallery_page + delta)
+        self._update_video_grid()
+    
+    def toggle_pin(self, client_id):
+        """Keep a participant on every gallery page, or stop doing so"""
+        if client_id in self.pinned:
+            self.pinned.discard(client_id)
+        else:
+            self.pinned.add(client_id)
+        self._update_video_grid()
             
     def update_gui(self):
         """Periodic GUI update - 30 FPS"""
@@ -790,7 +929,9 @@ class CollaborationGUI:
             # Start video
             self.video_capture = VideoCapture(
                 resolution=tuple(self.config['video']['resolution']),
-                fps=self.config['video']['fps']
+                fps=self.config['video']['fps'],
+                passthrough=self.config['video'].get('mjpeg_passthrough', False),
+                buffers=self.config['video'].get('capture_buffers', 0)
             )
             
             if self.video_capture.start():
@@ -800,13 +941,32 @@ class CollaborationGUI:
                 # Start video streamer
                 self.video_streamer = VideoStreamer(
                     quality=self.config['video']['quality'],
-                    client_id=self.client_id
+                    client_id=self.client_id,
+                    stream_id=self.stream_id,
+                    payload_size=self.config['video'].get('payload_size', 1200),
+                    fps=self.config['video']['fps'],
+                    pacing=self.config['video'].get('pacing', True),
+                    pacing_burst=self.config['video'].get('pacing_burst_bytes', 12000),
+                    fec_group_size=self.config['video'].get('fec_group_size', 0),
+                    abr=self.config['video'].get('abr', False),
+                    codec=self.config['video'].get('codec', 'MJPEG'),
+                    tile_size=self.config['video'].get('tile_size', 32),
+                    tile_threshold=self.config['video'].get('tile_threshold', 6.0),
+                    keyframe_interval=self.config['video'].get('keyframe_interval', 2.0),
+                    simulcast_layers=self.config['video'].get('simulcast_layers', 1)
                 )
                 self.video_streamer.setup_sender()
                 
-                # Start sending thread
-                thread = threading.Thread(target=self.send_video_loop, daemon=True)
-                thread.start()
+                # Start capture -> encode -> send pipeline
+                self.video_pipeline = VideoPipeline(
+                    self.video_capture,
+                    self.video_streamer,
+                    (self.server_ip, self.config['server']['video_port']),
+                    workers=self.config['video'].get('encoder_workers', 2),
+                    queue_size=self.config['video'].get('pipeline_queue', 4),
+                    on_frame=self.show_own_frame
+                )
+                self.video_pipeline.start()
                 
                 # Receiver already started in join_session
                 
@@ -816,6 +976,9 @@ class CollaborationGUI:
         else:
             # Stop video
             self.video_enabled = False
+            if self.video_pipeline:
+                self.video_pipeline.stop()
+                self.video_pipeline = None
             if self.video_capture:
                 self.video_capture.stop()
                 self.video_capture = None
@@ -832,37 +995,47 @@ class CollaborationGUI:
                 if video_box:
                     video_box._show_placeholder()
                     
-    def send_video_loop(self):
-        """Continuously send video frames"""
-        server_addr = (self.server_ip, self.config['server']['video_port'])
-        
-        while self.video_enabled and self.session_active:
-            frame = self.video_capture.read()
-            if frame is not None:
-                # Also update own video box
-                if self.client_id in self.clients:
-                    self.video_frames.put((self.client_id, frame.copy()))
-                
-                # Send to server
-                self.video_streamer.send_frame(frame, server_addr)
-            time.sleep(0.033)  # ~30 FPS
+    def show_own_frame(self, frame):
+        """Pipeline capture callback: update own video box"""
+        if self.client_id in self.clients:
+            self.video_frames.put((self.client_id, frame))
+            
+            # Passthrough frames are decoded only as large as the box
+            video_box = self.clients[self.client_id].get('video_box')
+            if video_box and self.video_pipeline:
+                self.video_pipeline.preview_size = video_box.display_size
     
     def receive_video_loop(self):
         """Continuously receive video frames from server"""
         try:
-            recv_streamer = VideoStreamer(client_id=self.client_id)
+            recv_streamer = VideoStreamer(
+                client_id=self.client_id,
+                stream_id=self.stream_id,
+                nack=self.config['video'].get('nack', True),
+                abr=self.config['video'].get('abr', False),
+                report_interval=self.config['video'].get('report_interval', 1.0)
+            )
             recv_streamer.setup_receiver('0.0.0.0', self.config['server']['video_port'])
+            if self.subscribed:
+                recv_streamer.thinned_streams = {int(s) for s in self.subscribed[2]}
+            self.video_receiver = recv_streamer
             
             print("[VIDEO_RECV] Video receiver started")
             
             while self.session_active:  # Keep receiving as long as session is active
                 result = recv_streamer.receive_frame()
                 if result:
-                    sender_id, frame = result
+                    stream_id, frame = result
+                    sender_id = self.stream_owners.get(stream_id)
                     if sender_id and sender_id != self.client_id:
                         print(f"[VIDEO_RECV] Received frame from {sender_id}")
                         self.video_frames.put((sender_id, frame))
                         
+                        # Decode the next frame only as large as its video box
+                        video_box = self.clients.get(sender_id, {}).get('video_box')
+                        if video_box and video_box.display_size:
+                            recv_streamer.set_display_size(stream_id, video_box.display_size)
+                        
         except Exception as e:
             print(f"Error receiving video: {e}")
     
@@ -889,7 +1062,8 @@ class CollaborationGUI:
             self.audio_btn.config(text="Mute", bg="#e74c3c")
             
             # Start audio streamer
-            self.audio_streamer = AudioStreamer(client_id=self.client_id)
+            self.audio_streamer = AudioStreamer(client_id=self.client_id, stream_id=self.stream_id,
+                                                codec=self.audio_codec)
             self.audio_streamer.setup_sender()
             
             # Start sending thread
@@ -4,8 +4,16 @@ Collaboration Suite - A comprehensive real-time collaboration platform
 
 __version__ = '0.1.0'
 
-# Import main components for easy access
-from .client import CollaborationClient
-from .server import CollaborationServer
-
 __all__ = ['CollaborationClient', 'CollaborationServer']
+
+
+def __getattr__(name):
+    # Main components load on first use, so the server does not pull in the
+    # client's capture devices (PyAudio, OpenCV)
+    if name == 'CollaborationClient':
+        from .client import CollaborationClient
+        return CollaborationClient
+    if name == 'CollaborationServer':
+        from .server import CollaborationServer
+        return CollaborationServer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,379 @@
+import asyncio
+import socket
+import threading
+import json
+import struct
+from typing import Optional, Tuple
+
+if __package__:
+    from .server import CollaborationServer
+    from .utils.outbound import AsyncOutboundWriter, STREAM_CHAT, STREAM_SCREEN
+    from .utils.media_header import peek_stream_id, is_feedback
+else:
+    # Run directly: import through the project root
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from src.server import CollaborationServer
+    from src.utils.outbound import AsyncOutboundWriter, STREAM_CHAT, STREAM_SCREEN
+    from src.utils.media_header import peek_stream_id, is_feedback
+
+
+class _VideoRelayProtocol(asyncio.DatagramProtocol):
+    """Datagram endpoint relaying video packets on the event loop"""
+    
+    def __init__(self, server: 'AsyncCollaborationServer'):
+        self.server = server
+        self.transport = None
+    
+    def connection_made(self, transport):
+        self.transport = transport
+    
+    def datagram_received(self, data: bytes, addr: Tuple):
+        if is_feedback(data):
+            for packet, dest in self.server.handle_video_feedback(data, addr):
+                self.transport.sendto(packet, dest)
+            return
+        
+        for dest in self.server.route_video_packet(data, addr):
+            try:
+                self.transport.sendto(data, dest)
+            except Exception:
+                pass
+
+
+class _AudioRelayProtocol(asyncio.DatagramProtocol):
+    """Datagram endpoint buffering audio packets for the mixing task"""
+    
+    def __init__(self, server: 'AsyncCollaborationServer'):
+        self.server = server
+        self.transport = None
+    
+    def connection_made(self, transport):
+        self.transport = transport
+    
+    def datagram_received(self, data: bytes, addr: Tuple):
+        self.server.buffer_audio_packet(data, addr)
+
+
+class AsyncCollaborationServer(CollaborationServer):
+    """Collaboration server running every service on a single asyncio event loop
+    
+    Uses the same session state and packet handling as CollaborationServer,
+    but connections are coroutines instead of threads, so the server holds
+    one OS thread no matter how many clients join.
+    """
+    
+    def __init__(self, config_path: str = "configs/config.json", config: Optional[dict] = None):
+        super().__init__(config_path, config)
+        
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread = None
+        self.started = threading.Event()
+        self.stop_event: Optional[asyncio.Event] = None
+        
+        self.servers = []
+        self.transports = []
+        self.video_transport = None
+        self.audio_transport = None
+        self.chat_writers = set()
+        self.screen_writers = set()
+    
+    def start(self):
+        """Start the event loop and all services in a background thread"""
+        print("Starting Collaboration Server (asyncio mode)...")
+        
+        self.running = True
+        if self.video_transcoder:
+            self.video_transcoder.start()
+        self.loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.loop_thread.start()
+        self.started.wait(timeout=5.0)
+        
+        print(f"Server running on {self.config['server']['host']}")
+        print(f"Control Port: {self.config['server']['control_port']}")
+        print(f"Video Port: {self.config['server']['video_port']}")
+        print(f"Audio Port: {self.config['server']['audio_port']}")
+        print(f"Chat Port: {self.config['server']['chat_port']}")
+        print(f"File Port: {self.config['server']['file_port']}")
+    
+    def _run_loop(self):
+        """Thread target owning the event loop"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.serve())
+        finally:
+            self.loop.close()
+    
+    async def serve(self):
+        """Open all listeners and run until stop() is called"""
+        self.stop_event = asyncio.Event()
+        host = self.config['server']['host']
+        ports = self.config['server']
+        
+        try:
+            for handler, port, name in [
+                (self.handle_control_stream, ports['control_port'], "Control"),
+                (self.handle_chat_stream, ports['chat_port'], "Chat"),
+                (self.handle_screen_stream, ports['screen_port'], "Screen sharing"),
+                (self.handle_file_stream, ports['file_port'], "File"),
+            ]:
+                server = await asyncio.start_server(handler, host, port, reuse_address=True)
+                self.servers.append(server)
+                print(f"{name} server started")
+            
+            loop = asyncio.get_running_loop()
+            for protocol, port, name in [
+                (_VideoRelayProtocol, ports['video_port'], "Video relay"),
+                (_AudioRelayProtocol, ports['audio_port'], "Audio relay"),
+            ]:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2097152)  # 2MB buffer
+                sock.bind((host, port))
+                transport, endpoint = await loop.create_datagram_endpoint(
+                    lambda protocol=protocol: protocol(self), sock=sock
+                )
+                self.transports.append(transport)
+                print(f"{name} started")
+            
+            self.video_transport, self.audio_transport = self.transports
+            mix_task = asyncio.create_task(self.mix_audio_loop())
+        except Exception as e:
+            print(f"Error starting asyncio server: {e}")
+            self.started.set()
+            return
+        
+        self.started.set()
+        await self.stop_event.wait()
+        
+        pending = [mix_task] + list(self.outbound.tasks.values())
+        mix_task.cancel()
+        self.outbound.stop()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for server in self.servers:
+            server.close()
+        for transport in self.transports:
+            transport.close()
+        for writer in list(self.chat_writers) + list(self.screen_writers):
+            writer.close()
+    
+    def send_transcoded(self, packets: list, dests: tuple):
+        """Hand a transcoded frame from the pool's thread to the event loop"""
+        if self.video_transport is None or not self.running:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._send_datagrams, packets, dests)
+        except RuntimeError:
+            pass  # Loop already closed
+    
+    def _send_datagrams(self, packets: list, dests: tuple):
+        self.cache_transcoded(packets)
+        for dest in dests:
+            for packet in packets:
+                try:
+                    self.video_transport.sendto(packet, dest)
+                except Exception:
+                    pass
+    
+    async def mix_audio_loop(self):
+        """Mix buffered audio and broadcast it once per chunk duration"""
+        while self.running:
+            # The clock's schedule absorbs the event loop's wake-up delays
+            await asyncio.sleep(self.audio_clock.delay())
+            self.audio_clock.tick()
+            self.update_speakers()
+            for packet, dests in self.mix_pending_audio():
+                for dest in dests:
+                    try:
+                        self.audio_transport.sendto(packet, dest)
+                    except Exception:
+                        pass
+    
+    def create_outbound_writer(self):
+        """Use event-loop send queues instead of the writer thread"""
+        network = self.config.get('network', {})
+        return AsyncOutboundWriter(
+            max_bytes=network.get('send_queue_bytes', 4 * 1024 * 1024),
+            slow_timeout=network.get('slow_consumer_timeout', 5.0)
+        )
+    
+    async def handle_control_stream(self, reader: asyncio.StreamReader,
+                                    writer: asyncio.StreamWriter):
+        """Handle the control connection of one client"""
+        addr = writer.get_extra_info('peername')
+        client_id = None
+        
+        try:
+            # Receive client info
+            data = await reader.read(4096)
+            if data:
+                info = json.loads(data.decode('utf-8'))
+                client_id = info.get('client_id')
+                username = info.get('username')
+                
+                stream_id = self.register_client(client_id, username, addr, writer,
+                                                 info.get('audio_codecs'))
+                
+                # Send acknowledgment with client list
+                self.send_control(writer, self.build_connect_response(client_id))
+                
+                # Broadcast new client to others
+                self.broadcast_client_update('joined', client_id, username, stream_id)
+                
+                print(f"Client connected: {username} ({client_id})")
+            
+            # Keep connection alive for control messages
+            while self.running:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                
+                self.process_control_message(client_id, data)
+        
+        except Exception as e:
+            print(f"Error handling control client: {e}")
+        finally:
+            if client_id:
+                self.unregister_client(client_id)
+            writer.close()
+    
+    async def handle_chat_stream(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter):
+        """Relay chat bytes from one client to every other chat client"""
+        self.outbound.register(writer)
+        self.chat_writers.add(writer)
+        try:
+            while self.running:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                
+                for client_writer in list(self.chat_writers):
+                    if client_writer is not writer:
+                        self.outbound.send(client_writer, data, STREAM_CHAT)
+        except Exception:
+            pass
+        finally:
+            self.outbound.unregister(writer)
+            self.chat_writers.discard(writer)
+            writer.close()
+    
+    async def handle_screen_stream(self, reader: asyncio.StreamReader,
+                                   writer: asyncio.StreamWriter):
+        """Relay length-prefixed screen frames to every other screen client"""
+        self.outbound.register(writer)
+        self.screen_writers.add(writer)
+        try:
+            while self.running:
+                size_data = await reader.readexactly(4)
+                data_size = struct.unpack('!I', size_data)[0]
+                data = await reader.readexactly(data_size)
+                
+                if peek_stream_id(data) is None:
+                    continue
+                
+                frame = size_data + data
+                for client_writer in list(self.screen_writers):
+                    if client_writer is not writer:
+                        self.outbound.send(client_writer, frame, STREAM_SCREEN)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.outbound.unregister(writer)
+            self.screen_writers.discard(writer)
+            writer.close()
+    
+    async def handle_file_stream(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter):
+        """Handle one file upload, download or list request"""
+        try:
+            cmd_data = await reader.read(1024)
+            if not cmd_data:
+                return
+            
+            command = json.loads(cmd_data.decode('utf-8'))
+            cmd_type = command.get('type')
+            
+            if cmd_type == 'upload':
+                file_id = command.get('file_id')
+                filename = command.get('filename')
+                filesize = command.get('filesize')
+                uploader = command.get('uploader')
+                
+                filepath = self.files_dir / f"{file_id}_{filename}"
+                received = 0
+                
+                with open(filepath, 'wb') as f:
+                    while received < filesize:
+                        chunk = await reader.read(min(filesize - received, 65536))
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        received += len(chunk)
+                
+                self.register_shared_file(file_id, filename, filesize, filepath, uploader)
+                
+                response = {'status': 'success', 'message': 'File uploaded'}
+                writer.write(json.dumps(response).encode('utf-8'))
+            
+            elif cmd_type == 'download':
+                file_id = command.get('file_id')
+                
+                if file_id in self.shared_files:
+                    file_info = self.shared_files[file_id]
+                    filepath = file_info['path']
+                    
+                    with open(filepath, 'rb') as f:
+                        f.seek(0, 2)
+                        filesize = f.tell()
+                        f.seek(0)
+                        
+                        response = {
+                            'status': 'success',
+                            'size': filesize,
+                            'filename': file_info['filename']
+                        }
+                        writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                        await writer.drain()
+                        
+                        # Wait for ready signal
+                        await reader.read(1024)
+                        
+                        while True:
+                            chunk = f.read(65536)
+                            if not chunk:
+                                break
+                            writer.write(chunk)
+                            await writer.drain()
+                else:
+                    response = {'status': 'error', 'message': 'File not found'}
+                    writer.write(json.dumps(response).encode('utf-8'))
+            
+            elif cmd_type == 'list':
+                response = {'status': 'success', 'files': self.list_shared_files()}
+                writer.write(json.dumps(response).encode('utf-8'))
+            
+            await writer.drain()
+        
+        except Exception as e:
+            print(f"Error handling file client: {e}")
+        finally:
+            writer.close()
+    
+    def stop(self):
+        """Stop the event loop and close all listeners"""
+        print("\nStopping server...")
+        self.running = False
+        if self.video_transcoder:
+            self.video_transcoder.close()
+        
+        if self.loop and self.stop_event and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self.stop_event.set)
+            except RuntimeError:
+                pass
+        if self.loop_thread:
+            self.loop_thread.join(timeout=2.0)
+        
+        print("Server stopped")
@@ -1,5 +1,13 @@
-from .audio_capture import AudioCapture, AudioPlayback
 from .audio_stream import AudioStreamer
 from .audio_mixer import AudioMixer
+from .jitter_buffer import JitterBuffer
 
-__all__ = ['AudioCapture', 'AudioPlayback', 'AudioStreamer', 'AudioMixer']
+__all__ = ['AudioCapture', 'AudioPlayback', 'AudioStreamer', 'AudioMixer', 'JitterBuffer']
+
+
+def __getattr__(name):
+    # Capture and playback need PyAudio (PortAudio); the relay only mixes
+    if name in ('AudioCapture', 'AudioPlayback'):
+        from . import audio_capture
+        return getattr(audio_capture, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
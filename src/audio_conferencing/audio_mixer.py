@@ -1,40 +1,208 @@
+import threading
 import numpy as np
-from typing import Optional
+from typing import Dict, List, Tuple
 
 class AudioMixer:
-    """Mixes multiple audio streams"""
+    """Mix-minus mixing engine for the audio relay
     
-    def __init__(self):
-        self.streams = {}
+    Every participant is both a sender and a listener and owns one row of
+    a preallocated int32 frame matrix and of a listener x sender gain
+    matrix (Q8 fixed point, UNITY = 1.0). Senders' frames for the current
+    tick are written into their rows with put(); mix() then computes every
+    listener's output in a single matrix product. A listener's own column
+    is always zero, so nobody hears themselves, and per-listener gains and
+    mutes are just other entries of the matrix. Listeners whose gain rows
+    over this tick's senders are equal get the same mix, which is computed
+    and encoded once and returned with all of them.
+    
+    With top_n set only the top_n loudest senders of a tick are mixed, by
+    RMS over their frames, smoothed across ticks. A sender outside them
+    takes the place of the quietest one only once it is switch_margin_db
+    louder, so two similar voices do not flap in and out. Open microphones
+    beyond the N then cost only the RMS, and since at most top_n + 1
+    distinct mixes remain, the product no longer grows with the room.
+    """
+    
+    GAIN_SHIFT = 8
+    UNITY = 1 << GAIN_SHIFT
+    
+    def __init__(self, frame_samples: int = 1024, capacity: int = 16, top_n: int = 0,
+                 switch_margin_db: float = 3.0, smoothing: float = 0.5):
+        self.frame_samples = frame_samples
+        self.top_n = top_n  # 0 = mix every sender
+        self.switch_ratio = 10 ** (switch_margin_db / 20)
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.rows: Dict[int, int] = {}  # stream_id -> row
+        self.free: List[int] = list(range(capacity))
+        self.frames = np.zeros((capacity, frame_samples), dtype=np.int32)
+        self.lengths = np.zeros(capacity, dtype=np.int32)  # Samples put this tick, 0 = none
+        self.gains = np.zeros((capacity, capacity), dtype=np.int32)  # listener x sender
+        self.muted = np.zeros((capacity, capacity), dtype=bool)
+        self.effective = None  # gains with mutes applied, rebuilt after a change
+        self.levels = np.zeros(capacity, dtype=np.float64)  # Smoothed RMS per sender row
+        self.selected: List[int] = []  # Rows mixed in the last top-N tick
         
-    def add_stream(self, stream_id: str, audio_data: bytes):
-        """Add audio data from a stream"""
-        self.streams[stream_id] = audio_data
-    
-    def mix(self) -> Optional[bytes]:
-        """Mix all audio streams"""
-        if not self.streams:
-            return None
+        # Statistics
+        self.ticks = 0
+        self.senders_skipped = 0
+        self.top_n_switches = 0
+        self.mixes_encoded = 0
+        self.mixes_sent = 0
+    
+    def add(self, stream_id: int):
+        """A participant joined: it hears everybody else at unity gain"""
+        with self.lock:
+            if stream_id in self.rows:
+                return
+            if not self.free:
+                self._grow()
+            row = self.free.pop(0)
+            self.rows[stream_id] = row
+            active = list(self.rows.values())
+            self.gains[row, active] = self.UNITY
+            self.gains[active, row] = self.UNITY
+            self.gains[row, row] = 0  # Mix-minus
+            self.effective = None
+    
+    def remove(self, stream_id: int):
+        """A participant left"""
+        with self.lock:
+            row = self.rows.pop(stream_id, None)
+            if row is None:
+                return
+            for table in (self.gains, self.muted):
+                table[row, :] = 0
+                table[:, row] = 0
+            self.lengths[row] = 0
+            self.levels[row] = 0.0
+            if row in self.selected:
+                self.selected.remove(row)
+            self.free.append(row)
+            self.free.sort()
+            self.effective = None
+    
+    def _grow(self):
+        """Double the matrices' capacity (caller holds lock)"""
+        old = len(self.lengths)
+        size = max(old * 2, 1)
+        frames = np.zeros((size, self.frame_samples), dtype=np.int32)
+        frames[:old] = self.frames
+        lengths = np.zeros(size, dtype=np.int32)
+        lengths[:old] = self.lengths
+        gains = np.zeros((size, size), dtype=np.int32)
+        gains[:old, :old] = self.gains
+        muted = np.zeros((size, size), dtype=bool)
+        muted[:old, :old] = self.muted
+        levels = np.zeros(size, dtype=np.float64)
+        levels[:old] = self.levels
+        self.frames, self.lengths, self.gains, self.muted = frames, lengths, gains, muted
+        self.levels = levels
+        self.free.extend(range(old, size))
+    
+    def set_gain(self, listener: int, sender: int, gain: float):
+        """How loud listener hears sender (1.0 = as sent); ignored for oneself"""
+        with self.lock:
+            if listener in self.rows and sender in self.rows and listener != sender:
+                self.gains[self.rows[listener], self.rows[sender]] = \
+                    int(round(max(0.0, gain) * self.UNITY))
+                self.effective = None
+    
+    def mute(self, listener: int, sender: int, muted: bool = True):
+        """Silence sender for one listener only, keeping its gain for later"""
+        with self.lock:
+            if listener in self.rows and sender in self.rows:
+                self.muted[self.rows[listener], self.rows[sender]] = muted
+                self.effective = None
+    
+    def put(self, stream_id: int, pcm: bytes):
+        """Set a sender's PCM16 frame for the next mix (a later one replaces it)"""
+        samples = np.frombuffer(pcm, dtype=np.int16, count=min(len(pcm) // 2, self.frame_samples))
+        with self.lock:
+            row = self.rows.get(stream_id)
+            if row is None:
+                return
+            count = len(samples)
+            self.frames[row, :count] = samples
+            self.frames[row, count:] = 0
+            self.lengths[row] = count
+    
+    def mix(self) -> List[Tuple[bytes, Tuple[int, ...]]]:
+        """(PCM16 mix, listener stream_ids) for every distinct mix this tick
         
-        try:
-            # Convert all streams to numpy arrays
-            arrays = []
-            for audio_data in self.streams.values():
-                arr = np.frombuffer(audio_data, dtype=np.int16)
-                arrays.append(arr)
-            
-            # Mix by averaging (prevents clipping)
-            mixed = np.mean(arrays, axis=0).astype(np.int16)
+        Clears the frames put since the last call. Listeners that would only
+        get silence (they are the only sender, or muted everybody) are left out.
+        """
+        with self.lock:
+            active = np.flatnonzero(self.lengths)
+            if len(active) == 0:
+                return []
+            self.ticks += 1
+            if self.effective is None:
+                self.effective = np.where(self.muted, 0, self.gains).astype(np.int32)
             
-            # Clear streams for next mix
-            self.streams.clear()
+            listeners = list(self.rows)
+            listener_rows = [self.rows[stream_id] for stream_id in listeners]
+            samples = int(self.lengths[active].max())
+            self.lengths[active] = 0
+            if self.top_n and len(active) > self.top_n:
+                mixed_rows = self._loudest(active, samples)
+                self.senders_skipped += len(active) - len(mixed_rows)
+                active = mixed_rows
+            gains = self.effective[np.ix_(listener_rows, active)]
             
-            return mixed.tobytes()
-            
-        except Exception as e:
-            print(f"Error mixing audio: {e}")
-            return None
+            # One product for all distinct gain rows, accumulated in 64 bits
+            unique, inverse = np.unique(gains, axis=0, return_inverse=True)
+            mixed = np.matmul(unique, self.frames[active, :samples], dtype=np.int64)
+            mixed >>= self.GAIN_SHIFT
+            np.clip(mixed, -32768, 32767, out=mixed)
+        
+        inverse = inverse.reshape(-1)
+        results = []
+        for index in range(len(unique)):
+            if not unique[index].any():
+                continue
+            members = tuple(listeners[i] for i in np.flatnonzero(inverse == index))
+            results.append((mixed[index].astype(np.int16).tobytes(), members))
+        self.mixes_encoded += len(results)
+        self.mixes_sent += sum(len(members) for _, members in results)
+        return results
+    
+    def _loudest(self, active: np.ndarray, samples: int) -> np.ndarray:
+        """Rows of the top_n loudest senders this tick, with hysteresis (caller holds lock)"""
+        frames = self.frames[active, :samples]
+        rms = np.sqrt(np.einsum('ij,ij->i', frames, frames, dtype=np.int64) / samples)
+        levels = self.levels
+        levels[active] += self.smoothing * (rms - levels[active])
+        
+        # Senders mixed last tick stay while they still send; free places go to the loudest
+        sending = set(active.tolist())
+        selected = [row for row in self.selected if row in sending]
+        ranked = active[np.argsort(-levels[active], kind='stable')].tolist()
+        for row in ranked:
+            if len(selected) >= self.top_n:
+                break
+            if row not in selected:
+                selected.append(row)
+        
+        # Louder outsiders replace the quietest mixed sender only by a clear margin
+        for row in ranked:
+            if row in selected:
+                continue
+            quietest = min(selected, key=levels.__getitem__)
+            if levels[row] <= levels[quietest] * self.switch_ratio:
+                break
+            selected[selected.index(quietest)] = row
+            self.top_n_switches += 1
+        
+        self.selected = selected
+        return np.array(sorted(selected), dtype=active.dtype)
     
-    def clear(self):
-        """Clear all streams"""
-        self.streams.clear()
\ No newline at end of file
+    def get_stats(self) -> dict:
+        return {
+            'mix_ticks': self.ticks,
+            'mixes_encoded': self.mixes_encoded,
+            'mixes_sent': self.mixes_sent,
+            'senders_skipped': self.senders_skipped,
+            'top_n_switches': self.top_n_switches
+        }
@@ -1,17 +1,32 @@
 import socket
-import struct
 from typing import Optional
 
+from ..utils.media_header import MediaHeader, MEDIA_HEADER_SIZE
+from ..utils.compression import CompressionUtils, AUDIO_CODECS
+
 class AudioStreamer:
     """Handles audio streaming over UDP"""
     
-    def __init__(self, client_id: str = None):
+    def __init__(self, client_id: str = None, stream_id: int = 0, codec: str = 'pcm16'):
         self.sock = None
         self.client_id = client_id
+        self.stream_id = stream_id  # Numeric ID assigned by the server at join
+        self.payload_type = AUDIO_CODECS[codec]  # Codec negotiated at join
+        self.sequence = 0
+        self.timestamp = 0  # Samples sent so far (audio media clock)
+        self.last_header = None
         
     def set_client_id(self, client_id: str):
         """Set client ID for packet identification"""
         self.client_id = client_id
+    
+    def set_stream_id(self, stream_id: int):
+        """Set the numeric stream ID carried in every packet header"""
+        self.stream_id = stream_id
+    
+    def set_codec(self, codec: str):
+        """Set the codec chunks are sent with ('pcm16', 'ulaw' or 'adpcm')"""
+        self.payload_type = AUDIO_CODECS[codec]
         
     def setup_sender(self) -> socket.socket:
         """Setup UDP socket for sending audio"""
@@ -31,26 +46,34 @@ class AudioStreamer:
         return self.sock
     
     def send_audio(self, audio_data: bytes, address: tuple) -> bool:
-        """Send audio chunk via UDP with client identification"""
+        """Encode a 16-bit PCM chunk and send it via UDP with a media header"""
         try:
-            # Add client ID prefix: client_id_len(1) + client_id + audio_data
-            client_id_bytes = self.client_id.encode('utf-8') if self.client_id else b''
-            client_id_len = len(client_id_bytes)
-            
-            header = struct.pack('B', client_id_len)
-            packet = header + client_id_bytes + audio_data
+            header = MediaHeader(
+                stream_id=self.stream_id,
+                sequence=self.sequence,
+                timestamp=self.timestamp,
+                frame_id=self.sequence,
+                payload_type=self.payload_type
+            )
+            self.sequence += 1
+            self.timestamp += len(audio_data) // 2
             
-            self.sock.sendto(packet, address)
+            payload = CompressionUtils.encode_audio(audio_data, self.payload_type)
+            self.sock.sendto(header.pack() + payload, address)
             return True
         except Exception as e:
             print(f"Error sending audio: {e}")
             return False
     
     def receive_audio(self) -> Optional[bytes]:
-        """Receive audio chunk from UDP"""
+        """Receive an audio chunk from UDP, decoded to 16-bit PCM"""
         try:
             data, _ = self.sock.recvfrom(65536)
-            return data
+            header = MediaHeader.unpack(data)
+            if header is None:
+                return None
+            self.last_header = header
+            return CompressionUtils.decode_audio(data[MEDIA_HEADER_SIZE:], header.payload_type)
         except socket.timeout:
             return None
         except Exception as e:
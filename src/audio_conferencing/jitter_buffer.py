@@ -0,0 +1,116 @@
+import threading
+import numpy as np
+from typing import Dict, Optional
+
+from ..utils.media_header import MediaHeader, serial_newer
+
+class JitterBuffer:
+    """Reorders one sender's audio packets and releases one frame per mix tick
+    
+    Frames are kept by sequence number and played out in that order, one
+    per pop(); an audio packet is one frame, so its sequence number and
+    timestamp advance together and frames of different senders popped in
+    the same tick line up sample for sample. Playout starts once target
+    frames are queued, which absorbs that much network jitter. A frame that
+    is still missing when its turn comes is concealed by repeating the last
+    one at half the level each time; once the buffer has run dry (underrun)
+    for max_conceal ticks in a row it stops and waits for target frames
+    again, e.g. after the sender muted. Frames arriving after their turn are dropped as late, and when
+    more than max_frames are queued the oldest are dropped (overrun) so the
+    delay never builds up. A sequence number far behind the playout point
+    means the sender restarted and starts playout over.
+    """
+    
+    def __init__(self, target: int = 2, max_frames: int = 8, max_conceal: int = 3):
+        self.target = target
+        self.max_frames = max(max_frames, target)
+        self.max_conceal = max_conceal
+        self.lock = threading.Lock()
+        self.frames: Dict[int, bytes] = {}  # sequence -> PCM16 frame
+        self.next_sequence: Optional[int] = None  # None = buffering, not playing
+        self.last_frame: Optional[bytes] = None
+        self.misses = 0  # Consecutive concealed frames
+        
+        # Statistics
+        self.received = 0
+        self.played = 0
+        self.concealed = 0
+        self.late = 0
+        self.underruns = 0
+        self.overruns = 0
+    
+    def push(self, header: MediaHeader, pcm: bytes):
+        """Queue one received frame"""
+        with self.lock:
+            self.received += 1
+            sequence = header.sequence
+            if self.next_sequence is not None and not serial_newer(
+                    sequence, (self.next_sequence - 1) & 0xFFFFFFFF):
+                if (self.next_sequence - sequence) & 0xFFFFFFFF <= self.max_frames * 4:
+                    self.late += 1
+                    return
+                # Far behind: the sender restarted its counter
+                self._restart()
+                self.frames.clear()
+            if sequence in self.frames:
+                return  # Duplicate
+            
+            self.frames[sequence] = pcm
+            while len(self.frames) > self.max_frames:
+                oldest = self._oldest()
+                del self.frames[oldest]
+                if self.next_sequence is not None:
+                    self.next_sequence = (oldest + 1) & 0xFFFFFFFF
+                self.overruns += 1
+    
+    def pop(self) -> Optional[bytes]:
+        """The frame for this tick, concealed if missing; None while buffering"""
+        with self.lock:
+            if self.next_sequence is None:
+                if len(self.frames) < self.target:
+                    return None
+                self.next_sequence = self._oldest()
+            
+            sequence = self.next_sequence
+            frame = self.frames.pop(sequence, None)
+            if frame is not None:
+                self.next_sequence = (sequence + 1) & 0xFFFFFFFF
+                self.last_frame = frame
+                self.misses = 0
+                self.played += 1
+                return frame
+            
+            if not self.frames:
+                self.underruns += 1
+            if self.last_frame is None or self.misses >= self.max_conceal:
+                # Nothing left to stretch: wait for target frames again
+                self._restart()
+                return None
+            self.misses += 1
+            self.concealed += 1
+            self.next_sequence = (sequence + 1) & 0xFFFFFFFF
+            samples = np.frombuffer(self.last_frame, dtype=np.int16) >> self.misses
+            return samples.astype(np.int16).tobytes()
+    
+    def _oldest(self) -> int:
+        """Lowest queued sequence number, allowing for wraparound (caller holds lock)"""
+        reference = next(iter(self.frames))
+        return min(self.frames, key=lambda s: (s - reference + 0x80000000) & 0xFFFFFFFF)
+    
+    def _restart(self):
+        """Drop playout state; the next target frames start it again (caller holds lock)"""
+        self.next_sequence = None
+        self.last_frame = None
+        self.misses = 0
+    
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'depth': len(self.frames),
+                'received': self.received,
+                'played': self.played,
+                'concealed': self.concealed,
+                'late': self.late,
+                'underruns': self.underruns,
+                'overruns': self.overruns
+            }
@@ -0,0 +1,72 @@
+import time
+from typing import Optional
+
+class MixClock:
+    """Fixed-rate tick schedule for the audio mixer on the monotonic clock
+    
+    Tick k is due at start + k * interval, so a late wake-up never shifts
+    the ticks after it: the next wait is simply shorter by the oversleep,
+    and the mix rate matches the senders' chunk rate over any stretch of
+    time. After a stall of more than max_behind intervals the missed ticks
+    are skipped instead of being run back to back.
+    """
+    
+    def __init__(self, interval: float, max_behind: int = 5):
+        self.interval = interval
+        self.max_behind = max_behind
+        self.next_due: Optional[float] = None
+        
+        # Statistics
+        self.ticks = 0
+        self.skipped = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+    
+    @classmethod
+    def for_audio(cls, sample_rate: int, chunk_size: int) -> 'MixClock':
+        """Clock ticking once per client audio chunk"""
+        return cls(chunk_size / sample_rate)
+    
+    def delay(self, now: Optional[float] = None) -> float:
+        """Seconds until the next tick is due (0 if it already is)"""
+        if now is None:
+            now = time.monotonic()
+        if self.next_due is None:
+            self.next_due = now
+        return max(0.0, self.next_due - now)
+    
+    def tick(self, now: Optional[float] = None) -> float:
+        """Mark the due tick as run; returns how late it ran in seconds"""
+        if now is None:
+            now = time.monotonic()
+        if self.next_due is None:
+            self.next_due = now
+        lateness = max(0.0, now - self.next_due)
+        self.next_due += self.interval
+        
+        behind = int(lateness / self.interval)
+        if behind > self.max_behind:
+            # Stalled: resume the schedule from now rather than catch up in a burst
+            self.next_due += behind * self.interval
+            self.skipped += behind
+        
+        self.ticks += 1
+        self.total_lateness += lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        return lateness
+    
+    def wait(self) -> float:
+        """Sleep until the next tick is due and run it; returns its lateness"""
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+        return self.tick()
+    
+    def get_stats(self) -> dict:
+        return {
+            'interval_ms': round(self.interval * 1000, 2),
+            'ticks': self.ticks,
+            'skipped_ticks': self.skipped,
+            'mean_lateness_ms': round(self.total_lateness / self.ticks * 1000, 3) if self.ticks else 0.0,
+            'max_lateness_ms': round(self.max_lateness * 1000, 3)
+        }
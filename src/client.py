@@ -3,6 +3,7 @@ import threading
 import json
 import uuid
 import cv2
+import numpy as np
 from typing import Optional, Dict
 import sys
 from pathlib import Path
@@ -11,12 +12,12 @@ from pathlib import Path
 if __name__ == "__main__":
     # Add project root to path when run directly
     sys.path.insert(0, str(Path(__file__).parent.parent))
-    from src.video_conferencing import VideoCapture, VideoStreamer
+    from src.video_conferencing import VideoCapture, VideoStreamer, VideoPipeline
     from src.audio_conferencing import AudioCapture, AudioPlayback, AudioStreamer
     from src.text_chat import ChatManager, MessageHandler
 else:
     # Use relative imports when imported as module
-    from .video_conferencing import VideoCapture, VideoStreamer
+    from .video_conferencing import VideoCapture, VideoStreamer, VideoPipeline
     from .audio_conferencing import AudioCapture, AudioPlayback, AudioStreamer
     from .text_chat import ChatManager, MessageHandler
 
@@ -34,6 +35,8 @@ class CollaborationClient:
         # Connection status
         self.connected = False
         self.running = False
+        self.stream_id = 0  # Numeric media stream ID assigned by the server
+        self.audio_codec = 'pcm16'  # Audio codec the server picked at join
         
         # Control connection
         self.control_socket = None
@@ -41,6 +44,8 @@ class CollaborationClient:
         # Feature modules
         self.video_capture = None
         self.video_streamer = None
+        self.video_receiver = None
+        self.video_pipeline = None
         self.audio_capture = None
         self.audio_playback = None
         self.audio_streamer = None
@@ -85,7 +90,8 @@ class CollaborationClient:
             # Send client info
             info = {
                 'client_id': self.client_id,
-                'username': self.username
+                'username': self.username,
+                'audio_codecs': self.config['audio'].get('codecs', ['pcm16'])
             }
             self.control_socket.sendall(json.dumps(info).encode('utf-8'))
             
@@ -95,6 +101,8 @@ class CollaborationClient:
             
             if response.get('status') == 'connected':
                 self.connected = True
+                self.stream_id = response.get('stream_id', 0)
+                self.audio_codec = response.get('audio_codec', 'pcm16')
                 self.other_clients = {c['client_id']: c for c in response.get('clients', [])}
                 print(f"Connected! {len(self.other_clients)} other clients online")
                 
@@ -114,36 +122,48 @@ class CollaborationClient:
     
     def handle_control_messages(self):
         """Handle control messages from server"""
+        buffer = b''
         while self.connected:
             try:
                 data = self.control_socket.recv(4096)
                 if not data:
                     break
                 
-                message = json.loads(data.decode('utf-8'))
-                msg_type = message.get('type')
-                
-                if msg_type == 'client_update':
-                    action = message.get('action')
-                    client_id = message.get('client_id')
-                    username = message.get('username')
-                    
-                    if action == 'joined':
-                        self.other_clients[client_id] = {'username': username}
-                        print(f"\n{username} joined the session")
-                    elif action == 'left':
-                        if client_id in self.other_clients:
-                            del self.other_clients[client_id]
-                            print(f"\n{username} left the session")
-                
-                elif msg_type == 'pong':
-                    pass  # Keepalive response
+                # Messages are newline-delimited and several may arrive in one recv
+                buffer += data
+                while b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    if line.strip():
+                        self.handle_control_message(json.loads(line.decode('utf-8')))
                     
             except Exception as e:
                 if self.connected:
                     print(f"Error handling control message: {e}")
                 break
     
+    def handle_control_message(self, message: dict):
+        """Handle one control message from the server"""
+        msg_type = message.get('type')
+        
+        if msg_type == 'client_update':
+            action = message.get('action')
+            client_id = message.get('client_id')
+            username = message.get('username')
+            
+            if action == 'joined':
+                self.other_clients[client_id] = {
+                    'username': username,
+                    'stream_id': message.get('stream_id')
+                }
+                print(f"\n{username} joined the session")
+            elif action == 'left':
+                if client_id in self.other_clients:
+                    del self.other_clients[client_id]
+                    print(f"\n{username} left the session")
+        
+        elif msg_type == 'pong':
+            pass  # Keepalive response
+    
     def start_video(self) -> bool:
         """Start video conferencing"""
         try:
@@ -152,7 +172,12 @@ class CollaborationClient:
             # Initialize video capture
             resolution = tuple(self.config['video']['resolution'])
             fps = self.config['video']['fps']
-            self.video_capture = VideoCapture(resolution=resolution, fps=fps)
+            self.video_capture = VideoCapture(
+                resolution=resolution,
+                fps=fps,
+                passthrough=self.config['video'].get('mjpeg_passthrough', False),
+                buffers=self.config['video'].get('capture_buffers', 0)
+            )
             
             if not self.video_capture.start():
                 print("Failed to start camera")
@@ -160,13 +185,32 @@ class CollaborationClient:
             
             # Initialize video streamer
             quality = self.config['video']['quality']
-            self.video_streamer = VideoStreamer(quality=quality)
+            self.video_streamer = VideoStreamer(
+                quality=quality,
+                stream_id=self.stream_id,
+                payload_size=self.config['video'].get('payload_size', 1200),
+                fps=fps,
+                pacing=self.config['video'].get('pacing', True),
+                pacing_burst=self.config['video'].get('pacing_burst_bytes', 12000),
+                fec_group_size=self.config['video'].get('fec_group_size', 0),
+                abr=self.config['video'].get('abr', False),
+                codec=self.config['video'].get('codec', 'MJPEG'),
+                tile_size=self.config['video'].get('tile_size', 32),
+                tile_threshold=self.config['video'].get('tile_threshold', 6.0),
+                keyframe_interval=self.config['video'].get('keyframe_interval', 2.0),
+                simulcast_layers=self.config['video'].get('simulcast_layers', 1)
+            )
             self.video_streamer.setup_sender()
             
-            # Start sending thread
-            thread = threading.Thread(target=self.send_video_loop, daemon=True)
-            thread.start()
-            self.threads.append(thread)
+            # Start capture -> encode -> send pipeline
+            self.video_pipeline = VideoPipeline(
+                self.video_capture,
+                self.video_streamer,
+                (self.server_host, self.config['server']['video_port']),
+                workers=self.config['video'].get('encoder_workers', 2),
+                queue_size=self.config['video'].get('pipeline_queue', 4)
+            )
+            self.video_pipeline.start()
             
             # Start receiving thread
             thread = threading.Thread(target=self.receive_video_loop, daemon=True)
@@ -185,30 +229,32 @@ class CollaborationClient:
             print(f"Error starting video: {e}")
             return False
     
-    def send_video_loop(self):
-        """Continuously send video frames"""
-        server_addr = (self.server_host, self.config['server']['video_port'])
-        
-        while self.running and self.connected:
-            frame = self.video_capture.read()
-            if frame is not None:
-                self.video_streamer.send_frame(frame, server_addr)
-    
     def receive_video_loop(self):
         """Continuously receive video frames"""
-        recv_streamer = VideoStreamer()
+        recv_streamer = VideoStreamer(
+            stream_id=self.stream_id,
+            nack=self.config['video'].get('nack', True),
+            abr=self.config['video'].get('abr', False),
+            report_interval=self.config['video'].get('report_interval', 1.0)
+        )
         recv_streamer.setup_receiver('0.0.0.0', self.config['server']['video_port'])
+        self.video_receiver = recv_streamer
         
         while self.running and self.connected:
-            frame = recv_streamer.receive_frame()
-            if frame is not None:
+            result = recv_streamer.receive_frame()
+            if result is not None:
+                stream_id, frame = result
                 cv2.imshow("Remote Video", frame)
                 cv2.waitKey(1)
     
     def display_local_video(self):
         """Display local video feed"""
+        # Own subscription: the encoder pipeline still sees every frame
+        frames = self.video_capture.subscribe()
         while self.running and self.connected:
-            frame = self.video_capture.read()
+            frame = frames.read()
+            if isinstance(frame, bytes):
+                frame = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
             if frame is not None:
                 cv2.imshow("My Video", frame)
                 if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -236,7 +282,7 @@ class CollaborationClient:
                 return False
             
             # Initialize audio streamer
-            self.audio_streamer = AudioStreamer()
+            self.audio_streamer = AudioStreamer(stream_id=self.stream_id, codec=self.audio_codec)
             self.audio_streamer.setup_sender()
             
             # Start sending thread
@@ -335,10 +381,33 @@ class CollaborationClient:
         print("  Type messages to chat")
         print("  /quit - Exit session")
         print("  /clients - Show connected clients")
+        print("  /watch <name ...|all> - Receive video only from these participants")
         print("=====================================\n")
         
         return True
     
+    def subscribe(self, stream_ids: Optional[list], max_fps: float = 0):
+        """Ask the relay to forward video only from these senders (None = all)
+        
+        max_fps > 0 caps each of them; the relay then skips whole frames.
+        """
+        capped = stream_ids if stream_ids is not None else [
+            info['stream_id'] for info in self.other_clients.values()
+            if info.get('stream_id') not in (None, self.stream_id)
+        ]
+        message = {
+            'type': 'subscribe',
+            'streams': stream_ids,
+            'max_fps': {str(s): max_fps for s in capped} if max_fps else {},
+            'transcode': self.config['video'].get('receive_transcode')
+        }
+        if self.video_receiver:
+            self.video_receiver.thinned_streams = set(capped) if max_fps else set()
+        try:
+            self.control_socket.sendall((json.dumps(message) + '\n').encode('utf-8'))
+        except Exception as e:
+            print(f"Error sending subscriptions: {e}")
+    
     def run_interactive(self):
         """Run interactive chat interface"""
         import sys
@@ -357,6 +426,17 @@ class CollaborationClient:
                         for client_id, info in self.other_clients.items():
                             print(f"  - {info['username']}")
                         print()
+                    elif message.startswith('/watch'):
+                        # /watch name [name ...] or /watch all
+                        names = message.split()[1:]
+                        max_fps = self.config['video'].get('receive_max_fps', 0)
+                        if names == ['all']:
+                            self.subscribe(None, max_fps)
+                        else:
+                            self.subscribe([
+                                info['stream_id'] for info in self.other_clients.values()
+                                if info['username'] in names
+                            ], max_fps)
                     else:
                         print("Unknown command")
                 else:
@@ -378,6 +458,8 @@ class CollaborationClient:
         self.connected = False
         
         # Stop video
+        if self.video_pipeline:
+            self.video_pipeline.stop()
         if self.video_capture:
             self.video_capture.stop()
         if self.video_streamer:
@@ -5,12 +5,23 @@ import io
 import threading
 from typing import Optional
 
+from ..utils.media_header import (
+    MediaHeader, MEDIA_HEADER_SIZE, FLAG_KEYFRAME, PAYLOAD_JPEG, media_timestamp
+)
+
 class ScreenStreamer:
     """Handles screen streaming over TCP for reliability"""
     
-    def __init__(self, quality: int = 75):
+    def __init__(self, quality: int = 75, stream_id: int = 0):
         self.quality = quality
+        self.stream_id = stream_id  # Numeric ID assigned by the server at join
         self.sock = None
+        self.sequence = 0
+        self.last_header = None
+    
+    def set_stream_id(self, stream_id: int):
+        """Set the numeric stream ID carried in every frame header"""
+        self.stream_id = stream_id
         
     def setup_server(self, host: str, port: int) -> socket.socket:
         """Setup TCP server for screen sharing"""
@@ -34,11 +45,21 @@ class ScreenStreamer:
             image.save(buffer, format='JPEG', quality=self.quality, optimize=True)
             data = buffer.getvalue()
             
-            # Send size header + data
-            size = len(data)
+            media_header = MediaHeader(
+                stream_id=self.stream_id,
+                sequence=self.sequence,
+                timestamp=media_timestamp(),
+                frame_id=self.sequence,
+                flags=FLAG_KEYFRAME,
+                payload_type=PAYLOAD_JPEG
+            ).pack()
+            self.sequence += 1
+            
+            # Send size header + media header + data
+            size = len(media_header) + len(data)
             header = struct.pack('!I', size)
             
-            conn.sendall(header + data)
+            conn.sendall(header + media_header + data)
             return True
             
         except Exception as e:
@@ -55,13 +76,18 @@ class ScreenStreamer:
             
             size = struct.unpack('!I', header)[0]
             
-            # Receive image data
+            # Receive media header + image data
             data = self._recv_exact(conn, size)
             if not data:
                 return None
             
+            header = MediaHeader.unpack(data)
+            if header is None:
+                return None
+            self.last_header = header
+            
             # Decode image
-            image = Image.open(io.BytesIO(data))
+            image = Image.open(io.BytesIO(data[MEDIA_HEADER_SIZE:]))
             return image
             
         except Exception as e:
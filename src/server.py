@@ -4,19 +4,113 @@ import json
 import struct
 import time
 import os
-from typing import Dict, Set, Tuple
+import queue
+from typing import Dict, Set, Tuple, Optional
 from pathlib import Path
 import numpy as np
 
+if __package__:
+    from .utils.outbound import OutboundWriter, STREAM_CONTROL, STREAM_CHAT, STREAM_SCREEN, recv_wait
+    from .utils.routing_table import RoutingTable, RouteEntry
+    from .utils.media_header import (
+        MediaHeader, MEDIA_HEADER_SIZE, PAYLOAD_PCM16, PAYLOAD_NACK, PAYLOAD_RECEIVER_REPORT,
+        PAYLOAD_LAYER_REQUEST, SERVER_STREAM_ID, TRANSCODED_LAYER,
+        peek_stream_id, peek_sequence, is_feedback
+    )
+    from .utils.retransmit import RetransmitCache, parse_nack
+    from .utils.feedback import ReceiverReport, LayerRequest
+    from .utils.simulcast import LayerSelector
+    from .utils.speakers import SpeakerTracker
+    from .utils.thinning import FrameThinner
+    from .utils.transcoding import Transcoder, Variant
+    from .utils.compression import CompressionUtils
+    from .audio_conferencing.audio_mixer import AudioMixer
+    from .audio_conferencing.jitter_buffer import JitterBuffer
+    from .audio_conferencing.mix_clock import MixClock
+else:
+    # Run directly (python src/server.py): import through the project root
+    import sys
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from src.utils.outbound import OutboundWriter, STREAM_CONTROL, STREAM_CHAT, STREAM_SCREEN, recv_wait
+    from src.utils.routing_table import RoutingTable, RouteEntry
+    from src.utils.media_header import (
+        MediaHeader, MEDIA_HEADER_SIZE, PAYLOAD_PCM16, PAYLOAD_NACK, PAYLOAD_RECEIVER_REPORT,
+        PAYLOAD_LAYER_REQUEST, SERVER_STREAM_ID, TRANSCODED_LAYER,
+        peek_stream_id, peek_sequence, is_feedback
+    )
+    from src.utils.retransmit import RetransmitCache, parse_nack
+    from src.utils.feedback import ReceiverReport, LayerRequest
+    from src.utils.simulcast import LayerSelector
+    from src.utils.speakers import SpeakerTracker
+    from src.utils.thinning import FrameThinner
+    from src.utils.transcoding import Transcoder, Variant
+    from src.utils.compression import CompressionUtils
+    from src.audio_conferencing.audio_mixer import AudioMixer
+    from src.audio_conferencing.jitter_buffer import JitterBuffer
+    from src.audio_conferencing.mix_clock import MixClock
+
+def read_config(config_path: str) -> dict:
+    """Load the server configuration from a JSON file, or the defaults"""
+    try:
+        with open(config_path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print("Config file not found, using defaults")
+        return {
+            "server": {
+                "host": "0.0.0.0",
+                "mode": "threaded",
+                "video_port": 5000,
+                "audio_port": 5001,
+                "screen_port": 5002,
+                "chat_port": 5003,
+                "file_port": 5004,
+                "control_port": 5005
+            }
+        }
+
+
 class CollaborationServer:
     """Main server coordinating all collaboration features"""
     
-    def __init__(self, config_path: str = "configs/config.json"):
-        self.load_config(config_path)
+    def __init__(self, config_path: str = "configs/config.json", config: Optional[dict] = None):
+        if config is None:
+            self.load_config(config_path)
+        else:
+            self.config = config
         
         self.clients: Dict[str, Dict] = {}  # client_id -> {address, sockets, info}
         self.clients_lock = threading.Lock()
         
+        # Media routing snapshot, rebuilt under clients_lock and read lock-free
+        self.routing = RoutingTable()
+        self.next_stream_id = 1
+        
+        # Recently relayed video packets, resent to receivers that NACK them
+        video_config = self.config.get('video', {})
+        self.video_cache = RetransmitCache(
+            video_config.get('retransmit_cache_packets', 4096),
+            video_config.get('retransmit_cache_age', 1.0)
+        )
+        
+        # Which simulcast layer of each sender every receiver gets
+        self.video_layers = LayerSelector()
+        
+        # Frame rate caps receivers set per sender
+        self.video_thinning = FrameThinner()
+        
+        # Optional transcoding of senders' frames for low-capability receivers
+        workers = video_config.get('transcode_workers', 0)
+        self.video_transcoder = Transcoder(
+            workers, send=self.send_transcoded,
+            payload_size=video_config.get('payload_size', 1200)
+        ) if workers else None
+        self.transcoded = queue.SimpleQueue()  # (packets, dests) for the video relay thread
+        
+        # Dominant speaker and the last-N speakers whose video is forwarded
+        self.speakers = SpeakerTracker(last_n=video_config.get('last_n', 0))
+        self.video_senders = None
+        
         self.running = False
         self.control_socket = None
         
@@ -27,39 +121,41 @@ class CollaborationServer:
         self.chat_socket = None
         self.file_socket = None
         
-        # Audio mixing
-        self.audio_buffer = {}  # client_id -> latest audio chunk
-        self.audio_buffer_lock = threading.Lock()
+        # Audio mixing: every listener gets everybody but itself
+        audio_config = self.config.get('audio', {})
+        self.audio_mixer = AudioMixer(audio_config.get('chunk_size', 1024),
+                                      top_n=audio_config.get('mix_top_n', 0))
+        # Per-sender jitter buffers, replaced (never changed) under clients_lock
+        self.audio_jitter: Dict[int, JitterBuffer] = {}
+        self.jitter_target = audio_config.get('jitter_target_frames', 2)
+        self.jitter_max = audio_config.get('jitter_max_frames', 8)
+        # One mix per client chunk (1024 samples at 44.1kHz = 23.2ms)
+        self.audio_clock = MixClock.for_audio(audio_config.get('sample_rate', 44100),
+                                              audio_config.get('chunk_size', 1024))
+        self.mix_sequence = 0
+        self.mix_timestamp = 0
+        self.audio_codecs = audio_config.get('codecs')  # Codecs clients may pick, None = all
         
         # File storage
         self.shared_files = {}  # file_id -> {filename, size, path, uploader}
         self.files_dir = Path("shared_files")
         self.files_dir.mkdir(exist_ok=True)
         
+        # Per-connection send queues for all TCP fan-out
+        self.outbound = self.create_outbound_writer()
+        
     def load_config(self, config_path: str):
         """Load configuration from JSON file"""
-        try:
-            with open(config_path, 'r') as f:
-                self.config = json.load(f)
-        except FileNotFoundError:
-            print("Config file not found, using defaults")
-            self.config = {
-                "server": {
-                    "host": "0.0.0.0",
-                    "video_port": 5000,
-                    "audio_port": 5001,
-                    "screen_port": 5002,
-                    "chat_port": 5003,
-                    "file_port": 5004,
-                    "control_port": 5005
-                }
-            }
+        self.config = read_config(config_path)
     
     def start(self):
         """Start all server components"""
         print("Starting Collaboration Server...")
         
         self.running = True
+        self.outbound.start()
+        if self.video_transcoder:
+            self.video_transcoder.start()
         
         # Setup control server
         self.setup_control_server()
@@ -123,30 +219,20 @@ class CollaborationServer:
                 client_id = info.get('client_id')
                 username = info.get('username')
                 
-                with self.clients_lock:
-                    self.clients[client_id] = {
-                        'address': addr,
-                        'username': username,
-                        'control_conn': conn,
-                        'connected': True
-                    }
+                stream_id = self.register_client(client_id, username, addr, conn,
+                                                 info.get('audio_codecs'))
                 
                 # Send acknowledgment with client list
-                client_list = self.get_client_list()
-                response = {
-                    'status': 'connected',
-                    'clients': client_list
-                }
-                conn.sendall(json.dumps(response).encode('utf-8'))
+                self.send_control(conn, self.build_connect_response(client_id))
                 
                 # Broadcast new client to others
-                self.broadcast_client_update('joined', client_id, username)
+                self.broadcast_client_update('joined', client_id, username, stream_id)
                 
                 print(f"Client connected: {username} ({client_id})")
             
             # Keep connection alive for control messages
             while self.running:
-                data = conn.recv(4096)
+                data = recv_wait(conn, 4096)
                 if not data:
                     break
                 
@@ -157,12 +243,7 @@ class CollaborationServer:
             print(f"Error handling control client: {e}")
         finally:
             if client_id:
-                with self.clients_lock:
-                    if client_id in self.clients:
-                        username = self.clients[client_id]['username']
-                        del self.clients[client_id]
-                        self.broadcast_client_update('left', client_id, username)
-                        print(f"Client disconnected: {username}")
+                self.unregister_client(client_id)
             
             try:
                 conn.close()
@@ -172,56 +253,216 @@ class CollaborationServer:
     def process_control_message(self, client_id: str, data: bytes):
         """Process control messages from clients"""
         try:
-            message = json.loads(data.decode('utf-8'))
-            msg_type = message.get('type')
-            
-            if msg_type == 'ping':
-                # Respond to keepalive
-                with self.clients_lock:
-                    if client_id in self.clients:
-                        conn = self.clients[client_id]['control_conn']
-                        conn.sendall(b'{"type":"pong"}')
-            
-            elif msg_type == 'request_clients':
-                # Send updated client list
-                client_list = self.get_client_list()
-                response = {'type': 'client_list', 'clients': client_list}
-                with self.clients_lock:
-                    if client_id in self.clients:
-                        conn = self.clients[client_id]['control_conn']
-                        conn.sendall(json.dumps(response).encode('utf-8'))
+            # Several newline-terminated messages may arrive in one read
+            for line in data.decode('utf-8').splitlines():
+                if not line.strip():
+                    continue
+                message = json.loads(line)
+                msg_type = message.get('type')
+                
+                if msg_type == 'ping':
+                    # Respond to keepalive
+                    self.send_to_client(client_id, b'{"type":"pong"}')
+                
+                elif msg_type == 'request_clients':
+                    # Send updated client list
+                    client_list = self.get_client_list()
+                    response = {'type': 'client_list', 'clients': client_list}
+                    self.send_to_client(client_id, json.dumps(response).encode('utf-8'))
+                
+                elif msg_type == 'subscribe':
+                    # Senders whose video this client shows (null = everybody),
+                    # pinned ones it gets even outside the last N speakers and
+                    # per-sender frame rate caps, and a transcoded variant it
+                    # wants instead of the senders' own streams
+                    self.set_subscriptions(client_id, message.get('streams'),
+                                           message.get('pinned', []), message.get('max_fps'),
+                                           message.get('transcode'))
+                
+                elif msg_type == 'audio_mix':
+                    # How loud this client hears one other participant
+                    self.set_listener_mix(client_id, int(message['stream_id']),
+                                          message.get('gain'), message.get('muted'))
                         
         except Exception as e:
             print(f"Error processing control message: {e}")
     
+    def set_subscriptions(self, client_id: str, streams: Optional[list], pinned: list = (),
+                          max_fps: Optional[dict] = None, transcode: Optional[dict] = None):
+        """Forward only these senders' video to a client (None = all of them)
+        
+        max_fps maps sender stream IDs (JSON object keys) to the highest frame
+        rate the client wants from them. transcode ({"scale", "quality"}) asks
+        for a reduced variant of every sender; it is ignored unless the server
+        runs transcode workers.
+        """
+        subscriptions = None if streams is None else frozenset(int(s) for s in streams)
+        pinned = frozenset(int(s) for s in pinned)
+        caps = {int(s): float(fps) for s, fps in (max_fps or {}).items() if float(fps) > 0} or None
+        variant = Variant.parse(transcode) if self.video_transcoder else None
+        with self.clients_lock:
+            info = self.clients.get(client_id)
+            if info is None or (info.get('subscriptions'), info.get('pinned', frozenset()),
+                                info.get('max_fps'), info.get('transcode')) == \
+                    (subscriptions, pinned, caps, variant):
+                return
+            info['subscriptions'] = subscriptions
+            info['pinned'] = pinned
+            info['max_fps'] = caps
+            info['transcode'] = variant
+            self.rebuild_routing()
+    
+    def set_listener_mix(self, client_id: str, stream_id: int, gain: Optional[float] = None,
+                         muted: Optional[bool] = None):
+        """Change the gain or mute of one sender in a client's own audio mix"""
+        entry = self.routing.by_client_id.get(client_id)
+        if entry is None:
+            return
+        if gain is not None:
+            self.audio_mixer.set_gain(entry.stream_id, stream_id, float(gain))
+        if muted is not None:
+            self.audio_mixer.mute(entry.stream_id, stream_id, bool(muted))
+    
+    def register_client(self, client_id: str, username: str, addr: Tuple, conn,
+                        audio_codecs: Optional[list] = None) -> int:
+        """Add a client to the session and return its assigned media stream ID
+        
+        audio_codecs is the client's list of audio codecs by preference; it
+        gets the first one this server allows, or PCM16 if none is.
+        """
+        audio_codec = CompressionUtils.negotiate_audio_codec(audio_codecs, self.audio_codecs)
+        self.outbound.register(conn)
+        with self.clients_lock:
+            stream_id = self.next_stream_id
+            self.next_stream_id += 1
+            self.clients[client_id] = {
+                'address': addr,
+                'username': username,
+                'control_conn': conn,
+                'stream_id': stream_id,
+                'audio_codec': audio_codec,
+                'connected': True
+            }
+            self.speakers.add(stream_id)
+            self.audio_mixer.add(stream_id)
+            self.audio_jitter = {
+                **self.audio_jitter, stream_id: JitterBuffer(self.jitter_target, self.jitter_max)
+            }
+            self.video_senders = self.speakers.last_n_streams()
+            self.rebuild_routing()
+        return stream_id
+    
+    def unregister_client(self, client_id: str):
+        """Remove a client and tell the others it left"""
+        with self.clients_lock:
+            entry = self.routing.by_client_id.get(client_id)
+            info = self.clients.pop(client_id, None)
+            if info:
+                self.speakers.remove(info['stream_id'])
+                self.audio_mixer.remove(info['stream_id'])
+                self.audio_jitter = {
+                    s: b for s, b in self.audio_jitter.items() if s != info['stream_id']
+                }
+                self.video_senders = self.speakers.last_n_streams()
+            self.rebuild_routing()
+        
+        if info:
+            self.video_layers.forget(info['stream_id'])
+            if entry:
+                self.video_thinning.forget(entry.stream_id, entry.video_dest)
+            if self.video_transcoder:
+                self.video_transcoder.forget(info['stream_id'])
+            self.outbound.unregister(info['control_conn'])
+            self.broadcast_client_update('left', client_id, info['username'], info['stream_id'])
+            print(f"Client disconnected: {info['username']}")
+    
+    def build_connect_response(self, client_id: str) -> bytes:
+        """Build the handshake acknowledgment sent to a newly joined client"""
+        with self.clients_lock:
+            stream_id = self.clients[client_id]['stream_id']
+            audio_codec = self.clients[client_id]['audio_codec']
+        
+        response = {
+            'status': 'connected',
+            'stream_id': stream_id,
+            'audio_codec': audio_codec,
+            'clients': self.get_client_list()
+        }
+        return json.dumps(response).encode('utf-8')
+    
+    def create_outbound_writer(self):
+        """Create the send-queue writer configured by the network section"""
+        network = self.config.get('network', {})
+        return OutboundWriter(
+            max_bytes=network.get('send_queue_bytes', 4 * 1024 * 1024),
+            slow_timeout=network.get('slow_consumer_timeout', 5.0)
+        )
+    
+    def send_control(self, conn, data: bytes):
+        """Queue bytes on a control connection (never blocks on a slow peer)"""
+        self.outbound.send(conn, data, STREAM_CONTROL)
+    
+    def send_to_client(self, client_id: str, data: bytes):
+        """Send data on one client's control connection"""
+        with self.clients_lock:
+            info = self.clients.get(client_id)
+        
+        if info:
+            self.send_control(info['control_conn'], data)
+    
     def get_client_list(self) -> list:
         """Get list of connected clients"""
         with self.clients_lock:
             return [
-                {'client_id': cid, 'username': info['username']}
+                {'client_id': cid, 'username': info['username'], 'stream_id': info['stream_id']}
                 for cid, info in self.clients.items()
             ]
     
-    def broadcast_client_update(self, action: str, client_id: str, username: str):
+    def broadcast_client_update(self, action: str, client_id: str, username: str,
+                                stream_id: Optional[int] = None):
         """Broadcast client join/leave to all clients"""
         message = {
             'type': 'client_update',
             'action': action,
             'client_id': client_id,
-            'username': username
+            'username': username,
+            'stream_id': stream_id
         }
         data = (json.dumps(message) + '\n').encode('utf-8')  # Add newline delimiter
         
         print(f"Broadcasting {action} for {username} to all clients")
         
         with self.clients_lock:
-            for cid, info in self.clients.items():
-                if cid != client_id:  # Don't send to the client itself
-                    try:
-                        info['control_conn'].sendall(data)
-                        print(f"  → Sent to {info['username']}")
-                    except Exception as e:
-                        print(f"  → Failed to send to {info['username']}: {e}")
+            recipients = [
+                (info['control_conn'], info['username'])
+                for cid, info in self.clients.items()
+                if cid != client_id  # Don't send to the client itself
+            ]
+        
+        for conn, name in recipients:
+            self.send_control(conn, data)
+            print(f"  → Queued for {name}")
+    
+    def update_speakers(self, now: Optional[float] = None):
+        """Re-rank speakers once per mix interval; apply and announce any change"""
+        if not self.speakers.evaluate(now):
+            return
+        
+        with self.clients_lock:
+            self.video_senders = self.speakers.last_n_streams()
+            if self.video_senders != self.routing.video_senders:
+                self.rebuild_routing()
+            conns = [info['control_conn'] for info in self.clients.values()]
+        
+        video_senders = self.video_senders
+        message = {
+            'type': 'dominant_speaker',
+            'stream_id': self.speakers.dominant,
+            'last_n': None if video_senders is None else sorted(video_senders)
+        }
+        data = (json.dumps(message) + '\n').encode('utf-8')
+        for conn in conns:
+            self.send_control(conn, data)
     
     def setup_video_relay(self):
         """Setup UDP relay for video streams"""
@@ -237,33 +478,32 @@ class CollaborationServer:
                 self.config['server']['host'],
                 self.config['server']['video_port']
             ))
+            self.video_socket = sock
+            if self.video_transcoder:
+                sock.settimeout(0.05)  # Transcoded frames must not wait for the next packet
             
             print("Video relay started")
             
             while self.running:
                 try:
-                    data, addr = sock.recvfrom(65536)
-                    
-                    # Parse packet: client_id_len(1) + client_id + video_data
-                    if len(data) < 2:
+                    self.deliver_transcoded(sock)
+                    try:
+                        data, addr = sock.recvfrom(65536)
+                    except socket.timeout:
                         continue
                     
-                    client_id_len = struct.unpack('B', data[0:1])[0]
-                    if len(data) < 1 + client_id_len:
+                    # Receiver feedback is answered, never relayed
+                    if is_feedback(data):
+                        for packet, dest in self.handle_video_feedback(data, addr):
+                            sock.sendto(packet, dest)
                         continue
                     
-                    sender_id = data[1:1+client_id_len].decode('utf-8')
-                    video_data = data[1+client_id_len:]
-                    
                     # Relay to all other clients with sender ID
-                    with self.clients_lock:
-                        for client_id, client_info in self.clients.items():
-                            if client_id != sender_id:
-                                try:
-                                    client_addr = client_info.get('video_addr', client_info['address'])
-                                    sock.sendto(data, (client_addr[0], self.config['server']['video_port']))
-                                except Exception as e:
-                                    pass
+                    for dest in self.route_video_packet(data, addr):
+                        try:
+                            sock.sendto(data, dest)
+                        except Exception as e:
+                            pass
                                     
                 except Exception as e:
                     if self.running:
@@ -272,13 +512,38 @@ class CollaborationServer:
         except Exception as e:
             print(f"Error starting video relay: {e}")
     
+    def send_transcoded(self, packets: list, dests: tuple):
+        """Hand a transcoded frame from the pool's thread to the video relay thread"""
+        self.transcoded.put((packets, dests))
+    
+    def deliver_transcoded(self, sock):
+        """Cache and send the transcoded frames handed over since the last call"""
+        while True:
+            try:
+                packets, dests = self.transcoded.get_nowait()
+            except queue.Empty:
+                return
+            self.cache_transcoded(packets)
+            for dest in dests:
+                for packet in packets:
+                    try:
+                        sock.sendto(packet, dest)
+                    except Exception:
+                        pass
+    
+    def cache_transcoded(self, packets: list):
+        """Keep a transcoded frame's packets for NACKs (on the relay's thread only)"""
+        for packet in packets:
+            self.video_cache.put(peek_stream_id(packet), peek_sequence(packet), packet,
+                                 layer=packet[2])
+    
     def setup_audio_relay(self):
         """Setup UDP relay for audio streams"""
         thread = threading.Thread(target=self.relay_audio, daemon=True)
         thread.start()
     
     def relay_audio(self):
-        """Receive audio from all clients, mix, and broadcast mixed audio"""
+        """Receive audio from all clients into their jitter buffers; mixing runs on its own clock"""
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2097152)  # 2MB buffer
@@ -286,63 +551,20 @@ class CollaborationServer:
                 self.config['server']['host'],
                 self.config['server']['audio_port']
             ))
-            sock.settimeout(0.01)  # 10ms timeout for mixing loop
+            sock.settimeout(0.5)  # Only to notice stop()
+            self.audio_socket = sock
             
-            print("Audio relay started with mixing")
+            thread = threading.Thread(target=self.run_audio_mixer, args=(sock,), daemon=True)
+            thread.start()
             
-            last_mix_time = time.time()
-            mix_interval = 0.02  # Mix every 20ms
+            print("Audio relay started with mixing")
             
             while self.running:
                 try:
-                    # Receive audio packets
-                    try:
-                        data, addr = sock.recvfrom(65536)
-                        
-                        # Parse packet: client_id_len(1) + client_id + audio_data
-                        if len(data) < 2:
-                            continue
-                        
-                        try:
-                            client_id_len = struct.unpack('B', data[0:1])[0]
-                            if len(data) < 1 + client_id_len:
-                                continue
-                            
-                            sender_id = data[1:1+client_id_len].decode('utf-8', errors='ignore')
-                            audio_data = data[1+client_id_len:]
-                        except Exception as decode_err:
-                            # Skip malformed packets
-                            continue
-                        
-                        # Store in buffer
-                        with self.audio_buffer_lock:
-                            self.audio_buffer[sender_id] = audio_data
-                            
-                    except socket.timeout:
-                        pass
-                    
-                    # Mix and broadcast at regular intervals
-                    current_time = time.time()
-                    if current_time - last_mix_time >= mix_interval:
-                        with self.audio_buffer_lock:
-                            if len(self.audio_buffer) > 0:
-                                # Mix audio from all clients
-                                mixed_audio = self.mix_audio_streams(list(self.audio_buffer.values()))
-                                
-                                # Broadcast mixed audio to all clients
-                                with self.clients_lock:
-                                    for client_id, client_info in self.clients.items():
-                                        try:
-                                            client_addr = client_info.get('audio_addr', client_info['address'])
-                                            sock.sendto(mixed_audio, (client_addr[0], self.config['server']['audio_port']))
-                                        except Exception as e:
-                                            pass
-                                
-                                # Clear buffer
-                                self.audio_buffer.clear()
-                        
-                        last_mix_time = current_time
-                        
+                    data, addr = sock.recvfrom(65536)
+                    self.buffer_audio_packet(data, addr)
+                except socket.timeout:
+                    pass
                 except Exception as e:
                     if self.running:
                         print(f"Error relaying audio: {e}")
@@ -350,32 +572,188 @@ class CollaborationServer:
         except Exception as e:
             print(f"Error starting audio relay: {e}")
     
-    def mix_audio_streams(self, audio_chunks):
-        """Mix multiple audio streams together"""
-        if not audio_chunks:
-            return b''
+    def run_audio_mixer(self, sock: socket.socket):
+        """Mix and send once per audio chunk duration, on the monotonic mixing clock"""
+        while self.running:
+            try:
+                self.audio_clock.wait()
+                self.update_speakers()
+                # Each listener gets its own mix-minus mix
+                for packet, dests in self.mix_pending_audio():
+                    for dest in dests:
+                        try:
+                            sock.sendto(packet, dest)
+                        except Exception:
+                            pass
+            except Exception as e:
+                if self.running:
+                    print(f"Error mixing audio: {e}")
+    
+    def rebuild_routing(self):
+        """Swap in a new routing snapshot (caller holds clients_lock)"""
+        self.routing = RoutingTable.build(
+            self.clients,
+            self.config['server']['video_port'],
+            self.config['server']['audio_port'],
+            self.video_senders
+        )
+    
+    def learn_media_address(self, stream_id: int, addr: Tuple, key: str) -> Optional[RouteEntry]:
+        """Remember the UDP source address a sender uses for a media stream"""
+        with self.clients_lock:
+            entry = self.routing.by_stream_id.get(stream_id)
+            if entry is None:
+                return None
+            self.clients[entry.client_id][key] = addr
+            self.rebuild_routing()
+            return self.routing.by_stream_id[stream_id]
+    
+    def resolve_media_sender(self, data: bytes, addr: Tuple, key: str) -> Optional[RouteEntry]:
+        """Look up the sender of a media packet by the stream ID in its header"""
+        stream_id = peek_stream_id(data)
+        table = self.routing
+        entry = table.by_stream_id.get(stream_id)
+        if entry is None:
+            # Malformed packet or unknown sender
+            return None
         
-        try:
-            # Convert bytes to numpy arrays
-            arrays = []
-            for chunk in audio_chunks:
-                arr = np.frombuffer(chunk, dtype=np.int16)
-                arrays.append(arr)
-            
-            # Find minimum length
-            min_len = min(len(arr) for arr in arrays)
-            
-            # Truncate all to same length
-            arrays = [arr[:min_len] for arr in arrays]
-            
-            # Mix by averaging (prevents clipping)
-            mixed = np.mean(arrays, axis=0).astype(np.int16)
-            
-            return mixed.tobytes()
-        except Exception as e:
-            print(f"Error mixing audio: {e}")
-            # Return first chunk if mixing fails
-            return audio_chunks[0] if audio_chunks else b''
+        learned = table.by_video_addr if key == 'video_addr' else table.by_audio_addr
+        if learned.get(addr) is not entry:
+            entry = self.learn_media_address(stream_id, addr, key)
+        return entry
+    
+    def route_video_packet(self, data: bytes, addr: Tuple) -> Tuple:
+        """UDP addresses that should receive a video packet from addr"""
+        entry = self.resolve_media_sender(data, addr, 'video_addr')
+        if entry is None:
+            return ()
+        stream_id = entry.stream_id
+        self.video_cache.put(stream_id, peek_sequence(data), data, layer=data[2])
+        table = self.routing
+        variants = table.video_variants.get(stream_id)
+        if variants:
+            self.video_transcoder.add(data, stream_id, variants)
+        dests = self.video_layers.route(
+            data, stream_id,
+            table.video_receivers.get(stream_id, ()),
+            table.video_fanout.get(stream_id, ())
+        )
+        caps = table.video_caps.get(stream_id)
+        if caps:
+            dests = self.video_thinning.route(data, stream_id, dests, caps)
+        return dests
+    
+    def handle_video_feedback(self, data: bytes, addr: Tuple) -> list:
+        """(packet, dest) pairs answering a receiver's feedback packet"""
+        if data[3] == PAYLOAD_RECEIVER_REPORT:
+            # Simulcast senders: the relay first moves the receiver between layers
+            report = ReceiverReport.unpack(data)
+            if report is None or report.layer >= TRANSCODED_LAYER:
+                return []  # A weak receiver's variant says nothing about the sender's link
+            if not self.video_layers.on_report(
+                    report.stream_id, report.reporter_id, report.fraction_lost):
+                return []
+            # Reports go to the sender's bitrate controller
+            table = self.routing
+            dest = table.video_source.get(report.stream_id)
+            if not dest:
+                return []
+            reporter = table.by_stream_id.get(report.reporter_id)
+            caps = table.video_caps.get(report.stream_id)
+            if reporter is not None and caps and reporter.video_dest in caps:
+                # A capped receiver gets fewer frames on purpose: scale its throughput
+                # up to the full rate so the sender does not take it for a bottleneck
+                ratio = self.video_thinning.kept_ratio(report.stream_id, reporter.video_dest)
+                if ratio <= 0:
+                    return []
+                data = report._replace(
+                    throughput_kbps=int(report.throughput_kbps / ratio)).pack()
+            return [(data, dest)]
+        
+        if data[3] == PAYLOAD_LAYER_REQUEST:
+            # Receivers pick the simulcast layer they get from each sender
+            request = LayerRequest.unpack(data)
+            if request is not None:
+                self.video_layers.request(request.stream_id, request.requester_id, request.layer)
+            return []
+        
+        if data[3] != PAYLOAD_NACK:
+            return []
+        
+        # Resend only the requested packets, to the receiver that asked
+        stream_id, sequences = parse_nack(data)
+        replies = []
+        for sequence in sequences:
+            packet = self.video_cache.get(stream_id, sequence, layer=data[2])
+            if packet is not None:
+                replies.append((packet, addr))
+        return replies
+    
+    def buffer_audio_packet(self, data: bytes, addr: Tuple):
+        """Decode an audio chunk and queue it in its sender's jitter buffer"""
+        entry = self.resolve_media_sender(data, addr, 'audio_addr')
+        if entry is None:
+            return
+        buffer = self.audio_jitter.get(entry.stream_id)
+        if buffer is None:
+            return
+        
+        header = MediaHeader.unpack(data)
+        pcm = CompressionUtils.decode_audio(data[MEDIA_HEADER_SIZE:], header.payload_type)
+        if pcm is None:
+            return
+        self.speakers.update(entry.stream_id, pcm)
+        buffer.push(header, pcm)
+    
+    def mix_pending_audio(self) -> list:
+        """(packet, dests) for every distinct mix of this tick
+        
+        Takes exactly one frame, real or concealed, from every sender's
+        jitter buffer. Each mix is encoded once per codec its listeners
+        negotiated, and listeners sharing a mix and codec share the packet;
+        sequence and timestamp are the same for all packets of a tick.
+        """
+        for stream_id, buffer in self.audio_jitter.items():
+            frame = buffer.pop()
+            if frame is not None:
+                self.audio_mixer.put(stream_id, frame)
+        
+        mixes = self.audio_mixer.mix()
+        if not mixes:
+            return []
+        
+        header = MediaHeader(
+            stream_id=SERVER_STREAM_ID,
+            sequence=self.mix_sequence,
+            timestamp=self.mix_timestamp,
+            frame_id=self.mix_sequence,
+            payload_type=PAYLOAD_PCM16
+        )
+        self.mix_sequence += 1
+        self.mix_timestamp += len(mixes[0][0]) // 2
+        
+        routes = self.routing.by_stream_id
+        packets = []
+        for mixed, listeners in mixes:
+            by_codec = {}
+            for stream_id in listeners:
+                entry = routes.get(stream_id)
+                if entry is not None:
+                    by_codec.setdefault(entry.audio_codec, []).append(entry.audio_dest)
+            for payload_type, dests in by_codec.items():
+                payload = CompressionUtils.encode_audio(mixed, payload_type)
+                packets.append((header._replace(payload_type=payload_type).pack() + payload,
+                                tuple(dests)))
+        return packets
+    
+    def get_audio_stats(self) -> dict:
+        """Mixer, mixing clock and every sender's jitter buffer counters"""
+        stats = self.audio_mixer.get_stats()
+        stats['clock'] = self.audio_clock.get_stats()
+        stats['jitter'] = {
+            stream_id: buffer.get_stats() for stream_id, buffer in self.audio_jitter.items()
+        }
+        return stats
     
     def setup_screen_relay(self):
         """Setup TCP relay for screen sharing"""
@@ -400,12 +778,13 @@ class CollaborationServer:
             
             def handle_screen_client(conn, addr):
                 nonlocal active_presenter
+                self.outbound.register(conn)
                 screen_clients.append(conn)
                 
                 try:
                     while self.running:
                         # Receive data size first (4 bytes)
-                        size_data = conn.recv(4)
+                        size_data = recv_wait(conn, 4)
                         if not size_data:
                             break
                         
@@ -414,7 +793,7 @@ class CollaborationServer:
                         # Receive the actual data
                         data = b''
                         while len(data) < data_size:
-                            chunk = conn.recv(min(data_size - len(data), 65536))
+                            chunk = recv_wait(conn, min(data_size - len(data), 65536))
                             if not chunk:
                                 break
                             data += chunk
@@ -422,23 +801,19 @@ class CollaborationServer:
                         if len(data) != data_size:
                             break
                         
-                        # Parse: client_id_len(1) + client_id + screen_data
-                        if len(data) < 2:
+                        # Parse: media header + screen_data
+                        if peek_stream_id(data) is None:
                             continue
                         
-                        client_id_len = struct.unpack('B', data[0:1])[0]
-                        sender_id = data[1:1+client_id_len].decode('utf-8')
-                        
                         # Broadcast to all other screen clients
-                        for client_conn in screen_clients:
+                        frame = size_data + data
+                        for client_conn in list(screen_clients):
                             if client_conn != conn:
-                                try:
-                                    client_conn.sendall(size_data + data)
-                                except:
-                                    pass
+                                self.outbound.send(client_conn, frame, STREAM_SCREEN)
                 except Exception as e:
                     pass
                 finally:
+                    self.outbound.unregister(conn)
                     if conn in screen_clients:
                         screen_clients.remove(conn)
                     if active_presenter == conn:
@@ -511,21 +886,12 @@ class CollaborationServer:
                                 f.write(chunk)
                                 received += len(chunk)
                         
-                        # Store file metadata
-                        self.shared_files[file_id] = {
-                            'filename': filename,
-                            'size': filesize,
-                            'path': str(filepath),
-                            'uploader': uploader
-                        }
+                        self.register_shared_file(file_id, filename, filesize, filepath, uploader)
                         
                         # Send acknowledgment
                         response = {'status': 'success', 'message': 'File uploaded'}
                         conn.sendall(json.dumps(response).encode('utf-8'))
                         
-                        # Notify all clients about new file
-                        self.broadcast_file_notification(file_id, filename, filesize, uploader)
-                        
                     elif cmd_type == 'download':
                         # Handle file download
                         file_id = command.get('file_id')
@@ -559,16 +925,7 @@ class CollaborationServer:
                     
                     elif cmd_type == 'list':
                         # Send list of available files
-                        files_list = [
-                            {
-                                'file_id': fid,
-                                'filename': info['filename'],
-                                'size': info['size'],
-                                'uploader': info['uploader']
-                            }
-                            for fid, info in self.shared_files.items()
-                        ]
-                        response = {'status': 'success', 'files': files_list}
+                        response = {'status': 'success', 'files': self.list_shared_files()}
                         conn.sendall(json.dumps(response).encode('utf-8'))
                         
                 except Exception as e:
@@ -595,6 +952,30 @@ class CollaborationServer:
         except Exception as e:
             print(f"Error starting file server: {e}")
     
+    def register_shared_file(self, file_id, filename, filesize, filepath, uploader):
+        """Record an uploaded file and notify all clients about it"""
+        self.shared_files[file_id] = {
+            'filename': filename,
+            'size': filesize,
+            'path': str(filepath),
+            'uploader': uploader
+        }
+        
+        # Notify all clients about new file
+        self.broadcast_file_notification(file_id, filename, filesize, uploader)
+    
+    def list_shared_files(self) -> list:
+        """Get metadata for all shared files"""
+        return [
+            {
+                'file_id': fid,
+                'filename': info['filename'],
+                'size': info['size'],
+                'uploader': info['uploader']
+            }
+            for fid, info in self.shared_files.items()
+        ]
+    
     def broadcast_file_notification(self, file_id, filename, filesize, uploader):
         """Notify all clients about a new shared file"""
         message = {
@@ -604,14 +985,13 @@ class CollaborationServer:
             'size': filesize,
             'uploader': uploader
         }
-        data = json.dumps(message).encode('utf-8')
+        data = json.dumps(message).encode('utf-8') + b'\n'
         
         with self.clients_lock:
-            for client_id, info in self.clients.items():
-                try:
-                    info['control_conn'].sendall(data + b'\n')
-                except:
-                    pass
+            conns = [info['control_conn'] for info in self.clients.values()]
+        
+        for conn in conns:
+            self.send_control(conn, data)
     
     def setup_chat_server(self):
         """Setup chat message relay"""
@@ -634,23 +1014,22 @@ class CollaborationServer:
             chat_clients = []
             
             def handle_chat_client(conn, addr):
+                self.outbound.register(conn)
                 chat_clients.append(conn)
                 try:
                     while self.running:
-                        data = conn.recv(4096)
+                        data = recv_wait(conn, 4096)
                         if not data:
                             break
                         
                         # Broadcast to all chat clients
-                        for client_conn in chat_clients:
+                        for client_conn in list(chat_clients):
                             if client_conn != conn:
-                                try:
-                                    client_conn.sendall(data)
-                                except:
-                                    pass
+                                self.outbound.send(client_conn, data, STREAM_CHAT)
                 except:
                     pass
                 finally:
+                    self.outbound.unregister(conn)
                     if conn in chat_clients:
                         chat_clients.remove(conn)
                     conn.close()
@@ -675,6 +1054,9 @@ class CollaborationServer:
         """Stop server"""
         print("\nStopping server...")
         self.running = False
+        self.outbound.stop()
+        if self.video_transcoder:
+            self.video_transcoder.close()
         
         # Close all sockets
         for sock in [self.control_socket, self.video_socket, self.audio_socket,
@@ -688,11 +1070,23 @@ class CollaborationServer:
         print("Server stopped")
 
 
+def create_server(config_path: str = "configs/config.json") -> CollaborationServer:
+    """Create a server for the mode selected by server.mode in the config"""
+    config = read_config(config_path)
+    if config['server'].get('mode', 'threaded') == 'asyncio':
+        if __package__:
+            from .async_server import AsyncCollaborationServer
+        else:
+            from src.async_server import AsyncCollaborationServer
+        return AsyncCollaborationServer(config_path, config)
+    return CollaborationServer(config_path, config)
+
+
 def main():
     """Main server entry point"""
     import signal
     
-    server = CollaborationServer()
+    server = create_server()
     
     # Handle Ctrl+C gracefully
     def signal_handler(sig, frame):
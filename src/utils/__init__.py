@@ -1,4 +1,9 @@
 from .network_utils import NetworkUtils
 from .compression import CompressionUtils
+from .outbound import OutboundQueue, OutboundWriter, AsyncOutboundWriter
+from .routing_table import RoutingTable, RouteEntry
+from .media_header import MediaHeader, MEDIA_HEADER_SIZE
 
-__all__ = ['NetworkUtils', 'CompressionUtils']
\ No newline at end of file
+__all__ = ['NetworkUtils', 'CompressionUtils', 'OutboundQueue', 'OutboundWriter',
+           'AsyncOutboundWriter', 'RoutingTable', 'RouteEntry', 'MediaHeader',
+           'MEDIA_HEADER_SIZE']
\ No newline at end of file
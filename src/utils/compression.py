@@ -1,7 +1,68 @@
+import struct
 import zlib
 import numpy as np
 from typing import Tuple, Optional
 
+from .media_header import PAYLOAD_PCM16, PAYLOAD_ULAW, PAYLOAD_IMA_ADPCM
+
+# Audio codecs by the name clients list at join; the first one in the client's
+# list that the server also allows wins (negotiate_audio_codec)
+AUDIO_CODECS = {'adpcm': PAYLOAD_IMA_ADPCM, 'ulaw': PAYLOAD_ULAW, 'pcm16': PAYLOAD_PCM16}
+
+# G.711 mu-law: every 16-bit sample maps through one 64K-entry table
+ULAW_BIAS = 0x84
+ULAW_CLIP = 32635
+
+
+def _build_ulaw_tables() -> Tuple[np.ndarray, np.ndarray]:
+    """Encode table (by the sample's 16 bits) and decode table (by code)"""
+    samples = np.arange(-32768, 32768, dtype=np.int32)
+    magnitude = np.minimum(np.abs(samples), ULAW_CLIP) + ULAW_BIAS
+    exponent = np.floor(np.log2(magnitude)).astype(np.int32) - 7
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    sign = (samples < 0).astype(np.int32) << 7
+    codes = (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+    encode = np.empty(65536, dtype=np.uint8)
+    encode[samples.astype(np.int16).view(np.uint16)] = codes
+    
+    inverted = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (inverted >> 4) & 0x07
+    magnitude = ((((inverted & 0x0F) << 3) + ULAW_BIAS) << exponent) - ULAW_BIAS
+    decode = np.where(inverted & 0x80, -magnitude, magnitude).astype(np.int16)
+    return encode, decode
+
+
+_ULAW_ENCODE, _ULAW_DECODE = _build_ulaw_tables()
+
+# IMA-ADPCM: 4-bit codes, independent blocks of ADPCM_BLOCK samples
+ADPCM_BLOCK = 64
+_ADPCM_COUNT = struct.Struct('!H')  # Samples in the chunk
+_ADPCM_BLOCK_HEADER = np.dtype([('predictor', '>i2'), ('index', 'u1'), ('reserved', 'u1')])
+_ADPCM_STEPS = np.array([
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767
+], dtype=np.int32)
+_ADPCM_INDEX_STEPS = np.array([-1, -1, -1, -1, 2, 4, 6, 8], dtype=np.int32)
+
+# Indexed by step index * 16 + 4-bit code: signed reconstructed difference and
+# the next step index premultiplied by 16, so one sample costs two lookups
+_steps = _ADPCM_STEPS[:, None]
+_codes = np.arange(16)[None, :]
+_ADPCM_DELTA = ((_steps >> 3) + np.where(_codes & 4, _steps, 0)
+                + np.where(_codes & 2, _steps >> 1, 0)
+                + np.where(_codes & 1, _steps >> 2, 0))
+_ADPCM_DELTA = np.where(_codes & 8, -_ADPCM_DELTA, _ADPCM_DELTA).astype(np.int32).reshape(-1)
+_ADPCM_NEXT = (np.clip(np.arange(len(_ADPCM_STEPS))[:, None] + _ADPCM_INDEX_STEPS[_codes & 7],
+                       0, len(_ADPCM_STEPS) - 1) * 16).astype(np.int32).reshape(-1)
+_ADPCM_STEPS_X16 = np.repeat(_ADPCM_STEPS, 16)  # Step size by step index * 16
+del _steps, _codes
+
+
 class CompressionUtils:
     """Compression utility functions"""
     
@@ -47,3 +108,118 @@ class CompressionUtils:
     def decompress_audio(data: bytes) -> bytes:
         """Decompress audio data"""
         return zlib.decompress(data)
+    
+    @staticmethod
+    def encode_ulaw(pcm: bytes) -> bytes:
+        """G.711 mu-law: one byte per 16-bit sample"""
+        samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+        return _ULAW_ENCODE[samples.view(np.uint16)].tobytes()
+    
+    @staticmethod
+    def decode_ulaw(data: bytes) -> bytes:
+        """G.711 mu-law back to 16-bit PCM"""
+        return _ULAW_DECODE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+    
+    @staticmethod
+    def encode_adpcm(pcm: bytes) -> bytes:
+        """IMA-ADPCM: four bits per 16-bit sample
+        
+        The predictor makes each sample depend on the last, so the chunk is
+        cut into blocks of ADPCM_BLOCK samples that start from their own
+        predictor and step index, as in WAV's IMA-ADPCM. The blocks are then
+        coded side by side, one NumPy step per sample position rather than
+        per sample, and a lost packet never affects the next one.
+        """
+        samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+        count = len(samples)
+        if count == 0:
+            return _ADPCM_COUNT.pack(0)
+        blocks = -(-count // ADPCM_BLOCK)
+        padded = np.zeros(blocks * ADPCM_BLOCK, dtype=np.int32)
+        padded[:count] = samples
+        padded[count:] = padded[count - 1]  # Pad with a flat line
+        columns = padded.reshape(blocks, ADPCM_BLOCK).T.copy()
+        
+        # The first sample of a block is its predictor; the starting step
+        # fits the block's mean slope
+        predictor = columns[0].copy()
+        slope = np.abs(np.diff(columns, axis=0)).mean(axis=0)
+        index = np.minimum(np.searchsorted(_ADPCM_STEPS, slope), len(_ADPCM_STEPS) - 1)
+        header = np.zeros(blocks, dtype=_ADPCM_BLOCK_HEADER)
+        header['predictor'] = predictor
+        header['index'] = index
+        
+        codes = np.zeros((ADPCM_BLOCK, blocks), dtype=np.int32)  # Last row pads the nibbles
+        state = index * 16
+        for position in range(1, ADPCM_BLOCK):
+            diff = columns[position] - predictor
+            code = np.minimum((np.abs(diff) << 2) // _ADPCM_STEPS_X16[state], 7)
+            code |= (diff < 0) << 3
+            predictor += _ADPCM_DELTA[state + code]
+            np.minimum(predictor, 32767, out=predictor)
+            np.maximum(predictor, -32768, out=predictor)
+            state = _ADPCM_NEXT[state + code]
+            codes[position - 1] = code
+        
+        codes = codes.T.astype(np.uint8)
+        packed = codes[:, 0::2] | (codes[:, 1::2] << 4)  # First sample in the low nibble
+        body = np.concatenate([header.view(np.uint8).reshape(blocks, -1), packed], axis=1)
+        return _ADPCM_COUNT.pack(count) + body.tobytes()
+    
+    @staticmethod
+    def decode_adpcm(data: bytes) -> bytes:
+        """IMA-ADPCM back to 16-bit PCM"""
+        if len(data) < _ADPCM_COUNT.size:
+            return b''
+        count = _ADPCM_COUNT.unpack_from(data)[0]
+        block_size = _ADPCM_BLOCK_HEADER.itemsize + ADPCM_BLOCK // 2
+        blocks = min(-(-count // ADPCM_BLOCK), (len(data) - _ADPCM_COUNT.size) // block_size)
+        body = np.frombuffer(data, dtype=np.uint8, count=blocks * block_size,
+                             offset=_ADPCM_COUNT.size).reshape(blocks, block_size)
+        header = body[:, :_ADPCM_BLOCK_HEADER.itemsize].copy().view(_ADPCM_BLOCK_HEADER).reshape(-1)
+        packed = body[:, _ADPCM_BLOCK_HEADER.itemsize:]
+        codes = np.empty((blocks, ADPCM_BLOCK), dtype=np.int32)
+        codes[:, 0::2] = packed & 0x0F
+        codes[:, 1::2] = packed >> 4
+        codes = codes.T
+        
+        predictor = header['predictor'].astype(np.int32)
+        state = np.minimum(header['index'].astype(np.int32), len(_ADPCM_STEPS) - 1) * 16
+        columns = np.empty((ADPCM_BLOCK, blocks), dtype=np.int16)
+        columns[0] = predictor
+        for position in range(1, ADPCM_BLOCK):
+            code = codes[position - 1]
+            predictor += _ADPCM_DELTA[state + code]
+            np.minimum(predictor, 32767, out=predictor)
+            np.maximum(predictor, -32768, out=predictor)
+            state = _ADPCM_NEXT[state + code]
+            columns[position] = predictor
+        return columns.T.reshape(-1)[:count].tobytes()
+    
+    @staticmethod
+    def encode_audio(pcm: bytes, payload_type: int) -> bytes:
+        """Encode a 16-bit PCM chunk with the codec of an audio payload type"""
+        if payload_type == PAYLOAD_ULAW:
+            return CompressionUtils.encode_ulaw(pcm)
+        if payload_type == PAYLOAD_IMA_ADPCM:
+            return CompressionUtils.encode_adpcm(pcm)
+        return pcm
+    
+    @staticmethod
+    def decode_audio(payload: bytes, payload_type: int) -> Optional[bytes]:
+        """16-bit PCM from an audio payload, None for a type that is not audio"""
+        if payload_type == PAYLOAD_PCM16:
+            return payload
+        if payload_type == PAYLOAD_ULAW:
+            return CompressionUtils.decode_ulaw(payload)
+        if payload_type == PAYLOAD_IMA_ADPCM:
+            return CompressionUtils.decode_adpcm(payload)
+        return None
+    
+    @staticmethod
+    def negotiate_audio_codec(offered, supported=None) -> str:
+        """First codec of a client's list that this side supports, else 'pcm16'"""
+        for name in offered or ():
+            if name in AUDIO_CODECS and (supported is None or name in supported):
+                return name
+        return 'pcm16'
@@ -0,0 +1,62 @@
+import struct
+from typing import NamedTuple, Optional
+
+from .media_header import (
+    MediaHeader, MEDIA_HEADER_SIZE, PAYLOAD_RECEIVER_REPORT, PAYLOAD_LAYER_REQUEST
+)
+
+# reporter_stream_id(4) fraction_lost(2, /65535) jitter_ms(2) throughput_kbps(4)
+_REPORT = struct.Struct('!IHHI')
+
+# requester_stream_id(4)
+_LAYER_REQUEST = struct.Struct('!I')
+
+
+class ReceiverReport(NamedTuple):
+    """What one receiver saw from a sender over the last report interval"""
+    stream_id: int  # Sender the report is about
+    reporter_id: int  # Receiver's own stream ID
+    fraction_lost: float
+    jitter_ms: int
+    throughput_kbps: int
+    layer: int = 0  # Simulcast layer the receiver was getting
+    
+    def pack(self) -> bytes:
+        header = MediaHeader(stream_id=self.stream_id, sequence=0, timestamp=0,
+                             layer=self.layer, payload_type=PAYLOAD_RECEIVER_REPORT)
+        return header.pack() + _REPORT.pack(
+            self.reporter_id,
+            int(min(1.0, max(0.0, self.fraction_lost)) * 65535),
+            min(self.jitter_ms, 0xFFFF),
+            min(self.throughput_kbps, 0xFFFFFFFF)
+        )
+    
+    @classmethod
+    def unpack(cls, data: bytes) -> Optional['ReceiverReport']:
+        header = MediaHeader.unpack(data)
+        if header is None or header.payload_type != PAYLOAD_RECEIVER_REPORT \
+                or len(data) < MEDIA_HEADER_SIZE + _REPORT.size:
+            return None
+        reporter_id, lost, jitter, kbps = _REPORT.unpack_from(data, MEDIA_HEADER_SIZE)
+        return cls(header.stream_id, reporter_id, lost / 65535, jitter, kbps, header.layer)
+
+
+class LayerRequest(NamedTuple):
+    """Simulcast layer a receiver wants the relay to forward from a sender"""
+    stream_id: int  # Sender the request is about
+    requester_id: int  # Receiver's own stream ID
+    layer: int  # 0 = full resolution
+    
+    def pack(self) -> bytes:
+        header = MediaHeader(stream_id=self.stream_id, sequence=0, timestamp=0,
+                             layer=self.layer, payload_type=PAYLOAD_LAYER_REQUEST)
+        return header.pack() + _LAYER_REQUEST.pack(self.requester_id)
+    
+    @classmethod
+    def unpack(cls, data: bytes) -> Optional['LayerRequest']:
+        header = MediaHeader.unpack(data)
+        if header is None or header.payload_type != PAYLOAD_LAYER_REQUEST \
+                or len(data) < MEDIA_HEADER_SIZE + _LAYER_REQUEST.size:
+            return None
+        return cls(header.stream_id, _LAYER_REQUEST.unpack_from(data, MEDIA_HEADER_SIZE)[0],
+                   header.layer)
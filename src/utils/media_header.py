@@ -0,0 +1,174 @@
+import struct
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+MEDIA_HEADER_VERSION = 1
+
+# version(1) flags(1) layer(1) payload_type(1) stream_id(4) sequence(4)
+# timestamp(4) frame_id(4) chunk_index(2) chunk_count(2) - network byte order
+MEDIA_HEADER = struct.Struct('!BBBBIIIIHH')
+MEDIA_HEADER_SIZE = MEDIA_HEADER.size  # 24 bytes
+_STREAM_ID = struct.Struct('!I')
+_SEQUENCE = struct.Struct('!I')
+
+# Flags
+FLAG_KEYFRAME = 0x01  # Frame decodes on its own
+FLAG_FEC = 0x02  # XOR parity packet; chunk_index is the FEC group index
+
+# Payload types
+PAYLOAD_JPEG = 0
+PAYLOAD_PCM16 = 1
+PAYLOAD_TILES = 2  # Changed tiles of a frame, applied on the last keyframe
+PAYLOAD_ULAW = 3  # G.711 mu-law audio, one byte per sample
+PAYLOAD_IMA_ADPCM = 4  # IMA-ADPCM audio in independent blocks, four bits per sample
+
+# Feedback payload types (high bit set) travel from receivers back towards
+# the sender and are never fanned out by the relays
+PAYLOAD_FEEDBACK = 0x80
+PAYLOAD_NACK = 0x80  # List of missing sequence numbers of stream_id
+PAYLOAD_RECEIVER_REPORT = 0x81  # Loss/jitter/throughput a receiver saw from stream_id
+PAYLOAD_LAYER_REQUEST = 0x82  # Simulcast layer a receiver wants from stream_id (in layer)
+
+# Layers from here up carry variants the relay transcoded for weak receivers
+TRANSCODED_LAYER = 0x80
+
+# Stream ID used by the server for the audio mix it sends back
+SERVER_STREAM_ID = 0
+
+
+class MediaHeader(NamedTuple):
+    """Fixed-size header carried by every video, audio and screen packet
+
+    stream_id is the numeric ID the server assigns at the control handshake,
+    sequence counts packets per stream, timestamp is the capture time in the
+    stream's media clock (milliseconds for video/screen, samples for audio),
+    and frame_id/chunk_index/chunk_count place a chunk within its frame.
+    Simulcast layers (0 = full resolution) and relay-transcoded variants
+    (TRANSCODED_LAYER and up) each have their own sequence numbers, so a
+    stream's packets are ordered per (stream_id, layer).
+    """
+    stream_id: int
+    sequence: int
+    timestamp: int
+    frame_id: int = 0
+    chunk_index: int = 0
+    chunk_count: int = 1
+    flags: int = 0
+    layer: int = 0
+    payload_type: int = PAYLOAD_JPEG
+
+    def pack(self) -> bytes:
+        """Serialize to MEDIA_HEADER_SIZE bytes"""
+        return MEDIA_HEADER.pack(
+            MEDIA_HEADER_VERSION, self.flags, self.layer, self.payload_type,
+            self.stream_id, self.sequence & 0xFFFFFFFF, self.timestamp & 0xFFFFFFFF,
+            self.frame_id & 0xFFFFFFFF, self.chunk_index, self.chunk_count
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> Optional['MediaHeader']:
+        """Parse the header at the start of a packet, None if malformed"""
+        if len(data) < MEDIA_HEADER_SIZE or data[0] != MEDIA_HEADER_VERSION:
+            return None
+
+        (_, flags, layer, payload_type, stream_id, sequence, timestamp,
+         frame_id, chunk_index, chunk_count) = MEDIA_HEADER.unpack_from(data)
+        return cls(stream_id, sequence, timestamp, frame_id, chunk_index,
+                   chunk_count, flags, layer, payload_type)
+
+
+def peek_stream_id(data: bytes) -> Optional[int]:
+    """Read only the stream ID of a packet (relay fast path)"""
+    if len(data) < MEDIA_HEADER_SIZE or data[0] != MEDIA_HEADER_VERSION:
+        return None
+    return _STREAM_ID.unpack_from(data, 4)[0]
+
+
+def peek_sequence(data: bytes) -> int:
+    """Read only the sequence number of a packet already checked by peek_stream_id"""
+    return _SEQUENCE.unpack_from(data, 8)[0]
+
+
+def is_feedback(data: bytes) -> bool:
+    """True for receiver feedback packets (NACKs, reports) on a media port"""
+    return len(data) >= MEDIA_HEADER_SIZE and data[0] == MEDIA_HEADER_VERSION \
+        and data[3] & PAYLOAD_FEEDBACK != 0
+
+
+def media_timestamp() -> int:
+    """Current capture time in milliseconds for video and screen streams"""
+    return int(time.monotonic() * 1000) & 0xFFFFFFFF
+
+
+def serial_newer(a: int, b: int) -> bool:
+    """True if 32-bit counter a comes after b, allowing for wraparound"""
+    return a != b and ((a - b) & 0xFFFFFFFF) < 0x80000000
+
+
+class SequenceTracker:
+    """Counts lost and reordered packets per stream layer from header sequence numbers
+    
+    The counters are kept per stream_id, so one lossy sender shows up in its
+    own figures only; received, lost and reordered are their totals.
+    """
+    
+    def __init__(self):
+        self.highest = {}  # (stream_id, layer) -> highest sequence seen
+        self.streams: Dict[int, List[int]] = {}  # stream_id -> [received, lost, reordered]
+    
+    @property
+    def received(self) -> int:
+        return sum(counts[0] for counts in self.streams.values())
+    
+    @property
+    def lost(self) -> int:
+        return sum(counts[1] for counts in self.streams.values())
+    
+    @property
+    def reordered(self) -> int:
+        return sum(counts[2] for counts in self.streams.values())
+    
+    def update(self, header: MediaHeader):
+        """Account for one received packet"""
+        counts = self.streams.setdefault(header.stream_id, [0, 0, 0])
+        counts[0] += 1
+        track = (header.stream_id, header.layer)
+        highest = self.highest.get(track)
+        if highest is None:
+            self.highest[track] = header.sequence
+        elif serial_newer(header.sequence, highest):
+            counts[1] += (header.sequence - highest - 1) & 0xFFFFFFFF
+            self.highest[track] = header.sequence
+        elif counts[1]:
+            # Arrived after a later packet: it was counted as lost
+            counts[1] -= 1
+            counts[2] += 1
+    
+    def skip_to(self, header: MediaHeader):
+        """Packets of this layer before header were left out on purpose, not lost"""
+        track = (header.stream_id, header.layer)
+        highest = self.highest.get(track)
+        if highest is not None and serial_newer(header.sequence, highest):
+            self.highest[track] = (header.sequence - 1) & 0xFFFFFFFF
+    
+    def stream_stats(self, stream_id: int) -> dict:
+        """Packet counters of one stream"""
+        return self._stats(*self.streams.get(stream_id, (0, 0, 0)))
+    
+    def get_stats(self) -> dict:
+        """Packet counters across all streams, with each stream's loss rate"""
+        stats = self._stats(self.received, self.lost, self.reordered)
+        stats['loss_by_stream'] = {
+            stream_id: self._stats(*counts)['loss_rate'] for stream_id, counts in self.streams.items()
+        }
+        return stats
+    
+    @staticmethod
+    def _stats(received: int, lost: int, reordered: int) -> dict:
+        expected = received + lost
+        return {
+            'packets_received': received,
+            'packets_lost': lost,
+            'packets_reordered': reordered,
+            'loss_rate': round(lost / expected, 4) if expected else 0.0
+        }
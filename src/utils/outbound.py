@@ -0,0 +1,369 @@
+import socket
+import selectors
+import threading
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Stream types carried on TCP connections, with their overflow policy
+STREAM_CONTROL = 'control'
+STREAM_CHAT = 'chat'
+STREAM_SCREEN = 'screen'
+
+# Streams whose oldest queued message may be dropped when the queue is full.
+# Control and chat must never be dropped; screen frames are superseded anyway.
+DROPPABLE_STREAMS = {STREAM_SCREEN}
+
+
+def recv_wait(sock: socket.socket, size: int) -> bytes:
+    """Blocking recv on a connection the writer switched to non-blocking mode"""
+    while True:
+        try:
+            return sock.recv(size)
+        except (BlockingIOError, InterruptedError):
+            pass
+        # A selector, unlike select(), copes with descriptors past FD_SETSIZE
+        with selectors.DefaultSelector() as selector:
+            selector.register(sock, selectors.EVENT_READ)
+            selector.select()
+
+
+class OutboundQueue:
+    """Bounded per-connection send queue with per-stream drop policies
+    
+    Messages are queued whole and sent in order. When a droppable stream
+    pushes the queue past max_bytes, its oldest unsent messages are dropped.
+    A peer that stays over the limit for slow_timeout seconds (or grows past
+    four times the limit) should be disconnected.
+    """
+    
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024, slow_timeout: float = 5.0):
+        self.max_bytes = max_bytes
+        self.slow_timeout = slow_timeout
+        self.items = deque()  # [stream, memoryview]
+        self.head_offset = 0  # Bytes of items[0] already sent
+        self.queued_bytes = 0
+        self.over_limit_since = None
+        
+        # Statistics
+        self.dropped_messages = 0
+        self.sent_bytes = 0
+    
+    @property
+    def pending(self) -> bool:
+        return bool(self.items)
+    
+    def push(self, data: bytes, stream: str, now: Optional[float] = None) -> bool:
+        """Queue a message; returns False if the peer should be disconnected"""
+        if now is None:
+            now = time.monotonic()
+        
+        if stream in DROPPABLE_STREAMS and self.queued_bytes + len(data) > self.max_bytes:
+            self._drop_oldest(stream, len(data))
+        
+        self.items.append([stream, memoryview(data)])
+        self.queued_bytes += len(data)
+        
+        return self.check_limit(now)
+    
+    def _drop_oldest(self, stream: str, needed: int):
+        """Drop unsent messages of one stream, oldest first, to make room"""
+        # Never drop the head item once we started sending it
+        start = 1 if self.head_offset else 0
+        index = start
+        while index < len(self.items) and self.queued_bytes + needed > self.max_bytes:
+            if self.items[index][0] == stream:
+                self.queued_bytes -= len(self.items[index][1])
+                del self.items[index]
+                self.dropped_messages += 1
+            else:
+                index += 1
+    
+    def check_limit(self, now: Optional[float] = None) -> bool:
+        """Track time over the limit; False once the peer is too slow"""
+        if now is None:
+            now = time.monotonic()
+        
+        if self.queued_bytes <= self.max_bytes:
+            self.over_limit_since = None
+            return True
+        
+        if self.queued_bytes > self.max_bytes * 4:
+            return False
+        
+        if self.over_limit_since is None:
+            self.over_limit_since = now
+        return now - self.over_limit_since < self.slow_timeout
+    
+    def peek(self) -> memoryview:
+        """Unsent remainder of the oldest message"""
+        return self.items[0][1][self.head_offset:]
+    
+    def advance(self, sent: int):
+        """Mark bytes of the oldest message as sent"""
+        self.head_offset += sent
+        self.queued_bytes -= sent
+        self.sent_bytes += sent
+        if self.head_offset >= len(self.items[0][1]):
+            self.items.popleft()
+            self.head_offset = 0
+
+
+class OutboundWriter:
+    """Single background thread flushing every connection's send queue
+    
+    Producers call send() from any thread; it only queues the data, so a
+    stalled receiver never blocks the broadcaster. Registered sockets are
+    switched to non-blocking mode (their handler threads read them with
+    recv_wait), the writer thread sends when a socket becomes writable and
+    shuts down peers that stay over their queue limit, which ends their
+    handler thread's recv.
+    """
+    
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024, slow_timeout: float = 5.0):
+        self.max_bytes = max_bytes
+        self.slow_timeout = slow_timeout
+        
+        self.queues: Dict[socket.socket, OutboundQueue] = {}
+        self.dirty = set()  # Sockets with newly queued data
+        self.lock = threading.Lock()
+        
+        self.selector = selectors.DefaultSelector()
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ)
+        
+        self.running = False
+        self.thread = None
+        self.disconnects = 0
+    
+    def start(self):
+        """Start the writer thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def register(self, sock: socket.socket):
+        """Give a connection its own send queue"""
+        sock.setblocking(False)
+        with self.lock:
+            self.queues[sock] = OutboundQueue(self.max_bytes, self.slow_timeout)
+    
+    def unregister(self, sock: socket.socket):
+        """Forget a connection and discard anything still queued"""
+        with self.lock:
+            self.queues.pop(sock, None)
+        self._wake()
+    
+    def send(self, sock: socket.socket, data: bytes, stream: str = STREAM_CONTROL) -> bool:
+        """Queue data for a connection; returns False if it is not registered or was dropped"""
+        with self.lock:
+            queue = self.queues.get(sock)
+            if queue is None:
+                return False
+            if not queue.push(data, stream):
+                self._disconnect(sock)
+                return False
+            # One wakeup covers every socket queued before the writer runs
+            need_wake = not self.dirty
+            self.dirty.add(sock)
+        if need_wake:
+            self._wake()
+        return True
+    
+    def _wake(self):
+        try:
+            self.wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+    
+    def _disconnect(self, sock: socket.socket):
+        """Drop a slow consumer (called with lock held)"""
+        self.queues.pop(sock, None)
+        self.disconnects += 1
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    
+    def _flush(self, sock: socket.socket) -> bool:
+        """Send as much as the socket accepts; True if data remains (lock held)"""
+        queue = self.queues.get(sock)
+        if queue is None:
+            return False
+        
+        while queue.pending:
+            try:
+                sent = sock.send(queue.peek())
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self._disconnect(sock)
+                return False
+            queue.advance(sent)
+        
+        if queue.pending and not queue.check_limit():
+            self._disconnect(sock)
+            return False
+        return queue.pending
+    
+    def _run(self):
+        """Writer thread: wait for writable sockets and flush their queues"""
+        watched = set()
+        
+        while self.running:
+            for key, events in self.selector.select(timeout=0.5):
+                if key.fileobj is self.wake_r:
+                    try:
+                        while self.wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    with self.lock:
+                        self.dirty.add(key.fileobj)
+            
+            with self.lock:
+                candidates = self.dirty | watched
+                self.dirty = set()
+                want = {sock for sock in candidates if self._flush(sock)}
+            
+            for sock in watched - want:
+                try:
+                    self.selector.unregister(sock)
+                except (KeyError, ValueError, OSError):
+                    pass
+            for sock in want - watched:
+                if not self._watch(sock):
+                    want.discard(sock)
+            watched = want
+    
+    def _watch(self, sock: socket.socket) -> bool:
+        """Register a socket for EVENT_WRITE, replacing a stale entry for a reused fd"""
+        try:
+            stale = self.selector.get_map().get(sock.fileno())
+            if stale is not None:
+                self.selector.unregister(stale.fileobj)
+            self.selector.register(sock, selectors.EVENT_WRITE)
+            return True
+        except (KeyError, ValueError, OSError):
+            return False
+    
+    def get_stats(self) -> dict:
+        """Queue depth and drop counters across all connections"""
+        with self.lock:
+            return {
+                'connections': len(self.queues),
+                'queued_bytes': sum(q.queued_bytes for q in self.queues.values()),
+                'dropped_messages': sum(q.dropped_messages for q in self.queues.values()),
+                'disconnects': self.disconnects
+            }
+    
+    def stop(self):
+        """Stop the writer thread"""
+        self.running = False
+        self._wake()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.selector.close()
+        self.wake_r.close()
+        self.wake_w.close()
+
+
+class AsyncOutboundWriter:
+    """Event-loop counterpart of OutboundWriter for asyncio StreamWriters
+    
+    Messages go straight into the transport while its buffer is small; once
+    the peer falls behind they wait in the connection's OutboundQueue (where
+    the drop policies apply) and a pump task feeds them in as drain() allows.
+    Must be used from the event loop thread.
+    """
+    
+    # Transport buffer size above which messages are queued instead
+    HIGH_WATER = 64 * 1024
+    
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024, slow_timeout: float = 5.0):
+        self.max_bytes = max_bytes
+        self.slow_timeout = slow_timeout
+        self.queues: Dict[asyncio.StreamWriter, OutboundQueue] = {}
+        self.events: Dict[asyncio.StreamWriter, asyncio.Event] = {}
+        self.tasks: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self.disconnects = 0
+    
+    def register(self, writer: asyncio.StreamWriter):
+        """Give a connection its own send queue and pump task"""
+        self.queues[writer] = OutboundQueue(self.max_bytes, self.slow_timeout)
+        self.events[writer] = asyncio.Event()
+        self.tasks[writer] = asyncio.get_running_loop().create_task(self._pump(writer))
+    
+    def unregister(self, writer: asyncio.StreamWriter):
+        """Forget a connection and cancel its pump task"""
+        self.queues.pop(writer, None)
+        self.events.pop(writer, None)
+        task = self.tasks.pop(writer, None)
+        if task:
+            task.cancel()
+    
+    def send(self, writer: asyncio.StreamWriter, data: bytes, stream: str = STREAM_CONTROL) -> bool:
+        """Queue data for a connection; returns False if it is not registered or was dropped"""
+        queue = self.queues.get(writer)
+        if queue is None:
+            return False
+        
+        if not queue.pending and writer.transport.get_write_buffer_size() < self.HIGH_WATER:
+            writer.write(data)
+            queue.sent_bytes += len(data)
+            return True
+        
+        if not queue.push(data, stream):
+            self._disconnect(writer)
+            return False
+        self.events[writer].set()
+        return True
+    
+    def _disconnect(self, writer: asyncio.StreamWriter):
+        self.disconnects += 1
+        self.unregister(writer)
+        writer.transport.abort()
+    
+    async def _pump(self, writer: asyncio.StreamWriter):
+        queue = self.queues[writer]
+        event = self.events[writer]
+        
+        try:
+            while True:
+                await event.wait()
+                event.clear()
+                
+                while queue.pending:
+                    if writer.transport.get_write_buffer_size() >= self.HIGH_WATER:
+                        try:
+                            await asyncio.wait_for(writer.drain(), self.slow_timeout)
+                        except asyncio.TimeoutError:
+                            self._disconnect(writer)
+                            return
+                        continue
+                    
+                    chunk = queue.peek()
+                    writer.write(bytes(chunk))
+                    queue.advance(len(chunk))
+        except asyncio.CancelledError:
+            pass
+        except (ConnectionError, OSError):
+            self.unregister(writer)
+    
+    def get_stats(self) -> dict:
+        """Queue depth and drop counters across all connections"""
+        return {
+            'connections': len(self.queues),
+            'queued_bytes': sum(q.queued_bytes for q in self.queues.values()),
+            'dropped_messages': sum(q.dropped_messages for q in self.queues.values()),
+            'disconnects': self.disconnects
+        }
+    
+    def stop(self):
+        """Cancel all pump tasks"""
+        for writer in list(self.tasks):
+            self.unregister(writer)
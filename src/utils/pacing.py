@@ -0,0 +1,83 @@
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """Token bucket limiting bytes per second with a bounded burst
+    
+    reserve() always accepts the bytes and returns how long the caller
+    should wait before sending them, letting the bucket go into debt.
+    """
+    
+    def __init__(self, rate: float, burst: int, now: Optional[float] = None):
+        self.rate = rate  # Bytes per second
+        self.burst = burst  # Bytes that may be sent back to back
+        self.tokens = float(burst)
+        self.last = time.monotonic() if now is None else now
+    
+    def set_rate(self, rate: float, now: Optional[float] = None):
+        """Change the refill rate (takes effect from now)"""
+        self.refill(now)
+        self.rate = rate
+    
+    def refill(self, now: Optional[float] = None):
+        """Add the tokens earned since the last call"""
+        if now is None:
+            now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+    
+    def reserve(self, size: int, now: Optional[float] = None) -> float:
+        """Take size bytes of tokens; returns seconds to wait before sending"""
+        self.refill(now)
+        self.tokens -= size
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class Pacer:
+    """Spreads each video frame's packets over the frame interval
+    
+    The bucket rate is set per frame so the whole frame drains in
+    spread * frame interval, and at most burst bytes leave back to back.
+    Tracks how bursty the output was for comparison with unpaced sending.
+    clock and sleep default to the real monotonic clock and time.sleep.
+    """
+    
+    def __init__(self, fps: float = 30, burst: int = 12000, spread: float = 0.8,
+                 min_rate: float = 128 * 1024, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.interval = 1.0 / fps
+        self.spread = spread
+        self.min_rate = min_rate
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = TokenBucket(min_rate, burst, clock())
+        
+        # Statistics
+        self.current_burst = 0
+        self.max_burst = 0  # Most bytes sent without a pacing wait
+        self.wait_time = 0.0
+    
+    def start_frame(self, frame_bytes: int):
+        """Set the rate needed to send a frame within the frame interval"""
+        rate = frame_bytes / (self.interval * self.spread)
+        self.bucket.set_rate(max(rate, self.min_rate), self.clock())
+    
+    def wait(self, size: int):
+        """Block until a packet of size bytes may be sent"""
+        delay = self.bucket.reserve(size, self.clock())
+        if delay > 0:
+            self.sleep(delay)
+            self.wait_time += delay
+            self.current_burst = 0
+        self.current_burst += size
+        self.max_burst = max(self.max_burst, self.current_burst)
+    
+    def get_stats(self) -> dict:
+        """Burst and pacing delay statistics"""
+        return {
+            'max_burst_bytes': self.max_burst,
+            'pacing_wait_ms': round(self.wait_time * 1000, 1)
+        }
@@ -0,0 +1,176 @@
+import struct
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from .media_header import MediaHeader, MEDIA_HEADER_SIZE, PAYLOAD_NACK, serial_newer
+
+_SEQUENCE = struct.Struct('!I')
+
+# Sequence numbers per NACK packet (keeps it well under one MTU)
+MAX_NACK_ENTRIES = 128
+
+
+def build_nack(stream_id: int, sequences: List[int], layer: int = 0) -> bytes:
+    """NACK packet asking for stream_id's packets with these sequence numbers in a layer"""
+    header = MediaHeader(stream_id=stream_id, sequence=0, timestamp=0, layer=layer,
+                         payload_type=PAYLOAD_NACK)
+    body = b''.join(_SEQUENCE.pack(seq & 0xFFFFFFFF) for seq in sequences[:MAX_NACK_ENTRIES])
+    return header.pack() + body
+
+
+def parse_nack(data: bytes) -> Tuple[int, List[int]]:
+    """(stream_id, missing sequence numbers) of a NACK packet"""
+    header = MediaHeader.unpack(data)
+    if header is None or header.payload_type != PAYLOAD_NACK:
+        return 0, []
+    body = data[MEDIA_HEADER_SIZE:]
+    count = min(len(body) // _SEQUENCE.size, MAX_NACK_ENTRIES)
+    return header.stream_id, [
+        _SEQUENCE.unpack_from(body, i * _SEQUENCE.size)[0] for i in range(count)
+    ]
+
+
+class RetransmitCache:
+    """Bounded, time-evicted cache of recently sent media packets
+    
+    Keyed by (stream_id, layer, sequence). Holds at most max_packets packets and
+    none older than max_age seconds, so memory stays flat however many
+    senders are active.
+    """
+    
+    def __init__(self, max_packets: int = 4096, max_age: float = 1.0):
+        self.max_packets = max_packets
+        self.max_age = max_age
+        self.packets: Dict[Tuple[int, int, int], bytes] = {}
+        self.order = deque()  # (time, key) in insertion order
+        
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+    
+    def put(self, stream_id: int, sequence: int, packet: bytes, now: Optional[float] = None,
+            layer: int = 0):
+        """Remember a packet that was just sent"""
+        if now is None:
+            now = time.monotonic()
+        key = (stream_id, layer, sequence)
+        self.packets[key] = packet
+        self.order.append((now, key))
+        self.evict(now)
+    
+    def get(self, stream_id: int, sequence: int, layer: int = 0) -> Optional[bytes]:
+        """Packet to retransmit, or None if it was never seen or already evicted"""
+        packet = self.packets.get((stream_id, layer, sequence))
+        if packet is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return packet
+    
+    def evict(self, now: Optional[float] = None):
+        """Drop packets beyond the size bound or older than max_age"""
+        if now is None:
+            now = time.monotonic()
+        order = self.order
+        while order and (len(order) > self.max_packets or now - order[0][0] > self.max_age):
+            _, key = order.popleft()
+            self.packets.pop(key, None)
+    
+    def get_stats(self) -> dict:
+        """Cache size and hit counters"""
+        return {
+            'cached_packets': len(self.packets),
+            'retransmit_hits': self.hits,
+            'retransmit_misses': self.misses
+        }
+
+
+class NackTracker:
+    """Receiver-side bookkeeping of missing packets to NACK
+    
+    A gap in a stream layer's sequence numbers is NACKed at once, re-NACKed
+    every retry_interval while still missing, and given up after deadline
+    seconds (by then the frame it belongs to has been dropped anyway).
+    """
+    
+    # A jump this far ahead is a sender restart, not a burst loss
+    MAX_GAP = 512
+    
+    def __init__(self, retry_interval: float = 0.05, deadline: float = 0.5):
+        self.retry_interval = retry_interval
+        self.deadline = deadline
+        self.highest: Dict[Tuple[int, int], int] = {}  # (stream_id, layer) -> highest sequence
+        self.missing: Dict[Tuple[int, int, int], List[float]] = {}  # key -> [first_seen, next_nack]
+        
+        # Statistics
+        self.nacks_sent = 0
+        self.nacked_packets = 0
+        self.repaired = 0
+        self.given_up = 0
+    
+    def update(self, header: MediaHeader, now: Optional[float] = None):
+        """Account for one received packet"""
+        if now is None:
+            now = time.monotonic()
+        track, sequence = (header.stream_id, header.layer), header.sequence
+        
+        highest = self.highest.get(track)
+        if highest is None or not serial_newer(sequence, highest):
+            if highest is None:
+                self.highest[track] = sequence
+            elif self.missing.pop(track + (sequence,), None) is not None:
+                self.repaired += 1
+            return
+        
+        gap = (sequence - highest - 1) & 0xFFFFFFFF
+        if gap <= self.MAX_GAP:
+            for offset in range(1, gap + 1):
+                self.missing[track + ((highest + offset) & 0xFFFFFFFF,)] = [now, now]
+        self.highest[track] = sequence
+    
+    def skip_to(self, header: MediaHeader):
+        """Packets of this layer before header were left out on purpose: never NACK them"""
+        track = (header.stream_id, header.layer)
+        highest = self.highest.get(track)
+        if highest is not None and serial_newer(header.sequence, highest):
+            self.highest[track] = (header.sequence - 1) & 0xFFFFFFFF
+    
+    def due(self, now: Optional[float] = None) -> Dict[Tuple[int, int], List[int]]:
+        """Missing sequence numbers to NACK now, grouped by (stream_id, layer)"""
+        if now is None:
+            now = time.monotonic()
+        
+        requests: Dict[Tuple[int, int], List[int]] = {}
+        expired = []
+        for key, times in self.missing.items():
+            if now - times[0] > self.deadline:
+                expired.append(key)
+            elif now >= times[1]:
+                times[1] = now + self.retry_interval
+                requests.setdefault(key[:2], []).append(key[2])
+        
+        for key in expired:
+            del self.missing[key]
+        self.given_up += len(expired)
+        
+        for sequences in requests.values():
+            self.nacks_sent += (len(sequences) + MAX_NACK_ENTRIES - 1) // MAX_NACK_ENTRIES
+            self.nacked_packets += len(sequences)
+        return requests
+    
+    def forget(self, stream_id: int):
+        """Drop all state for a sender that left"""
+        for track in [track for track in self.highest if track[0] == stream_id]:
+            del self.highest[track]
+        for key in [key for key in self.missing if key[0] == stream_id]:
+            del self.missing[key]
+    
+    def get_stats(self) -> dict:
+        """NACK counters"""
+        return {
+            'nacks_sent': self.nacks_sent,
+            'nacked_packets': self.nacked_packets,
+            'repaired_packets': self.repaired,
+            'unrepaired_packets': self.given_up
+        }
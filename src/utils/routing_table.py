@@ -0,0 +1,132 @@
+from typing import Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+from .media_header import PAYLOAD_PCM16
+from .compression import AUDIO_CODECS
+
+Address = Tuple[str, int]
+
+
+class RouteEntry(NamedTuple):
+    """Routing information for one client"""
+    client_id: str
+    stream_id: int
+    video_dest: Address
+    audio_dest: Address
+    subscriptions: Optional[FrozenSet[int]] = None  # Senders it wants video from, None = all
+    pinned: FrozenSet[int] = frozenset()  # Senders it gets even outside the last N speakers
+    max_fps: Optional[Dict[int, float]] = None  # Frame rate caps it set per sender
+    transcode: Optional[tuple] = None  # Relay-transcoded variant it gets instead of the originals
+    audio_codec: int = PAYLOAD_PCM16  # Payload type of the audio mix it gets
+    
+    def receives_video(self, stream_id: int, video_senders: Optional[FrozenSet[int]] = None) -> bool:
+        """True if this client gets a sender's video
+        
+        video_senders is the last-N speaker set (None = every sender).
+        """
+        if self.subscriptions is not None and stream_id not in self.subscriptions:
+            return False
+        return video_senders is None or stream_id in video_senders or stream_id in self.pinned
+
+
+class RoutingTable:
+    """Immutable snapshot of media routes for the UDP relays
+    
+    Built from the server's client dictionary whenever membership or a
+    learned media address changes, then swapped in with a single attribute
+    assignment. The relays read whichever snapshot is current without taking
+    clients_lock, and every per-packet lookup is a single dict access.
+    """
+    
+    def __init__(self, entries: Tuple[RouteEntry, ...] = (),
+                 video_sources: Optional[Dict[Address, int]] = None,
+                 audio_sources: Optional[Dict[Address, int]] = None,
+                 video_senders: Optional[FrozenSet[int]] = None):
+        self.entries = tuple(entries)
+        self.video_senders = video_senders  # Last-N speakers forwarded to everybody, None = all
+        self.by_stream_id = {e.stream_id: e for e in self.entries}
+        self.by_client_id = {e.client_id: e for e in self.entries}
+        
+        # Learned UDP source address -> sender entry
+        self.by_video_addr = {
+            addr: self.by_stream_id[sid] for addr, sid in (video_sources or {}).items()
+            if sid in self.by_stream_id
+        }
+        self.by_audio_addr = {
+            addr: self.by_stream_id[sid] for addr, sid in (audio_sources or {}).items()
+            if sid in self.by_stream_id
+        }
+        
+        # Sender stream_id -> learned video source address, for feedback to the sender
+        self.video_source = {entry.stream_id: addr for addr, entry in self.by_video_addr.items()}
+        
+        # Precomputed fan-out: sender stream_id -> (stream_id, destination) of
+        # everyone else subscribed to it, so selective forwarding costs nothing per packet
+        self.video_receivers = {
+            e.stream_id: tuple(
+                (o.stream_id, o.video_dest) for o in self.entries
+                if o is not e and o.transcode is None
+                and o.receives_video(e.stream_id, video_senders)
+            )
+            for e in self.entries
+        }
+        self.video_fanout = {
+            stream_id: tuple(dest for _, dest in receivers)
+            for stream_id, receivers in self.video_receivers.items()
+        }
+        # Sender stream_id -> {receiver destination: minimum frame interval in ms},
+        # only for senders that some receiver capped
+        self.video_caps = {}
+        for e in self.entries:
+            caps = {
+                o.video_dest: int(round(1000 / o.max_fps[e.stream_id]))
+                for o in self.entries
+                if o is not e and o.max_fps and e.stream_id in o.max_fps
+                and o.video_dest in self.video_fanout[e.stream_id]
+            }
+            if caps:
+                self.video_caps[e.stream_id] = caps
+        # Sender stream_id -> {variant: destinations} for receivers of transcoded
+        # variants, only for senders that somebody gets one of
+        self.video_variants = {}
+        for e in self.entries:
+            variants = {}
+            for o in self.entries:
+                if o is not e and o.transcode is not None \
+                        and o.receives_video(e.stream_id, video_senders):
+                    variants[o.transcode] = variants.get(o.transcode, ()) + (o.video_dest,)
+            if variants:
+                self.video_variants[e.stream_id] = variants
+    
+    @classmethod
+    def build(cls, clients: Dict[str, Dict], video_port: int, audio_port: int,
+              video_senders: Optional[FrozenSet[int]] = None) -> 'RoutingTable':
+        """Build a snapshot from the server's client dictionary (caller holds clients_lock)"""
+        entries = []
+        video_sources = {}
+        audio_sources = {}
+        
+        for client_id, info in clients.items():
+            stream_id = info['stream_id']
+            video_addr = info.get('video_addr', info['address'])
+            audio_addr = info.get('audio_addr', info['address'])
+            entries.append(RouteEntry(
+                client_id=client_id,
+                stream_id=stream_id,
+                video_dest=(video_addr[0], video_port),
+                audio_dest=(audio_addr[0], audio_port),
+                subscriptions=info.get('subscriptions'),
+                pinned=info.get('pinned', frozenset()),
+                max_fps=info.get('max_fps'),
+                transcode=info.get('transcode'),
+                audio_codec=AUDIO_CODECS[info.get('audio_codec', 'pcm16')]
+            ))
+            
+            if 'video_addr' in info:
+                video_sources[info['video_addr']] = stream_id
+            if 'audio_addr' in info:
+                audio_sources[info['audio_addr']] = stream_id
+        
+        return cls(tuple(entries), video_sources, audio_sources, video_senders)
+    
+    def __len__(self) -> int:
+        return len(self.entries)
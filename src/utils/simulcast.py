@@ -0,0 +1,146 @@
+import time
+from typing import Dict, Optional, Tuple
+
+from .media_header import MediaHeader, FLAG_KEYFRAME, FLAG_FEC
+
+Address = Tuple[str, int]
+
+# Resolution of each simulcast layer relative to the captured frame
+SIMULCAST_SCALES = (1.0, 0.5, 0.25)
+MAX_LAYERS = len(SIMULCAST_SCALES)
+
+
+def layer_for_display(full_size: Tuple[int, int], display: Tuple[int, int]) -> int:
+    """Smallest simulcast layer still at least as large as it is shown
+    
+    full_size is the sender's layer 0 resolution and display the box it is
+    shown in, both (width, height); the frame is fitted with its aspect
+    ratio kept.
+    """
+    scale = min(display[0] / full_size[0], display[1] / full_size[1])
+    layer = 0
+    for index, layer_scale in enumerate(SIMULCAST_SCALES):
+        if layer_scale >= scale:
+            layer = index
+    return layer
+
+
+class LayerSelector:
+    """Relay-side choice of the simulcast layer each receiver gets from each sender
+    
+    A receiver gets the layer it asked for (PAYLOAD_LAYER_REQUEST), moved
+    further down while its receiver reports show loss and back up once they
+    are clean for up_hold seconds. Only when it is already on the lowest
+    layer are its reports passed on to the sender's bitrate controller, so
+    one poor link no longer lowers the quality everybody else gets.
+    
+    A switch takes effect at the first packet of a keyframe in the new
+    layer, and the old layer stops at the same point; senders send the
+    layers of a frame one after the other, so no receiver ever gets half a
+    frame of either layer. Senders without simulcast take the plain fan-out
+    path untouched.
+    """
+    
+    LOSS_DOWN = 0.08
+    LOSS_UP = 0.02
+    
+    def __init__(self, up_hold: float = 5.0):
+        self.up_hold = up_hold
+        self.top_layer: Dict[int, int] = {}  # sender -> highest layer index seen
+        self.requested: Dict[Tuple[int, int], int] = {}  # (sender, receiver) -> layer asked for
+        self.penalty: Dict[Tuple[int, int], int] = {}  # (sender, receiver) -> layers down for loss
+        self.last_down: Dict[Tuple[int, int], float] = {}
+        self.current: Dict[Tuple[int, int], int] = {}  # (sender, receiver) -> layer forwarded
+        self.forward: Dict[Tuple[int, int], tuple] = {}  # (sender, layer) -> (receivers, dests)
+        
+        # Statistics
+        self.switches = 0
+        self.reports_absorbed = 0
+    
+    def is_simulcast(self, sender: int) -> bool:
+        return self.top_layer.get(sender, 0) > 0
+    
+    def target(self, sender: int, receiver: int) -> int:
+        """Layer this receiver should be getting from sender"""
+        key = (sender, receiver)
+        wanted = self.requested.get(key, 0) + self.penalty.get(key, 0)
+        return min(wanted, self.top_layer.get(sender, 0))
+    
+    def route(self, data: bytes, sender: int, receivers: Tuple[Tuple[int, Address], ...],
+              fanout: Tuple[Address, ...]) -> Tuple[Address, ...]:
+        """Destinations of one packet from sender (fanout = every other client)"""
+        layer = data[2]
+        if layer == 0 and not self.top_layer.get(sender):
+            return fanout
+        if layer > self.top_layer.get(sender, 0):
+            if not self.top_layer.get(sender):
+                # Everybody was on the plain fan-out, i.e. layer 0
+                for receiver, _ in receivers:
+                    self.current.setdefault((sender, receiver), 0)
+            self.top_layer[sender] = layer
+            self.forward = {}
+        
+        header = MediaHeader.unpack(data)
+        if header.chunk_index == 0 and header.flags & FLAG_KEYFRAME \
+                and not header.flags & FLAG_FEC:
+            # Frame boundary in this layer: receivers waiting for it switch now
+            for receiver, _ in receivers:
+                key = (sender, receiver)
+                if self.current.get(key) != layer and self.target(sender, receiver) == layer:
+                    self.current[key] = layer
+                    self.forward = {}
+                    self.switches += 1
+        
+        # Recomputed only after a switch or a routing table change
+        cached = self.forward.get((sender, layer))
+        if cached is not None and cached[0] is receivers:
+            return cached[1]
+        dests = tuple(
+            dest for receiver, dest in receivers
+            if self.current.get((sender, receiver)) == layer
+        )
+        self.forward[(sender, layer)] = (receivers, dests)
+        return dests
+    
+    def request(self, sender: int, receiver: int, layer: int):
+        """A receiver asked for a layer of sender (0 = full resolution)"""
+        self.requested[(sender, receiver)] = min(layer, MAX_LAYERS - 1)
+    
+    def on_report(self, sender: int, receiver: int, fraction_lost: float,
+                  now: Optional[float] = None) -> bool:
+        """Adjust for a receiver report; True if it should still go to the sender"""
+        if not self.is_simulcast(sender):
+            return True
+        if now is None:
+            now = time.monotonic()
+        
+        key = (sender, receiver)
+        penalty = self.penalty.get(key, 0)
+        at_bottom = self.target(sender, receiver) >= self.top_layer[sender]
+        if fraction_lost >= self.LOSS_DOWN and not at_bottom:
+            self.penalty[key] = penalty + 1
+            self.last_down[key] = now
+        elif fraction_lost < self.LOSS_UP and penalty \
+                and now - self.last_down.get(key, 0.0) >= self.up_hold:
+            self.penalty[key] = penalty - 1
+            self.last_down[key] = now
+        
+        if at_bottom:
+            return True
+        self.reports_absorbed += 1
+        return False
+    
+    def forget(self, stream_id: int):
+        """Drop all state of a client that left, as sender and as receiver"""
+        self.top_layer.pop(stream_id, None)
+        for table in (self.requested, self.penalty, self.last_down, self.current):
+            for key in [key for key in list(table) if stream_id in key]:
+                table.pop(key, None)
+        self.forward = {}
+    
+    def get_stats(self) -> dict:
+        return {
+            'simulcast_senders': sum(1 for top in self.top_layer.values() if top),
+            'layer_switches': self.switches,
+            'reports_absorbed': self.reports_absorbed
+        }
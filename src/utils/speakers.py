@@ -0,0 +1,149 @@
+import math
+import threading
+import time
+from typing import Dict, FrozenSet, List, Optional
+
+import numpy as np
+
+SILENCE_DB = -100.0
+
+
+def energy_db(pcm: bytes) -> float:
+    """Mean energy of a PCM16 chunk in dBFS (SILENCE_DB for an empty chunk)"""
+    samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2).astype(np.float32)
+    if len(samples) == 0:
+        return SILENCE_DB
+    power = float(np.dot(samples, samples)) / len(samples)
+    return max(SILENCE_DB, 10.0 * math.log10(power / (32768.0 * 32768.0) + 1e-10))
+
+
+class SpeakerTracker:
+    """Dominant speaker and last-N ranking from the energy of every sender's audio
+    
+    The relay feeds the PCM of each audio packet to update() and calls
+    evaluate() once per mix interval. A sender counts as speaking once its
+    smoothed energy has stayed above threshold_db for promote_hold seconds,
+    which ignores coughs and clicks. Speakers outside the last N move to the
+    front of the ranking, pushing out the least recent one; speakers already
+    inside keep their place, so several people talking at once do not churn
+    the forwarded set. The dominant speaker changes when the current one
+    falls silent, or when another speaker stays switch_margin_db louder for
+    switch_hold seconds.
+    """
+    
+    def __init__(self, last_n: int = 0, threshold_db: float = -45.0,
+                 promote_hold: float = 0.3, switch_margin_db: float = 6.0,
+                 switch_hold: float = 1.0, smoothing: float = 0.3, stale_after: float = 0.2):
+        self.last_n = last_n  # 0 = forward every sender's video
+        self.threshold_db = threshold_db
+        self.promote_hold = promote_hold
+        self.switch_margin_db = switch_margin_db
+        self.switch_hold = switch_hold
+        self.smoothing = smoothing
+        self.stale_after = stale_after  # Packets stopped (muted): treated as silence
+        
+        self.lock = threading.Lock()
+        self.levels: Dict[int, float] = {}  # stream_id -> smoothed energy in dBFS
+        self.last_seen: Dict[int, float] = {}
+        self.active_since: Dict[int, float] = {}  # stream_id -> start of speech
+        self.ranking: List[int] = []  # Most recent speaker first, then join order
+        self.dominant: Optional[int] = None
+        self.candidate: Optional[int] = None
+        self.candidate_since = 0.0
+        
+        # Statistics
+        self.dominant_changes = 0
+        self.last_n_changes = 0
+    
+    def add(self, stream_id: int):
+        """A participant joined; it ranks behind everybody who spoke"""
+        with self.lock:
+            if stream_id not in self.ranking:
+                self.ranking.append(stream_id)
+    
+    def remove(self, stream_id: int):
+        """A participant left"""
+        with self.lock:
+            if stream_id in self.ranking:
+                self.ranking.remove(stream_id)
+            for table in (self.levels, self.last_seen, self.active_since):
+                table.pop(stream_id, None)
+            if self.dominant == stream_id:
+                self.dominant = None
+            if self.candidate == stream_id:
+                self.candidate = None
+    
+    def update(self, stream_id: int, pcm: bytes, now: Optional[float] = None):
+        """Account for one audio packet's PCM16 payload"""
+        level = energy_db(pcm)
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            previous = self.levels.get(stream_id)
+            if previous is not None:
+                level = previous + self.smoothing * (level - previous)
+            self.levels[stream_id] = level
+            self.last_seen[stream_id] = now
+            if stream_id not in self.ranking:
+                self.ranking.append(stream_id)
+    
+    def last_n_streams(self) -> Optional[FrozenSet[int]]:
+        """Senders whose video is forwarded, None if last-N is off"""
+        if not self.last_n:
+            return None
+        return frozenset(self.ranking[:self.last_n])
+    
+    def evaluate(self, now: Optional[float] = None) -> bool:
+        """Update the ranking and dominant speaker; True if either changed"""
+        if now is None:
+            now = time.monotonic()
+        
+        with self.lock:
+            before = (self.dominant, self.last_n_streams())
+            
+            speaking = []
+            for stream_id, level in self.levels.items():
+                if now - self.last_seen[stream_id] > self.stale_after:
+                    level = self.levels[stream_id] = SILENCE_DB
+                if level < self.threshold_db:
+                    self.active_since.pop(stream_id, None)
+                elif now - self.active_since.setdefault(stream_id, now) >= self.promote_hold:
+                    speaking.append(stream_id)
+            
+            # Last-N: speakers outside the window move to the front, loudest last
+            window = self.last_n or len(self.ranking)
+            for stream_id in sorted(speaking, key=self.levels.get):
+                if stream_id not in self.ranking[:window]:
+                    self.ranking.remove(stream_id)
+                    self.ranking.insert(0, stream_id)
+            
+            loudest = max(speaking, key=self.levels.get, default=None)
+            if loudest is None or loudest == self.dominant:
+                self.candidate = None
+            elif self.dominant not in speaking:
+                self.dominant = loudest
+                self.candidate = None
+            elif self.levels[loudest] >= self.levels[self.dominant] + self.switch_margin_db:
+                if self.candidate != loudest:
+                    self.candidate, self.candidate_since = loudest, now
+                elif now - self.candidate_since >= self.switch_hold:
+                    self.dominant = loudest
+                    self.candidate = None
+            else:
+                self.candidate = None
+            
+            after = (self.dominant, self.last_n_streams())
+            if after[0] != before[0]:
+                self.dominant_changes += 1
+            if after[1] != before[1]:
+                self.last_n_changes += 1
+            return after != before
+    
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'dominant_speaker': self.dominant,
+                'last_n': sorted(self.last_n_streams() or ()),
+                'dominant_changes': self.dominant_changes,
+                'last_n_changes': self.last_n_changes
+            }
@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from .media_header import MediaHeader, FLAG_KEYFRAME, PAYLOAD_TILES
+
+Address = Tuple[str, int]
+
+
+class FrameThinner:
+    """Relay-side frame rate caps that receivers set per sender
+    
+    A capped receiver gets a frame when the frame's media timestamp has
+    reached the receiver's next due time, which then moves on by one frame
+    interval; for the same timestamps the same frames are always kept. The
+    decision is made once per (sender, layer, frame_id) and cached, so every
+    chunk, parity and late packet of a frame follows it and no receiver ever
+    gets part of a frame. Tile deltas build on the frame before them, so
+    after skipping one a receiver gets nothing but the next keyframe.
+    
+    The share of frames each capped receiver keeps is tracked as well, so its
+    receiver reports can be scaled back to the sender's full rate. The relay
+    thread routes and reads ratios while the control thread forgets clients,
+    so all state is guarded by one lock.
+    """
+    
+    SLACK = 0.1  # Share of the interval a frame may come early (sender jitter)
+    RATIO_WINDOW = 64  # Frames after which the kept share counts are halved
+    
+    def __init__(self, max_frames: int = 256):
+        self.max_frames = max_frames
+        self.due: Dict[Tuple[int, Address], int] = {}  # (sender, dest) -> next due timestamp
+        self.broken = set()  # (sender, dest) that skipped a tile delta since the last keyframe
+        self.tile_senders = set()
+        self.counts: Dict[Tuple[int, Address], list] = {}  # (sender, dest) -> [offered, kept]
+        self.decisions = OrderedDict()  # (sender, layer, frame_id) -> decision
+        self.lock = threading.Lock()
+        
+        # Statistics
+        self.frames_kept = 0
+        self.frames_thinned = 0
+    
+    def route(self, data: bytes, sender: int, dests: Tuple[Address, ...],
+              caps: Dict[Address, int]) -> Tuple[Address, ...]:
+        """dests with capped receivers left out for frames over their rate
+        
+        caps maps a receiver's video address to its minimum frame interval in
+        milliseconds (the sender's media clock).
+        """
+        header = MediaHeader.unpack(data)
+        key = (sender, header.layer, header.frame_id)
+        with self.lock:
+            cached = self.decisions.get(key)
+            if cached is not None and cached[0] is dests and cached[1] is caps:
+                return cached[2]
+            
+            if cached is None:
+                kept = frozenset(dest for dest in dests if dest in caps and self._fits(
+                    sender, dest, caps[dest], header))
+            else:
+                # Routing changed mid-frame: capped receivers only get frames they started
+                kept = cached[3]
+            forwarded = tuple(dest for dest in dests if dest not in caps or dest in kept)
+            
+            self.decisions[key] = (dests, caps, forwarded, kept)
+            if len(self.decisions) > self.max_frames:
+                self.decisions.popitem(last=False)
+            return forwarded
+    
+    def _fits(self, sender: int, dest: Address, interval: int, header: MediaHeader) -> bool:
+        """Decide once whether a capped receiver gets this frame (lock held by route)"""
+        state = (sender, dest)
+        keyframe = header.flags & FLAG_KEYFRAME
+        due = self.due.get(state)
+        counts = self.counts.setdefault(state, [0, 0])
+        if counts[0] >= self.RATIO_WINDOW:
+            counts[0] //= 2
+            counts[1] //= 2
+        counts[0] += 1
+        
+        if header.payload_type == PAYLOAD_TILES:
+            self.tile_senders.add(sender)
+        
+        if state in self.broken and not keyframe:
+            fits = False  # Only a keyframe repairs a broken delta chain
+        elif due is None:
+            fits = True
+        else:
+            # Signed distance in the 32-bit media clock
+            early = ((due - header.timestamp + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+            fits = early <= interval * self.SLACK
+        
+        if not fits:
+            if sender in self.tile_senders:
+                self.broken.add(state)
+            self.frames_thinned += 1
+            return False
+        
+        self.broken.discard(state)
+        # Fall behind by at most one interval, so a pause is not followed by a burst
+        late = 0 if due is None else \
+            ((header.timestamp - due + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        start = header.timestamp if due is None or late > interval else due
+        self.due[state] = (start + interval) & 0xFFFFFFFF
+        counts[1] += 1
+        self.frames_kept += 1
+        return True
+    
+    def kept_ratio(self, sender: int, dest: Address) -> float:
+        """Recent share of sender's frames a capped receiver got (1.0 if not thinned yet)"""
+        with self.lock:
+            offered, kept = self.counts.get((sender, dest), (0, 0))
+        return kept / offered if offered else 1.0
+    
+    def forget(self, stream_id: int, dest: Address):
+        """Drop the state of a client that left, as sender and as receiver"""
+        with self.lock:
+            for state in [s for s in self.due if s[0] == stream_id or s[1] == dest]:
+                del self.due[state]
+            for state in [s for s in self.counts if s[0] == stream_id or s[1] == dest]:
+                del self.counts[state]
+            self.broken = {s for s in self.broken if s[0] != stream_id and s[1] != dest}
+            self.tile_senders.discard(stream_id)
+            for key in [k for k in self.decisions if k[0] == stream_id]:
+                del self.decisions[key]
+    
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'frames_kept': self.frames_kept,
+                'frames_thinned': self.frames_thinned
+            }
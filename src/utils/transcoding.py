@@ -0,0 +1,224 @@
+import multiprocessing
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .media_header import (
+    MediaHeader, FLAG_KEYFRAME, FLAG_FEC, PAYLOAD_JPEG, TRANSCODED_LAYER, MEDIA_HEADER_SIZE
+)
+from ..video_conferencing.video_stream import REDUCED_DECODE_FLAGS
+
+Address = Tuple[str, int]
+
+# Requests are rounded to these steps so receivers with similar needs share a variant
+TRANSCODE_SCALES = (1.0, 0.5, 0.25)
+QUALITY_STEP = 10
+
+
+class Variant(NamedTuple):
+    """Reduced copy of a sender's video that a receiver asks the relay for"""
+    scale: float = 0.5  # Resolution relative to the sender's full-resolution layer
+    quality: int = 50  # JPEG quality
+    
+    @classmethod
+    def parse(cls, spec) -> Optional['Variant']:
+        """Variant from a subscribe message's {"scale", "quality"} object, None if absent"""
+        if not spec:
+            return None
+        scale = float(spec.get('scale', cls._field_defaults['scale']))
+        quality = int(spec.get('quality', cls._field_defaults['quality']))
+        scale = min(TRANSCODE_SCALES, key=lambda step: abs(step - scale))
+        quality = max(QUALITY_STEP, min(90, int(round(quality / QUALITY_STEP)) * QUALITY_STEP))
+        return cls(scale, quality)
+
+
+def transcode_frame(jpeg: bytes, variants: Tuple[Variant, ...]) -> List[Optional[bytes]]:
+    """Decode a JPEG once and encode every variant of it (runs in a pool worker)"""
+    largest = max(variant.scale for variant in variants)
+    factor, flag = 1, cv2.IMREAD_COLOR
+    for reduction, reduced_flag in REDUCED_DECODE_FLAGS:
+        if reduction * largest <= 1.0:
+            factor, flag = reduction, reduced_flag
+            break
+    frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), flag)
+    if frame is None:
+        return [None] * len(variants)
+    
+    encoded = []
+    for variant in variants:
+        image = frame
+        resize = variant.scale * factor
+        if resize < 1.0:
+            image = cv2.resize(frame, None, fx=resize, fy=resize, interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, variant.quality])
+        encoded.append(buffer.tobytes())
+    return encoded
+
+
+class Transcoder:
+    """Optional relay stage re-encoding senders' frames for low-capability receivers
+    
+    A receiver that cannot decode a sender's full stream in time asks for a
+    Variant in its subscribe message and stops getting the sender's packets.
+    The relay reassembles the sender's full-resolution JPEG frames, and a
+    multiprocessing pool decodes each one once and encodes every variant
+    somebody asked for. The packets of each variant are built once per frame
+    and handed to send() for every receiver of that variant; the relay caches
+    them for NACKs on its own thread. They carry layer TRANSCODED_LAYER + the
+    variant's slot with sequence numbers of their own, so receivers track,
+    NACK and resync on them like on a simulcast layer.
+    
+    Frames completing while max_pending are still in the pool are dropped
+    rather than queued: a busy pool lowers the variants' frame rate instead
+    of adding delay. Tile deltas need the sender's reference frame, so
+    receivers of a tile-coding sender get its keyframes only.
+    """
+    
+    def __init__(self, workers: int = 2, send: Optional[Callable] = None,
+                 payload_size: int = 1200, max_pending: int = 0):
+        self.workers = workers
+        self.send = send  # send(packets, dests), called from the pool's result thread
+        self.payload_size = payload_size
+        self.max_pending = max_pending or workers * 2
+        self.pool = None
+        
+        self.lock = threading.Lock()
+        self.partials: Dict[int, tuple] = {}  # sender -> (frame_id, header, chunks)
+        self.pending = 0
+        self.slots: Dict[Variant, int] = {}  # variant -> layer offset
+        self.sequences: Dict[Tuple[int, int], int] = {}  # (sender, layer) -> next sequence
+        
+        # Statistics
+        self.frames_transcoded = 0
+        self.frames_dropped = 0
+        self.variants_encoded = 0
+        self.errors = 0
+    
+    def start(self):
+        """Start the worker processes"""
+        if self.pool is None:
+            # Fresh interpreters: forking a process full of relay threads is unsafe
+            self.pool = multiprocessing.get_context('spawn').Pool(self.workers)
+    
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+    
+    def layer_of(self, variant: Variant) -> int:
+        """Header layer the packets of a variant are sent in"""
+        with self.lock:
+            if variant not in self.slots:
+                self.slots[variant] = len(self.slots)  # At most 27 after rounding
+            return TRANSCODED_LAYER + self.slots[variant]
+    
+    def add(self, data: bytes, sender: int, variants: Dict[Variant, Tuple[Address, ...]]):
+        """Collect one relayed packet; complete frames go to the pool
+        
+        variants maps each variant asked for from this sender to the
+        receivers that get it.
+        """
+        if data[1] & FLAG_FEC or data[2] != 0 or data[3] != PAYLOAD_JPEG:
+            return
+        header = MediaHeader.unpack(data)
+        if header is None or header.chunk_index >= header.chunk_count:
+            return
+        
+        with self.lock:
+            partial = self.partials.get(sender)
+            if partial is None or partial[0] != header.frame_id:
+                # A newer frame started: whatever is missing of the last one is lost
+                partial = (header.frame_id, header, [None] * header.chunk_count)
+                self.partials[sender] = partial
+            chunks = partial[2]
+            if len(chunks) != header.chunk_count:
+                return
+            chunks[header.chunk_index] = data[MEDIA_HEADER_SIZE:]
+            if any(chunk is None for chunk in chunks):
+                return
+            del self.partials[sender]
+            
+            pool = self.pool
+            if pool is None or self.pending >= self.max_pending:
+                self.frames_dropped += 1
+                return
+            self.pending += 1
+        
+        requested = tuple(variants)
+        dests = tuple(variants[variant] for variant in requested)
+        pool.apply_async(
+            transcode_frame, (b''.join(chunks), requested),
+            callback=lambda encoded: self._finished(sender, header, requested, dests, encoded),
+            error_callback=self._failed
+        )
+    
+    def _finished(self, sender: int, header: MediaHeader, variants: Tuple[Variant, ...],
+                  dests: Tuple[Tuple[Address, ...], ...], encoded: List[Optional[bytes]]):
+        """Pool callback: packetize and send every variant of one frame
+        
+        An exception here would kill the pool's result thread, so errors are
+        only counted, and the frame always leaves the pending count.
+        """
+        try:
+            packets = {
+                variant: self.packetize(sender, header, variant, jpeg)
+                for variant, jpeg in zip(variants, encoded) if jpeg is not None
+            }
+            with self.lock:
+                self.frames_transcoded += 1
+                self.variants_encoded += len(packets)
+            
+            if self.send:
+                for variant, receivers in zip(variants, dests):
+                    if variant in packets:
+                        self.send(packets[variant], receivers)
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+            print(f"Error sending transcoded frame: {e}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+    
+    def _failed(self, error: BaseException):
+        with self.lock:
+            self.pending -= 1
+            self.errors += 1
+        print(f"Error transcoding frame: {error}")
+    
+    def packetize(self, sender: int, header: MediaHeader, variant: Variant,
+                  jpeg: bytes) -> List[bytes]:
+        """Chunk one encoded variant into packets of its own layer"""
+        layer = self.layer_of(variant)
+        chunk_count = max(1, (len(jpeg) + self.payload_size - 1) // self.payload_size)
+        packets = []
+        with self.lock:
+            sequence = self.sequences.get((sender, layer), 0)
+            self.sequences[(sender, layer)] = (sequence + chunk_count) & 0xFFFFFFFF
+        
+        for index in range(chunk_count):
+            packet = MediaHeader(
+                stream_id=sender, sequence=(sequence + index) & 0xFFFFFFFF, timestamp=header.timestamp,
+                frame_id=header.frame_id, chunk_index=index, chunk_count=chunk_count,
+                flags=FLAG_KEYFRAME, layer=layer, payload_type=PAYLOAD_JPEG
+            ).pack() + jpeg[index * self.payload_size:(index + 1) * self.payload_size]
+            packets.append(packet)
+        return packets
+    
+    def forget(self, stream_id: int):
+        """Drop the state of a sender that left"""
+        with self.lock:
+            self.partials.pop(stream_id, None)
+            for key in [key for key in self.sequences if key[0] == stream_id]:
+                del self.sequences[key]
+    
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'frames_transcoded': self.frames_transcoded,
+                'frames_dropped': self.frames_dropped,
+                'variants_encoded': self.variants_encoded,
+                'transcode_errors': self.errors
+            }
@@ -1,5 +1,8 @@
 from .video_capture import VideoCapture
 from .video_stream import VideoStreamer
 from .video_decoder import VideoDecoder
+from .frame_assembler import FrameAssembler
+from .video_pipeline import VideoPipeline
+from .frame_hub import FrameHub
 
-__all__ = ['VideoCapture', 'VideoStreamer', 'VideoDecoder']
+__all__ = ['VideoCapture', 'VideoStreamer', 'VideoDecoder', 'FrameAssembler', 'VideoPipeline', 'FrameHub']
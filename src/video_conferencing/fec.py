@@ -0,0 +1,57 @@
+import struct
+from typing import List, Optional, Sequence
+
+# group_size(2) + XOR of the chunk lengths(2), followed by the XORed payloads
+_PARITY_PREFIX = struct.Struct('!HH')
+
+
+def _xor_int(chunks: Sequence[bytes], size: int) -> int:
+    """XOR of chunks zero-padded to size bytes, as a big integer"""
+    value = 0
+    for chunk in chunks:
+        value ^= int.from_bytes(chunk, 'big') << (8 * (size - len(chunk)))
+    return value
+
+
+def make_parity(chunks: Sequence[bytes], group_size: int) -> bytes:
+    """Parity payload protecting one FEC group (the last group may be short)"""
+    size = max(len(chunk) for chunk in chunks)
+    length_xor = 0
+    for chunk in chunks:
+        length_xor ^= len(chunk)
+    
+    prefix = _PARITY_PREFIX.pack(group_size, length_xor)
+    return prefix + _xor_int(chunks, size).to_bytes(size, 'big')
+
+
+def parity_group_size(parity: bytes) -> int:
+    """Configured group size the sender used, 0 if the packet is malformed"""
+    if len(parity) < _PARITY_PREFIX.size:
+        return 0
+    return _PARITY_PREFIX.unpack_from(parity)[0]
+
+
+def recover_chunk(parity: bytes, known: Sequence[bytes]) -> Optional[bytes]:
+    """Rebuild the single missing chunk of a group from its parity and the others"""
+    if len(parity) < _PARITY_PREFIX.size:
+        return None
+    
+    length = _PARITY_PREFIX.unpack_from(parity)[1]
+    for chunk in known:
+        length ^= len(chunk)
+    
+    body = parity[_PARITY_PREFIX.size:]
+    size = len(body)
+    if length > size:
+        return None
+    
+    value = int.from_bytes(body, 'big') ^ _xor_int(known, size)
+    return value.to_bytes(size, 'big')[:length]
+
+
+def group_ranges(chunk_count: int, group_size: int) -> List[range]:
+    """Data chunk indices covered by each FEC group of a frame"""
+    return [
+        range(start, min(start + group_size, chunk_count))
+        for start in range(0, chunk_count, group_size)
+    ]
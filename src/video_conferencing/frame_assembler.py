@@ -0,0 +1,178 @@
+import time
+from typing import Dict, Optional, Tuple
+
+from ..utils.media_header import MediaHeader, FLAG_FEC, serial_newer
+from .fec import recover_chunk, parity_group_size
+
+
+class PartialFrame:
+    """Chunks received so far for one frame"""
+    
+    __slots__ = ('header', 'chunks', 'received', 'deadline', 'parity')
+    
+    def __init__(self, header: MediaHeader, deadline: float):
+        self.header = header._replace(flags=header.flags & ~FLAG_FEC, chunk_index=0)
+        self.chunks = [None] * header.chunk_count
+        self.received = 0
+        self.deadline = deadline
+        self.parity = {}  # FEC group index -> parity payload
+    
+    def group_members(self, group: int, group_size: int) -> range:
+        """Data chunk indices covered by an FEC group"""
+        start = group * group_size
+        return range(start, min(start + group_size, len(self.chunks)))
+    
+    def try_recover(self, group: int) -> bool:
+        """Rebuild the group's only missing chunk from its parity, if possible"""
+        parity = self.parity.get(group)
+        if parity is None:
+            return False
+        
+        members = self.group_members(group, parity_group_size(parity))
+        missing = [i for i in members if self.chunks[i] is None]
+        if len(missing) != 1:
+            if not missing:
+                del self.parity[group]
+            return False
+        
+        chunk = recover_chunk(parity, [self.chunks[i] for i in members if i != missing[0]])
+        del self.parity[group]
+        if chunk is None:
+            return False
+        self.chunks[missing[0]] = chunk
+        self.received += 1
+        return True
+
+
+class FrameAssembler:
+    """Reassembles chunked frames from many senders in parallel
+    
+    Incomplete frames are tracked per (stream_id, layer, frame_id), so chunks
+    from different senders may interleave freely. A frame is emitted as soon
+    as its last chunk arrives, or as soon as an XOR parity packet lets the
+    one missing chunk of its FEC group be rebuilt. Partial frames are
+    dropped when their deadline passes or when a newer frame from the same
+    sender completes first, and chunks of frames older than the last one
+    emitted are counted as late.
+    """
+    
+    # A frame ID this far behind the last emitted one means the sender restarted
+    RESTART_WINDOW = 300
+    
+    def __init__(self, timeout: float = 0.5):
+        self.timeout = timeout
+        self.partials: Dict[Tuple[int, int, int], PartialFrame] = {}
+        self.last_emitted: Dict[Tuple[int, int], int] = {}  # (stream_id, layer) -> frame_id
+        self.next_deadline = None
+        
+        # Statistics
+        self.completed = 0
+        self.late = 0
+        self.dropped = 0
+        self.recovered = 0  # Chunks rebuilt from FEC parity
+    
+    def add(self, header: MediaHeader, payload: bytes,
+            now: Optional[float] = None) -> Optional[Tuple[MediaHeader, bytes]]:
+        """Add one chunk; returns (header, frame_data) when it completes a frame"""
+        if now is None:
+            now = time.monotonic()
+        self.evict(now)
+        
+        source = (header.stream_id, header.layer)
+        last = self.last_emitted.get(source)
+        if last is not None and not serial_newer(header.frame_id, last):
+            if (last - header.frame_id) & 0xFFFFFFFF <= self.RESTART_WINDOW:
+                # Parity for a frame that completed without it is expected
+                if not header.flags & FLAG_FEC:
+                    self.late += 1
+                return None
+            # Far behind the last frame: the sender restarted its counter
+            self.forget(header.stream_id)
+        
+        if header.chunk_count == 0 or header.chunk_index >= header.chunk_count:
+            return None
+        
+        key = (header.stream_id, header.layer, header.frame_id)
+        partial = self.partials.get(key)
+        if partial is None:
+            partial = PartialFrame(header, now + self.timeout)
+            self.partials[key] = partial
+            if self.next_deadline is None or partial.deadline < self.next_deadline:
+                self.next_deadline = partial.deadline
+        elif len(partial.chunks) != header.chunk_count:
+            return None
+        
+        if header.flags & FLAG_FEC:
+            group = header.chunk_index
+            if group in partial.parity:
+                return None  # Duplicate
+            partial.parity[group] = payload
+        else:
+            if partial.chunks[header.chunk_index] is not None:
+                return None  # Duplicate
+            partial.chunks[header.chunk_index] = payload
+            partial.received += 1
+            group_size = self._group_size(partial)
+            group = header.chunk_index // group_size if group_size else None
+        
+        if group is not None and partial.try_recover(group):
+            self.recovered += 1
+        
+        if partial.received < len(partial.chunks):
+            return None
+        
+        del self.partials[key]
+        self.last_emitted[source] = header.frame_id
+        self.completed += 1
+        self._drop_older(source, header.frame_id)
+        return partial.header, b''.join(partial.chunks)
+    
+    @staticmethod
+    def _group_size(partial: PartialFrame) -> int:
+        """FEC group size of a frame, known once any parity packet arrived"""
+        for parity in partial.parity.values():
+            return parity_group_size(parity)
+        return 0
+    
+    def _drop_older(self, source: Tuple[int, int], frame_id: int):
+        """Discard partial frames from a sender that are older than frame_id"""
+        stale = [
+            key for key in self.partials
+            if key[:2] == source and serial_newer(frame_id, key[2])
+        ]
+        for key in stale:
+            del self.partials[key]
+        self.dropped += len(stale)
+    
+    def evict(self, now: Optional[float] = None):
+        """Drop partial frames whose deadline has passed"""
+        if now is None:
+            now = time.monotonic()
+        if self.next_deadline is None or now < self.next_deadline:
+            return
+        
+        expired = [key for key, partial in self.partials.items() if partial.deadline <= now]
+        for key in expired:
+            del self.partials[key]
+        self.dropped += len(expired)
+        
+        self.next_deadline = min(
+            (partial.deadline for partial in self.partials.values()), default=None
+        )
+    
+    def forget(self, stream_id: int):
+        """Drop all state for a sender that left"""
+        for key in [key for key in self.partials if key[0] == stream_id]:
+            del self.partials[key]
+        for source in [source for source in self.last_emitted if source[0] == stream_id]:
+            del self.last_emitted[source]
+    
+    def get_stats(self) -> dict:
+        """Reassembly counters"""
+        return {
+            'completed': self.completed,
+            'late': self.late,
+            'dropped': self.dropped,
+            'recovered': self.recovered,
+            'pending': len(self.partials)
+        }
@@ -0,0 +1,127 @@
+import sys
+import threading
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+
+class FrameRing:
+    """Fixed set of preallocated frame buffers for cv2.VideoCapture.read(image=...)
+    
+    A slot is reused only once nothing but the ring references it. Python's
+    own reference count tracks this: the hub, queued encodes and views
+    sliced from a frame all hold a reference to the slot until they are
+    done. If every slot is still held, a one-off buffer is allocated and
+    counted as a miss, so a stuck consumer never makes capture overwrite a
+    frame it is reading.
+    """
+    
+    def __init__(self, shape: Tuple[int, ...], dtype=np.uint8, slots: int = 8):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = [np.empty(self.shape, self.dtype) for _ in range(slots)]
+        self.next = 0
+        
+        # Statistics
+        self.reused = 0
+        self.misses = 0
+    
+    def acquire(self) -> np.ndarray:
+        """A writable buffer nobody else references"""
+        count = len(self.slots)
+        for offset in range(count):
+            index = (self.next + offset) % count
+            # References: self.slots plus getrefcount's own argument
+            if sys.getrefcount(self.slots[index]) == 2:
+                self.next = index + 1
+                slot = self.slots[index]
+                slot.flags.writeable = True
+                self.reused += 1
+                return slot
+        
+        self.misses += 1
+        return np.empty(self.shape, self.dtype)
+    
+    def get_stats(self) -> dict:
+        return {
+            'ring_slots': len(self.slots),
+            'ring_reused': self.reused,
+            'ring_misses': self.misses
+        }
+
+
+class FrameHub:
+    """Publishes captured frames to any number of subscribers without copying
+    
+    The hub only keeps the newest frame and its sequence number. Each
+    subscriber remembers the last sequence it read, so a slow consumer
+    skips straight to the latest frame instead of stealing frames from the
+    others. Published arrays are marked read-only because every
+    subscriber shares the same buffer.
+    """
+    
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.sequence = 0  # Sequence number of the latest frame, 0 = none yet
+        self.frame = None
+        self.closed = False
+    
+    def publish(self, frame: Any) -> int:
+        """Make a frame the latest one and wake waiting subscribers"""
+        if isinstance(frame, np.ndarray):
+            frame.flags.writeable = False
+        with self.condition:
+            self.sequence += 1
+            self.frame = frame
+            self.condition.notify_all()
+            return self.sequence
+    
+    def subscribe(self) -> 'FrameSubscription':
+        """New subscriber that starts with the next published frame"""
+        with self.condition:
+            return FrameSubscription(self, self.sequence)
+    
+    def close(self):
+        """Wake all subscribers; reads return None from now on"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class FrameSubscription:
+    """One consumer's view of a FrameHub with latest-frame semantics"""
+    
+    def __init__(self, hub: FrameHub, last_sequence: int = 0):
+        self.hub = hub
+        self.last_sequence = last_sequence
+        
+        # Statistics
+        self.frames_read = 0
+        self.frames_skipped = 0  # Published while this subscriber was busy
+    
+    def get(self, timeout: Optional[float] = 0.1) -> Optional[Tuple[int, Any]]:
+        """(sequence, frame) of the newest frame not read yet, None on timeout"""
+        hub = self.hub
+        with hub.condition:
+            if not hub.condition.wait_for(
+                lambda: hub.sequence != self.last_sequence or hub.closed, timeout
+            ) or hub.sequence == self.last_sequence:
+                return None
+            sequence, frame = hub.sequence, hub.frame
+        
+        if self.last_sequence:
+            self.frames_skipped += sequence - self.last_sequence - 1
+        self.last_sequence = sequence
+        self.frames_read += 1
+        return sequence, frame
+    
+    def read(self, timeout: Optional[float] = 0.1) -> Optional[Any]:
+        """Newest frame not read yet (same contract as VideoCapture.read)"""
+        result = self.get(timeout)
+        return result[1] if result else None
+    
+    def get_stats(self) -> dict:
+        return {
+            'frames_read': self.frames_read,
+            'frames_skipped': self.frames_skipped
+        }
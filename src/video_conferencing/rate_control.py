@@ -0,0 +1,196 @@
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from ..utils.media_header import MediaHeader, serial_newer
+from ..utils.feedback import ReceiverReport
+
+
+class _StreamReception:
+    """Per-sender, per-layer counters for the current report interval"""
+    
+    __slots__ = ('highest', 'base', 'received', 'bytes', 'jitter', 'transit')
+    
+    def __init__(self, sequence: int):
+        self.highest = sequence
+        self.base = sequence  # Highest sequence at the last report
+        self.received = 0
+        self.bytes = 0
+        self.jitter = 0.0  # RFC 3550 interarrival jitter in ms
+        self.transit = None
+
+
+class ReceptionMonitor:
+    """Builds periodic receiver reports for every sender (and layer) we receive from"""
+    
+    def __init__(self, reporter_id: int = 0, interval: float = 1.0):
+        self.reporter_id = reporter_id
+        self.interval = interval
+        self.streams: Dict[Tuple[int, int], _StreamReception] = {}  # (stream_id, layer) ->
+        self.last_report = time.monotonic()
+    
+    def update(self, header: MediaHeader, size: int, now: Optional[float] = None):
+        """Account for one received packet of size bytes"""
+        if now is None:
+            now = time.monotonic()
+        
+        track = (header.stream_id, header.layer)
+        stream = self.streams.get(track)
+        if stream is None:
+            stream = self.streams[track] = _StreamReception(header.sequence - 1)
+        
+        stream.received += 1
+        stream.bytes += size
+        if serial_newer(header.sequence, stream.highest):
+            stream.highest = header.sequence
+        
+        # Jitter from the first packet of each frame (the rest are paced on purpose)
+        if header.chunk_index == 0:
+            transit = now * 1000 - header.timestamp
+            if stream.transit is not None:
+                stream.jitter += (abs(transit - stream.transit) - stream.jitter) / 16
+            stream.transit = transit
+    
+    def skip_to(self, header: MediaHeader):
+        """Packets of this layer before header were left out on purpose, not lost"""
+        stream = self.streams.get((header.stream_id, header.layer))
+        if stream is not None and serial_newer(header.sequence, stream.highest):
+            skipped = (header.sequence - 1 - stream.highest) & 0xFFFFFFFF
+            stream.base = (stream.base + skipped) & 0xFFFFFFFF
+            stream.highest = (header.sequence - 1) & 0xFFFFFFFF
+    
+    def due_reports(self, now: Optional[float] = None) -> List[ReceiverReport]:
+        """Reports for the interval that just ended, if it has"""
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self.last_report
+        if elapsed < self.interval:
+            return []
+        self.last_report = now
+        
+        reports = []
+        for (stream_id, layer), stream in list(self.streams.items()):
+            if not stream.received:
+                # Layer the relay switched us away from (or a sender that left)
+                del self.streams[(stream_id, layer)]
+                continue
+            expected = (stream.highest - stream.base) & 0xFFFFFFFF
+            lost = max(0, expected - stream.received)
+            reports.append(ReceiverReport(
+                stream_id=stream_id,
+                reporter_id=self.reporter_id,
+                fraction_lost=lost / expected if expected else 0.0,
+                jitter_ms=int(stream.jitter),
+                throughput_kbps=int(stream.bytes * 8 / 1000 / elapsed),
+                layer=layer
+            ))
+            stream.base = stream.highest
+            stream.received = 0
+            stream.bytes = 0
+        return reports
+
+
+class Rung(NamedTuple):
+    """One encoder setting on the bitrate ladder"""
+    quality: int
+    scale: float
+    fps: float
+
+
+class BitrateController:
+    """Moves JPEG quality, resolution and frame rate with receiver reports
+    
+    Uses the worst recent report across receivers. Loss, jitter or a
+    receiver getting much less than we send steps down one rung at a time;
+    only after up_hold seconds without congestion does it step back up.
+    """
+    
+    # Multipliers of the configured (quality, scale, fps), best first
+    LADDER = ((1.0, 1.0, 1.0), (0.85, 1.0, 1.0), (0.7, 1.0, 0.8),
+              (0.6, 0.75, 0.66), (0.5, 0.5, 0.5), (0.4, 0.5, 0.33))
+    
+    LOSS_HIGH = 0.08
+    LOSS_LOW = 0.02
+    JITTER_HIGH = 80
+    JITTER_LOW = 30
+    THROUGHPUT_RATIO = 0.8  # Receiver rate below this share of ours means a bottleneck
+    
+    def __init__(self, quality: int = 80, fps: float = 30, down_hold: float = 1.0,
+                 up_hold: float = 5.0, report_ttl: float = 3.0):
+        self.ladder = [
+            Rung(max(20, int(quality * q)), scale, max(5.0, fps * f))
+            for q, scale, f in self.LADDER
+        ]
+        self.level = 0
+        self.down_hold = down_hold
+        self.up_hold = up_hold
+        self.report_ttl = report_ttl
+        
+        self.reports: Dict[int, tuple] = {}  # reporter_id -> (time, report)
+        self.last_change = 0.0
+        self.last_congestion = 0.0
+        
+        # Statistics
+        self.decisions = deque(maxlen=20)  # (time, level, reason)
+        self.steps_down = 0
+        self.steps_up = 0
+    
+    @property
+    def current(self) -> Rung:
+        return self.ladder[self.level]
+    
+    def on_report(self, report: ReceiverReport, send_kbps: float,
+                  now: Optional[float] = None) -> bool:
+        """Take one receiver report into account; True if the rung changed"""
+        if now is None:
+            now = time.monotonic()
+        self.reports[report.reporter_id] = (now, report)
+        for reporter in [r for r, (t, _) in self.reports.items() if now - t > self.report_ttl]:
+            del self.reports[reporter]
+        
+        recent = [r for _, r in self.reports.values()]
+        loss = max(r.fraction_lost for r in recent)
+        jitter = max(r.jitter_ms for r in recent)
+        kbps = min(r.throughput_kbps for r in recent)
+        
+        reason = None
+        if loss >= self.LOSS_HIGH:
+            reason = f"loss {loss:.0%}"
+        elif jitter >= self.JITTER_HIGH:
+            reason = f"jitter {jitter}ms"
+        elif send_kbps > 0 and kbps < send_kbps * self.THROUGHPUT_RATIO:
+            reason = f"throughput {kbps}/{int(send_kbps)} kbps"
+        
+        if reason:
+            self.last_congestion = now
+            if self.level < len(self.ladder) - 1 and now - self.last_change >= self.down_hold:
+                self._change(self.level + 1, reason, now)
+                self.steps_down += 1
+                return True
+            return False
+        
+        clean = loss < self.LOSS_LOW and jitter < self.JITTER_LOW
+        if clean and self.level > 0 and now - max(self.last_change, self.last_congestion) >= self.up_hold:
+            self._change(self.level - 1, "clean", now)
+            self.steps_up += 1
+            return True
+        return False
+    
+    def _change(self, level: int, reason: str, now: float):
+        self.level = level
+        self.last_change = now
+        self.decisions.append((round(now, 3), level, reason))
+    
+    def get_stats(self) -> dict:
+        """Current rung and recent decisions"""
+        rung = self.current
+        return {
+            'level': self.level,
+            'quality': rung.quality,
+            'scale': rung.scale,
+            'fps': rung.fps,
+            'steps_down': self.steps_down,
+            'steps_up': self.steps_up,
+            'receivers': len(self.reports),
+            'decisions': list(self.decisions)
+        }
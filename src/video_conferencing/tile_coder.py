@@ -0,0 +1,174 @@
+import struct
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# width(2) height(2) tile_size(2) count(2), then count x (row(1) col(1)),
+# then one JPEG mosaic holding the changed tiles in that order
+_TILES_HEADER = struct.Struct('!HHHH')
+_TILE_POS = struct.Struct('!BB')
+
+# Tiles per mosaic row
+MOSAIC_COLUMNS = 16
+
+
+class TileEncoder:
+    """Conditional replenishment: send only the tiles that changed
+    
+    Each frame is compared tile by tile against the last frame sent (the
+    reference) with one vectorized absolute difference. tile_size should be
+    a multiple of 16 so tiles line up with JPEG macroblocks in the mosaic.
+    Tiles whose mean difference exceeds threshold are packed into a single
+    JPEG mosaic.
+    A full JPEG keyframe goes out every keyframe_interval seconds, on a
+    size change, or when most tiles changed anyway.
+    """
+    
+    def __init__(self, tile_size: int = 32, threshold: float = 6.0,
+                 keyframe_interval: float = 2.0, full_ratio: float = 0.6):
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.full_ratio = full_ratio  # Send a keyframe above this share of changed tiles
+        self.reference = None
+        self.last_keyframe = 0.0
+        self.force_keyframe = False
+        
+        # Statistics
+        self.keyframes = 0
+        self.delta_frames = 0
+        self.skipped_frames = 0
+        self.tiles_sent = 0
+    
+    def request_keyframe(self):
+        """Send a full frame next time"""
+        self.force_keyframe = True
+    
+    def _pad(self, frame: np.ndarray) -> np.ndarray:
+        """Pad a frame to a whole number of tiles"""
+        ts = self.tile_size
+        height, width = frame.shape[:2]
+        pad_h = -height % ts
+        pad_w = -width % ts
+        if pad_h or pad_w:
+            frame = cv2.copyMakeBorder(frame, 0, pad_h, 0, pad_w, cv2.BORDER_REPLICATE)
+        return frame
+    
+    def changed_tiles(self, padded: np.ndarray) -> np.ndarray:
+        """(row, col) indices of tiles that differ from the reference"""
+        ts = self.tile_size
+        rows, cols = padded.shape[0] // ts, padded.shape[1] // ts
+        
+        # |a - b| on uint8 without widening the whole frame
+        diff = np.maximum(padded, self.reference) - np.minimum(padded, self.reference)
+        tile_sums = diff.reshape(rows, ts, cols, ts, -1).sum(axis=(1, 3, 4), dtype=np.uint32)
+        limit = self.threshold * ts * ts * padded.shape[2]
+        return np.argwhere(tile_sums > limit)
+    
+    def encode(self, frame: np.ndarray, quality: int = 80,
+               now: Optional[float] = None) -> Optional[Tuple[bytes, bool]]:
+        """(payload, is_keyframe) for a frame, or None if nothing changed"""
+        if now is None:
+            now = time.monotonic()
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        padded = self._pad(frame)
+        
+        keyframe = (
+            self.force_keyframe
+            or self.reference is None
+            or self.reference.shape != padded.shape
+            or now - self.last_keyframe >= self.keyframe_interval
+        )
+        
+        if not keyframe:
+            changed = self.changed_tiles(padded)
+            total = self.reference.shape[0] * self.reference.shape[1] // self.tile_size ** 2
+            if len(changed) == 0:
+                self.skipped_frames += 1
+                return None
+            keyframe = len(changed) > total * self.full_ratio
+        
+        if keyframe:
+            self.reference = padded.copy()
+            self.last_keyframe = now
+            self.force_keyframe = False
+            self.keyframes += 1
+            _, buffer = cv2.imencode('.jpg', frame, params)
+            return buffer.tobytes(), True
+        
+        # Pack changed tiles into a mosaic and update the reference with them
+        ts = self.tile_size
+        mosaic_cols = min(len(changed), MOSAIC_COLUMNS)
+        mosaic_rows = (len(changed) + mosaic_cols - 1) // mosaic_cols
+        mosaic = np.zeros((mosaic_rows * ts, mosaic_cols * ts, padded.shape[2]), dtype=np.uint8)
+        
+        for i, (row, col) in enumerate(changed):
+            tile = padded[row * ts:(row + 1) * ts, col * ts:(col + 1) * ts]
+            m_row, m_col = divmod(i, mosaic_cols)
+            mosaic[m_row * ts:(m_row + 1) * ts, m_col * ts:(m_col + 1) * ts] = tile
+            self.reference[row * ts:(row + 1) * ts, col * ts:(col + 1) * ts] = tile
+        
+        _, buffer = cv2.imencode('.jpg', mosaic, params)
+        height, width = frame.shape[:2]
+        positions = b''.join(_TILE_POS.pack(int(row), int(col)) for row, col in changed)
+        self.delta_frames += 1
+        self.tiles_sent += len(changed)
+        return _TILES_HEADER.pack(width, height, ts, len(changed)) + positions + buffer.tobytes(), False
+    
+    def get_stats(self) -> dict:
+        """Keyframe/delta frame counters"""
+        return {
+            'keyframes': self.keyframes,
+            'delta_frames': self.delta_frames,
+            'unchanged_frames': self.skipped_frames,
+            'tiles_sent': self.tiles_sent
+        }
+
+
+class TileDecoder:
+    """Rebuilds tile-coded frames on top of each sender's last picture"""
+    
+    def __init__(self):
+        self.canvases: Dict[int, np.ndarray] = {}  # stream_id -> padded last frame
+    
+    def keyframe(self, stream_id: int, frame: np.ndarray):
+        """Remember a fully decoded frame as the base for later tiles"""
+        self.canvases[stream_id] = frame
+    
+    def decode(self, stream_id: int, payload: bytes) -> Optional[np.ndarray]:
+        """Apply a tile payload; None until a keyframe of the same size arrived"""
+        if len(payload) < _TILES_HEADER.size:
+            return None
+        width, height, ts, count = _TILES_HEADER.unpack_from(payload)
+        offset = _TILES_HEADER.size + count * _TILE_POS.size
+        rows = -(-height // ts)
+        cols = -(-width // ts)
+        
+        base = self.canvases.get(stream_id)
+        if base is None or not (height <= base.shape[0] <= rows * ts
+                                and width <= base.shape[1] <= cols * ts):
+            return None
+        
+        mosaic = cv2.imdecode(np.frombuffer(payload, np.uint8, offset=offset), cv2.IMREAD_COLOR)
+        if mosaic is None:
+            return None
+        
+        # Copy on write: frames already handed out must not change under the viewer
+        canvas = np.empty((rows * ts, cols * ts, 3), dtype=np.uint8)
+        canvas[:base.shape[0], :base.shape[1]] = base
+        
+        mosaic_cols = mosaic.shape[1] // ts
+        for i in range(count):
+            row, col = _TILE_POS.unpack_from(payload, _TILES_HEADER.size + i * _TILE_POS.size)
+            m_row, m_col = divmod(i, mosaic_cols)
+            canvas[row * ts:(row + 1) * ts, col * ts:(col + 1) * ts] = \
+                mosaic[m_row * ts:(m_row + 1) * ts, m_col * ts:(m_col + 1) * ts]
+        
+        self.canvases[stream_id] = canvas
+        return canvas[:height, :width]
+    
+    def forget(self, stream_id: int):
+        """Drop a sender's picture"""
+        self.canvases.pop(stream_id, None)
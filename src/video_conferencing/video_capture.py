@@ -1,17 +1,39 @@
 import cv2
 import numpy as np
 import threading
-import queue
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
+
+from .frame_hub import FrameHub, FrameRing, FrameSubscription
+
+# Start of image marker every JPEG begins with
+JPEG_SOI = b'\xff\xd8'
 
 class VideoCapture:
-    """Handles webcam video capture with threading for performance"""
+    """Handles webcam video capture with threading for performance
+    
+    With passthrough=True the camera's MJPEG frames are delivered as the
+    compressed JPEG bytes (CAP_PROP_CONVERT_RGB off), so they can be sent
+    without a decode/re-encode. Devices that still hand out decoded frames
+    fall back to normal capture.
     
-    def __init__(self, device_id: int = 0, resolution: Tuple[int, int] = (640, 480), fps: int = 30):
+    Every frame is published to a FrameHub: read() serves one default
+    consumer, and other consumers (preview, recorder) call subscribe() to
+    get every latest frame without taking it from anyone else.
+    
+    With buffers > 0 decoded frames are read into a FrameRing of that many
+    preallocated buffers, so steady-state capture allocates nothing.
+    """
+    
+    def __init__(self, device_id: int = 0, resolution: Tuple[int, int] = (640, 480), fps: int = 30,
+                 passthrough: bool = False, buffers: int = 0):
         self.device_id = device_id
         self.resolution = resolution
         self.fps = fps
-        self.frame_queue = queue.Queue(maxsize=2)
+        self.passthrough = passthrough
+        self.buffers = buffers
+        self.ring = None  # Sized from the first decoded frame
+        self.hub = FrameHub()
+        self.reader = self.hub.subscribe()  # Backs read()
         self.running = False
         self.capture = None
         self.thread = None
@@ -29,6 +51,8 @@ class VideoCapture:
         self.capture.set(cv2.CAP_PROP_FPS, self.fps)
         self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
         self.capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+        if self.passthrough:
+            self.capture.set(cv2.CAP_PROP_CONVERT_RGB, 0)
         
         self.running = True
         self.thread = threading.Thread(target=self._capture_loop, daemon=True)
@@ -38,30 +62,57 @@ class VideoCapture:
     def _capture_loop(self):
         """Continuous capture loop in separate thread"""
         while self.running:
-            ret, frame = self.capture.read()
-            if ret:
-                # Clear old frames if queue is full
-                if self.frame_queue.full():
-                    try:
-                        self.frame_queue.get_nowait()
-                    except queue.Empty:
-                        pass
-                
-                try:
-                    self.frame_queue.put_nowait(frame)
-                except queue.Full:
-                    pass
+            buffer = None
+            if self.ring is not None and not self.passthrough:
+                buffer = self.ring.acquire()
+                ret, frame = self.capture.read(image=buffer)
+            else:
+                ret, frame = self.capture.read()
+            
+            if ret and self.passthrough:
+                frame = self._compressed(frame)
+            elif ret and self.buffers and frame is not buffer:
+                # First decoded frame or a resolution change: size the ring to it
+                self.ring = FrameRing(frame.shape, frame.dtype, self.buffers)
+            if ret and frame is not None:
+                self.hub.publish(frame)
+    
+    def _compressed(self, frame: np.ndarray) -> Union[bytes, np.ndarray]:
+        """JPEG bytes of a raw MJPEG frame, or the decoded frame after falling back"""
+        if frame.ndim < 3 or frame.shape[2] == 1:
+            data = frame.tobytes()
+            if data[:2] == JPEG_SOI:
+                return data
+        
+        # The backend decoded (or mangled) the frame: give up on passthrough
+        print("[VIDEO] Camera does not deliver raw MJPEG, falling back to decoded capture")
+        self.passthrough = False
+        self.capture.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+        return frame if frame.ndim == 3 and frame.shape[2] == 3 else None
+    
+    def read(self) -> Optional[Union[np.ndarray, bytes]]:
+        """Get latest frame (JPEG bytes while passthrough is active)
+        
+        Frames are shared with other subscribers and read-only; copy before
+        drawing on them.
+        """
+        return self.reader.read(timeout=0.1)
+    
+    def subscribe(self) -> FrameSubscription:
+        """Independent latest-frame reader for another consumer"""
+        return self.hub.subscribe()
     
-    def read(self) -> Optional[np.ndarray]:
-        """Get latest frame from queue"""
-        try:
-            return self.frame_queue.get(timeout=0.1)
-        except queue.Empty:
-            return None
+    def get_stats(self) -> dict:
+        """Frames captured and buffer reuse"""
+        stats = {'frames_captured': self.hub.sequence}
+        if self.ring is not None:
+            stats.update(self.ring.get_stats())
+        return stats
     
     def stop(self):
         """Stop capture and cleanup"""
         self.running = False
+        self.hub.close()
         if self.thread:
             self.thread.join(timeout=1.0)
         if self.capture:
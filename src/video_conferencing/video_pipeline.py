@@ -0,0 +1,187 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .video_stream import reduced_decode_flag
+
+
+class StageTimer:
+    """Running totals for one pipeline stage"""
+    
+    __slots__ = ('count', 'total', 'max')
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def get_stats(self) -> dict:
+        return {
+            'avg_ms': round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            'max_ms': round(self.max * 1000, 2)
+        }
+
+
+class VideoPipeline:
+    """Capture -> encode -> send on separate threads with bounded hand-offs
+    
+    The capture thread reads frames and submits each one to a pool of
+    encoder threads (cv2.imencode releases the GIL, so JPEG encoding runs
+    in parallel). Futures go through a bounded FIFO to the send thread,
+    which waits on them in submission order, so frames leave in capture
+    order however the encoders finish. When the queue is full capture waits,
+    so stale frames are dropped by the camera's latest-frame queue instead
+    of piling up here. Stateful encoders (tile coding) get a single worker.
+    
+    Captures that deliver JPEG bytes (MJPEG passthrough) skip the encoder
+    unless rate control needs a re-encode; the local preview then decodes
+    them at no more than preview_size.
+    """
+    
+    def __init__(self, capture, streamer, address: tuple, workers: int = 2,
+                 queue_size: int = 4, on_frame: Optional[Callable[[np.ndarray], None]] = None):
+        self.capture = capture  # Anything with read() -> Optional[np.ndarray]
+        self.streamer = streamer
+        self.address = address
+        self.workers = 1 if streamer.stateful_encoder else max(1, workers)
+        self.on_frame = on_frame  # Called with every captured frame (local preview)
+        self.preview_size: Optional[Tuple[int, int]] = None  # (width, height) the preview is shown at
+        
+        self.pending = queue.Queue(maxsize=queue_size)  # (captured_at, future) in capture order
+        self.executor = None
+        self.threads = []
+        self.running = False
+        
+        # Statistics
+        self.timers = {
+            'capture': StageTimer(),
+            'encode': StageTimer(),
+            'backpressure': StageTimer(),  # Capture blocked on a full queue
+            'queue_wait': StageTimer(),
+            'send': StageTimer(),
+            'latency': StageTimer()  # Capture to last packet sent
+        }
+        self.frames_sent = 0
+        self.timers_lock = threading.Lock()
+    
+    def start(self):
+        """Start the capture, encoder and send threads"""
+        self.running = True
+        self.executor = ThreadPoolExecutor(max_workers=self.workers,
+                                           thread_name_prefix='video-encode')
+        for target in (self._capture_loop, self._send_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+    
+    def _time(self, stage: str, seconds: float):
+        with self.timers_lock:
+            self.timers[stage].add(seconds)
+    
+    def _encode(self, frame: np.ndarray, settings: tuple):
+        """Encoder worker: returns (encoded simulcast layers, encode seconds)"""
+        start = time.perf_counter()
+        encoded = self.streamer.encode_layers(frame, *settings)
+        return encoded, time.perf_counter() - start
+    
+    def _preview(self, jpeg: bytes) -> Optional[np.ndarray]:
+        """Decode a passthrough frame for the local preview, reduced to its shown size"""
+        flag = cv2.IMREAD_COLOR
+        if self.preview_size:
+            flag = reduced_decode_flag(self.capture.resolution, self.preview_size)[1]
+        return cv2.imdecode(np.frombuffer(jpeg, np.uint8), flag)
+    
+    def _capture_loop(self):
+        """Read frames and hand them to the encoder pool"""
+        while self.running:
+            start = time.perf_counter()
+            frame = self.capture.read()
+            if frame is None:
+                continue
+            captured_at = time.perf_counter()
+            self._time('capture', captured_at - start)
+            
+            if self.on_frame:
+                preview = self._preview(frame) if isinstance(frame, bytes) else frame
+                if preview is not None:
+                    self.on_frame(preview)
+            
+            settings = self.streamer.prepare_frame()
+            if settings is None:
+                continue
+            
+            try:
+                future = self.executor.submit(self._encode, frame, settings)
+            except RuntimeError:
+                break  # Executor shut down
+            
+            # Block while the encoders are behind; the camera keeps only its
+            # newest frame meanwhile, so the next read is fresh
+            wait_start = time.perf_counter()
+            while self.running:
+                try:
+                    self.pending.put((captured_at, future), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            self._time('backpressure', time.perf_counter() - wait_start)
+    
+    def _send_loop(self):
+        """Send encoded frames in capture order"""
+        while self.running or not self.pending.empty():
+            try:
+                captured_at, future = self.pending.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            
+            wait_start = time.perf_counter()
+            try:
+                encoded, encode_time = future.result()
+            except Exception as e:
+                print(f"Error encoding frame: {e}")
+                continue
+            self._time('encode', encode_time)
+            self._time('queue_wait', time.perf_counter() - wait_start)
+            
+            if not encoded:
+                continue
+            
+            start = time.perf_counter()
+            try:
+                self.streamer.send_layers(encoded, self.address)
+            except Exception as e:
+                print(f"Error sending frame: {e}")
+                continue
+            end = time.perf_counter()
+            self._time('send', end - start)
+            self._time('latency', end - captured_at)
+            self.frames_sent += 1
+    
+    def get_stats(self) -> dict:
+        """Per-stage timing and frame counters"""
+        with self.timers_lock:
+            stats = {stage: timer.get_stats() for stage, timer in self.timers.items()}
+        stats['workers'] = self.workers
+        stats['frames_sent'] = self.frames_sent
+        stats['queued'] = self.pending.qsize()
+        return stats
+    
+    def stop(self):
+        """Stop all stages; frames already encoded are still sent"""
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        self.threads = []
+        if self.executor:
+            self.executor.shutdown(wait=False)
@@ -1,24 +1,167 @@
+import errno
+import select
 import socket
-import struct
+import time
 import cv2
 import asyncio
-from typing import Optional
+from typing import List, Optional, Tuple
 import numpy as np
 
+from ..utils.media_header import (
+    MediaHeader, MEDIA_HEADER_SIZE, FLAG_KEYFRAME, FLAG_FEC, PAYLOAD_JPEG, PAYLOAD_TILES,
+    SequenceTracker, media_timestamp
+)
+from ..utils.pacing import Pacer
+from ..utils.retransmit import NackTracker, build_nack, MAX_NACK_ENTRIES
+from ..utils.feedback import LayerRequest
+from ..utils.simulcast import SIMULCAST_SCALES, MAX_LAYERS, layer_for_display
+from .frame_assembler import FrameAssembler
+from .fec import make_parity, group_ranges
+from .rate_control import BitrateController, ReceptionMonitor, ReceiverReport
+from .tile_coder import TileEncoder, TileDecoder
+
+# JPEG decode flags that downscale inside the IDCT, largest factor first
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+)
+
+
+def reduced_decode_flag(source: Tuple[int, int], display: Tuple[int, int]) -> Tuple[int, int]:
+    """(factor, imdecode flag) for the cheapest decode still at least as large as it is shown
+    
+    source and display are (width, height); the frame is shown scaled to fit
+    the display box with its aspect ratio kept.
+    """
+    scale = min(display[0] / source[0], display[1] / source[1])
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if factor * scale <= 1.0:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
 class VideoStreamer:
     """Handles video streaming over UDP with compression"""
     
-    def __init__(self, quality: int = 80, client_id: str = None):
+    # Payload bytes per datagram: header + payload stays under a 1500-byte MTU
+    DEFAULT_PAYLOAD_SIZE = 1200
+    
+    def __init__(self, quality: int = 80, client_id: str = None, stream_id: int = 0,
+                 reassembly_timeout: float = 0.5, payload_size: int = DEFAULT_PAYLOAD_SIZE,
+                 fps: float = 30, pacing: bool = True, pacing_burst: int = 12000,
+                 fec_group_size: int = 0, nack: bool = True, abr: bool = False,
+                 report_interval: float = 1.0, codec: str = "MJPEG", tile_size: int = 32,
+                 tile_threshold: float = 6.0, keyframe_interval: float = 2.0,
+                 simulcast_layers: int = 1):
         self.quality = quality
         self.client_id = client_id
+        self.stream_id = stream_id  # Numeric ID assigned by the server at join
         self.sock = None
         self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
-        self.frame_buffer = {}  # For multi-client reception: client_id -> chunks
+        self.assembler = FrameAssembler(reassembly_timeout)
+        self.nacks = NackTracker(deadline=reassembly_timeout) if nack else None
+        self.feedback_addr = None  # Where NACKs/reports go: the relay that sent us video
+        self.sequences = [0] * MAX_LAYERS  # Per simulcast layer
+        self.frame_id = 0
+        
+        # Packetizer and pacer
+        self.payload_size = payload_size
+        self.pacer = Pacer(fps, pacing_burst) if pacing else None
+        self.fec_group_size = fec_group_size  # Data packets per XOR parity packet, 0 = off
+        
+        # Adaptive bitrate: receivers report, the sender's controller picks a rung
+        self.controller = BitrateController(quality, fps) if abr else None
+        self.monitor = ReceptionMonitor(stream_id, report_interval) if abr else None
+        self.last_sent_time = 0.0
+        # Per simulcast layer: (time, layer bytes sent) at the last report about it
+        self.rate_marks = [(time.monotonic(), 0)] * MAX_LAYERS
+        
+        # Tile coding sends only changed tiles between periodic keyframes
+        self.tile_encoder = None
+        if codec == "TILES":
+            self.tile_encoder = TileEncoder(tile_size, tile_threshold, keyframe_interval)
+        self.tile_decoder = TileDecoder()
+        self.tile_streams = set()  # Streams sending tile deltas: decoded full size
+        
+        # Simulcast: extra JPEG layers at SIMULCAST_SCALES, the relay picks one per receiver
+        self.simulcast_layers = max(1, min(simulcast_layers, MAX_LAYERS))
+        self.wanted_layers = {}  # stream_id -> layer we want from that sender
+        self.layer_requests = {}  # stream_id -> (layer, time) last requested
+        self.layer_request_interval = report_interval
+        self.stream_layers = {}  # stream_id -> layer of the last packet received
+        
+        # Senders we asked the relay to cap (max_fps): it skips whole frames of them
+        self.thinned_streams = set()
+        
+        # Reduced-resolution decode for senders shown in small tiles
+        self.display_sizes = {}  # stream_id -> (width, height) of its video box
+        self.source_sizes = {}  # stream_id -> (width, height) of its last frame
+        
+        # Statistics
+        self.frames_sent = 0
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.layer_bytes_sent = [0] * MAX_LAYERS
+        self.send_errors = 0
+        self.fec_packets_sent = 0
+        self.max_burst = 0
+        self.loss = SequenceTracker()
+        self.reduced_decodes = 0
         
     def set_client_id(self, client_id: str):
         """Set client ID for packet identification"""
         self.client_id = client_id
+    
+    def set_stream_id(self, stream_id: int):
+        """Set the numeric stream ID carried in every packet header"""
+        self.stream_id = stream_id
+        if self.monitor:
+            self.monitor.reporter_id = stream_id
+        
+    def set_display_size(self, stream_id: int, size: Optional[Tuple[int, int]]):
+        """Record how large a sender is shown (None when it is not shown any more)
+        
+        Safe to call from the GUI thread while another thread receives.
+        """
+        if size is None:
+            self.display_sizes.pop(stream_id, None)
+            self.source_sizes.pop(stream_id, None)
+            self.tile_streams.discard(stream_id)
+            self.stream_layers.pop(stream_id, None)
+            self.wanted_layers.pop(stream_id, None)
+            self.layer_requests.pop(stream_id, None)
+        else:
+            self.display_sizes[stream_id] = size
+    
+    def decode_jpeg(self, stream_id: int, data: bytes, layer: int = 0) -> Optional[np.ndarray]:
+        """Decode a JPEG frame, downscaled during decode if it is shown small"""
+        factor, flag = 1, cv2.IMREAD_COLOR
+        display = self.display_sizes.get(stream_id)
+        source = self.source_sizes.get(stream_id)
+        if display and source and stream_id not in self.tile_streams:
+            factor, flag = reduced_decode_flag(source, display)
+        
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+        if frame is None:
+            return None
         
+        height, width = frame.shape[:2]
+        self.source_sizes[stream_id] = (width * factor, height * factor)
+        if display and layer < MAX_LAYERS:
+            # Smallest simulcast layer that still fills the video box (the
+            # relay picks transcoded variants itself)
+            full_scale = factor / SIMULCAST_SCALES[min(layer, MAX_LAYERS - 1)]
+            self.wanted_layers[stream_id] = layer_for_display(
+                (width * full_scale, height * full_scale), display
+            )
+        if factor > 1:
+            self.reduced_decodes += 1
+        else:
+            # Tile deltas are patched onto a full-size keyframe only
+            self.tile_decoder.keyframe(stream_id, frame)
+        return frame
+    
     def setup_sender(self) -> socket.socket:
         """Setup UDP socket for sending"""
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -38,94 +181,344 @@ class VideoStreamer:
         return self.sock
     
     def send_frame(self, frame: np.ndarray, address: tuple) -> bool:
-        """Encode and send frame via UDP with client identification"""
+        """Encode and send frame via UDP, paced over the frame interval"""
         try:
-            # Encode frame as JPEG
-            _, buffer = cv2.imencode('.jpg', frame, self.encode_params)
-            data = buffer.tobytes()
-            
-            # Prepare client ID prefix
-            client_id_bytes = self.client_id.encode('utf-8') if self.client_id else b''
-            client_id_len = len(client_id_bytes)
-            
-            # Split into chunks if needed (UDP packet size limit)
-            max_chunk = 60000
-            total_chunks = (len(data) + max_chunk - 1) // max_chunk
-            
-            for i in range(total_chunks):
-                start = i * max_chunk
-                end = min((i + 1) * max_chunk, len(data))
-                chunk = data[start:end]
-                
-                # Header: client_id_len(1) + client_id + chunk_index(2) + total_chunks(2) + data
-                header = struct.pack('BHH', client_id_len, i, total_chunks)
-                packet = header + client_id_bytes + chunk
-                
-                self.sock.sendto(packet, address)
+            settings = self.prepare_frame()
+            if settings is None:
+                return True
             
+            self.send_layers(self.encode_layers(frame, *settings), address)
             return True
         except Exception as e:
             print(f"Error sending frame: {e}")
             return False
     
+    def prepare_frame(self) -> Optional[Tuple[int, float]]:
+        """(quality, scale) for the next frame, or None to skip it for rate control"""
+        if not self.controller:
+            return self.quality, 1.0
+        
+        self.poll_feedback()
+        rung = self.controller.current
+        
+        # Thin the frame rate down to the current rung
+        now = time.monotonic()
+        if now - self.last_sent_time < 0.95 / rung.fps:
+            return None
+        self.last_sent_time = now
+        return rung.quality, rung.scale
+    
+    @property
+    def stateful_encoder(self) -> bool:
+        """True if frames must be encoded one at a time, in order"""
+        return self.tile_encoder is not None
+    
+    def encode_frame(self, frame: np.ndarray, quality: int,
+                     scale: float = 1.0) -> Optional[Tuple[bytes, int, int]]:
+        """(payload, flags, payload_type) for a frame, or None if there is nothing to send
+        
+        Safe to call from several threads at once unless stateful_encoder is set.
+        """
+        if scale < 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        if self.tile_encoder:
+            encoded = self.tile_encoder.encode(frame, quality)
+            if encoded is None:
+                return None  # Nothing changed since the last frame
+            payload, keyframe = encoded
+            if keyframe:
+                return payload, FLAG_KEYFRAME, PAYLOAD_JPEG
+            return payload, 0, PAYLOAD_TILES
+        
+        # Encode frame as JPEG
+        if quality == self.quality:
+            encode_params = self.encode_params
+        else:
+            encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        _, buffer = cv2.imencode('.jpg', frame, encode_params)
+        return buffer.tobytes(), FLAG_KEYFRAME, PAYLOAD_JPEG
+    
+    def encode_compressed(self, jpeg: bytes, quality: int,
+                          scale: float = 1.0) -> Optional[Tuple[bytes, int, int]]:
+        """encode_frame for a frame the camera already compressed (MJPEG passthrough)
+        
+        The camera's JPEG is sent as-is unless rate control asks for lower
+        quality or resolution, or tile coding needs the pixels.
+        """
+        if not self.tile_encoder and quality == self.quality and scale >= 1.0:
+            return jpeg, FLAG_KEYFRAME, PAYLOAD_JPEG
+        
+        # Downscaled rungs decode at reduced size and resize the rest of the way
+        factor, flag = 1, cv2.IMREAD_COLOR
+        for reduction, reduced_flag in REDUCED_DECODE_FLAGS:
+            if reduction * scale <= 1.0:
+                factor, flag = reduction, reduced_flag
+                break
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), flag)
+        if frame is None:
+            return None
+        return self.encode_frame(frame, quality, scale * factor)
+    
+    def encode_layers(self, frame, quality: int,
+                      scale: float = 1.0) -> List[Tuple[bytes, int, int, int]]:
+        """(payload, flags, payload_type, layer) for every simulcast layer of a frame
+        
+        frame is a decoded image or the camera's JPEG bytes (passthrough).
+        Layer 0 goes through the configured codec; lower layers are plain
+        JPEG keyframes so the relay can switch a receiver to them at any frame.
+        """
+        if isinstance(frame, bytes):
+            encoded = self.encode_compressed(frame, quality, scale)
+        else:
+            encoded = self.encode_frame(frame, quality, scale)
+        if encoded is None:
+            return []
+        layers = [encoded + (0,)]
+        if self.simulcast_layers == 1:
+            return layers
+        
+        current = 1.0
+        image = frame
+        if isinstance(frame, bytes):
+            # Decode the camera JPEG straight at half size for the first lower layer
+            image = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+            if image is None:
+                return layers
+            current = 0.5
+        
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        for layer in range(1, self.simulcast_layers):
+            target = scale * SIMULCAST_SCALES[layer]
+            if target != current:
+                # Each layer is resized from the one above it
+                image = cv2.resize(image, None, fx=target / current, fy=target / current,
+                                   interpolation=cv2.INTER_AREA)
+                current = target
+            _, buffer = cv2.imencode('.jpg', image, params)
+            layers.append((buffer.tobytes(), FLAG_KEYFRAME, PAYLOAD_JPEG, layer))
+        return layers
+    
+    def send_layers(self, layers: List[tuple], address: tuple):
+        """Send every layer of one frame, paced together over one frame interval"""
+        if self.pacer and len(layers) > 1:
+            self.pacer.start_frame(sum(self.wire_bytes(len(layer[0])) for layer in layers))
+            for payload, flags, payload_type, layer in layers:
+                self.send_payload(payload, address, flags, payload_type, layer, new_frame=False)
+            return
+        for payload, flags, payload_type, layer in layers:
+            self.send_payload(payload, address, flags, payload_type, layer)
+    
+    def wire_bytes(self, size: int) -> int:
+        """Bytes a payload of this size takes on the wire, headers and FEC included"""
+        total_chunks = max(1, (size + self.payload_size - 1) // self.payload_size)
+        groups = len(group_ranges(total_chunks, self.fec_group_size)) if self.fec_group_size else 0
+        return size + groups * (self.payload_size + 4) + (total_chunks + groups) * MEDIA_HEADER_SIZE
+    
+    def send_payload(self, data: bytes, address: tuple, flags: int = 0,
+                     payload_type: int = PAYLOAD_JPEG, layer: int = 0, new_frame: bool = True):
+        """Packetize one encoded frame, add FEC parity and send it paced
+        
+        new_frame=False continues the pacing budget send_layers started for
+        the other layers of the same frame.
+        """
+        data = memoryview(data)
+        
+        # Split into MTU-sized payloads so datagrams never fragment
+        max_chunk = self.payload_size
+        total_chunks = max(1, (len(data) + max_chunk - 1) // max_chunk)
+        chunks = [data[i * max_chunk:(i + 1) * max_chunk] for i in range(total_chunks)]
+        groups = group_ranges(total_chunks, self.fec_group_size) if self.fec_group_size else []
+        
+        self.frame_id += 1
+        header = MediaHeader(
+            stream_id=self.stream_id,
+            sequence=0,
+            timestamp=media_timestamp(),
+            frame_id=self.frame_id,
+            chunk_count=total_chunks,
+            flags=flags,
+            layer=layer,
+            payload_type=payload_type
+        )
+        
+        frame_bytes = self.wire_bytes(len(data))
+        if self.pacer:
+            if new_frame:
+                self.pacer.start_frame(frame_bytes)
+        else:
+            # Unpaced: the whole frame leaves back to back
+            self.max_burst = max(self.max_burst, frame_bytes)
+        
+        for i, chunk in enumerate(chunks):
+            self._send_packet(header._replace(chunk_index=i), chunk, address)
+            
+            # Parity follows the last data packet of each FEC group
+            group = i // self.fec_group_size if groups else None
+            if group is not None and i == groups[group][-1]:
+                parity = make_parity([chunks[j] for j in groups[group]], self.fec_group_size)
+                self._send_packet(header._replace(chunk_index=group, flags=flags | FLAG_FEC),
+                                  parity, address)
+                self.fec_packets_sent += 1
+        
+        self.frames_sent += 1
+    
+    def _send_packet(self, header: MediaHeader, payload: bytes, address: tuple):
+        """Stamp the next sequence number, pace and send one datagram"""
+        sequence = self.sequences[header.layer]
+        packet = header._replace(sequence=sequence).pack() + payload
+        self.sequences[header.layer] = sequence + 1
+        
+        if self.pacer:
+            self.pacer.wait(len(packet))
+        try:
+            self.sock.sendto(packet, address)
+        except OSError as e:
+            # Local drop when the send buffer is full
+            if e.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                raise
+            self.send_errors += 1
+            return
+        self.packets_sent += 1
+        self.bytes_sent += len(packet)
+        self.layer_bytes_sent[header.layer] += len(packet)
+    
     def receive_frame(self) -> Optional[tuple]:
-        """Receive and decode frame from UDP - returns (client_id, frame) tuple"""
+        """Receive and decode the next complete frame - returns (stream_id, frame) tuple"""
         try:
-            chunks = {}
-            total_chunks = None
-            sender_id = None
-            
             while True:
                 try:
-                    packet, _ = self.sock.recvfrom(65536)
-                    
-                    # Parse header: client_id_len(1) + chunk_idx(2) + total(2)
-                    if len(packet) < 5:
-                        continue
-                    
-                    client_id_len, chunk_idx, total = struct.unpack('BHH', packet[:5])
-                    
-                    # Extract client ID
-                    if len(packet) < 5 + client_id_len:
-                        continue
-                    
-                    current_sender = packet[5:5+client_id_len].decode('utf-8')
-                    chunk_data = packet[5+client_id_len:]
-                    
-                    # If first packet, set sender
-                    if sender_id is None:
-                        sender_id = current_sender
-                    
-                    # Only collect chunks from the same sender
-                    if current_sender == sender_id:
-                        chunks[chunk_idx] = chunk_data
-                        total_chunks = total
-                    
-                    # Check if we have all chunks
-                    if total_chunks and len(chunks) == total_chunks:
-                        break
-                        
+                    packet, addr = self.sock.recvfrom(65536)
                 except socket.timeout:
-                    if chunks:
-                        break
+                    self.assembler.evict()
+                    self.send_feedback()
                     return None
-            
-            if not chunks:
-                return None
-            
-            # Reassemble data
-            data = b''.join([chunks[i] for i in sorted(chunks.keys())])
-            
-            # Decode JPEG
-            nparr = np.frombuffer(data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            return (sender_id, frame) if sender_id else (None, frame)
+                
+                header = MediaHeader.unpack(packet)
+                if header is None:
+                    continue
+                if header.chunk_index == 0 and header.flags & FLAG_KEYFRAME \
+                        and not header.flags & FLAG_FEC and (
+                            header.stream_id in self.thinned_streams
+                            or self.stream_layers.get(header.stream_id, header.layer) != header.layer):
+                    # Gap the relay left on purpose (thinned frames, layer switch)
+                    self.skip_to(header)
+                self.stream_layers[header.stream_id] = header.layer
+                self.loss.update(header)
+                
+                if self.monitor:
+                    self.monitor.update(header, len(packet))
+                if self.nacks:
+                    self.nacks.update(header)
+                if self.nacks or self.monitor or self.wanted_layers:
+                    self.feedback_addr = addr
+                    self.send_feedback()
+                
+                result = self.assembler.add(header, packet[MEDIA_HEADER_SIZE:])
+                if result is None:
+                    continue
+                
+                header, data = result
+                
+                if header.payload_type == PAYLOAD_TILES:
+                    self.tile_streams.add(header.stream_id)
+                    frame = self.tile_decoder.decode(header.stream_id, data)
+                    if frame is None:
+                        continue
+                    return (header.stream_id, frame)
+                
+                # Decode JPEG
+                frame = self.decode_jpeg(header.stream_id, data, header.layer)
+                if frame is None:
+                    continue
+                
+                return (header.stream_id, frame)
             
         except Exception as e:
             print(f"Error receiving frame: {e}")
             return None
     
+    def skip_to(self, header: MediaHeader):
+        """Stop loss accounting and NACKs for packets the relay did not send us"""
+        self.loss.skip_to(header)
+        if self.nacks:
+            self.nacks.skip_to(header)
+        if self.monitor:
+            self.monitor.skip_to(header)
+    
+    def send_feedback(self):
+        """Send due NACKs, receiver reports and layer requests back to the relay"""
+        if self.feedback_addr is None:
+            return
+        
+        packets = []
+        if self.nacks:
+            for (stream_id, layer), sequences in self.nacks.due().items():
+                for i in range(0, len(sequences), MAX_NACK_ENTRIES):
+                    packets.append(build_nack(stream_id, sequences[i:i + MAX_NACK_ENTRIES], layer))
+        if self.monitor:
+            packets.extend(report.pack() for report in self.monitor.due_reports())
+        
+        # Simulcast layer requests: on change, then refreshed every interval
+        now = time.monotonic()
+        for stream_id, layer in list(self.wanted_layers.items()):
+            last = self.layer_requests.get(stream_id)
+            if last is None or last[0] != layer or now - last[1] >= self.layer_request_interval:
+                self.layer_requests[stream_id] = (layer, now)
+                packets.append(LayerRequest(stream_id, self.stream_id, layer).pack())
+        
+        for packet in packets:
+            try:
+                self.sock.sendto(packet, self.feedback_addr)
+            except OSError:
+                pass
+    
+    def poll_feedback(self):
+        """Feed receiver reports waiting on the send socket to the controller"""
+        while True:
+            try:
+                if not select.select([self.sock], [], [], 0)[0]:
+                    return
+                data = self.sock.recv(2048)
+            except OSError:
+                return
+            
+            report = ReceiverReport.unpack(data)
+            if report is None or report.stream_id != self.stream_id or report.layer >= MAX_LAYERS:
+                continue
+            
+            # A receiver of one simulcast layer is compared with what we send in that layer
+            now = time.monotonic()
+            sent = self.layer_bytes_sent[report.layer]
+            mark_time, mark_bytes = self.rate_marks[report.layer]
+            send_kbps = (sent - mark_bytes) * 8 / 1000 / max(now - mark_time, 1e-3)
+            self.rate_marks[report.layer] = (now, sent)
+            self.controller.on_report(report, send_kbps, now)
+    
+    def get_stats(self) -> dict:
+        """Send, pacing, loss and reassembly counters"""
+        stats = {
+            'frames_sent': self.frames_sent,
+            'packets_sent': self.packets_sent,
+            'bytes_sent': self.bytes_sent,
+            'fec_packets_sent': self.fec_packets_sent,
+            'send_errors': self.send_errors,
+            'reduced_decodes': self.reduced_decodes
+        }
+        if self.pacer:
+            stats.update(self.pacer.get_stats())
+        else:
+            stats['max_burst_bytes'] = self.max_burst
+        stats.update(self.loss.get_stats())
+        if self.nacks:
+            stats.update(self.nacks.get_stats())
+        if self.controller:
+            stats['abr'] = self.controller.get_stats()
+        if self.tile_encoder:
+            stats.update(self.tile_encoder.get_stats())
+        stats.update(self.assembler.get_stats())
+        return stats
+    
     def close(self):
         """Close socket"""
         if self.sock:
@@ -18,7 +18,8 @@ if __name__ == "__main__":
         "tests/test_video.py",
         "tests/test_audio.py",
         "tests/test_chat.py",
-        "tests/test_file_transfer.py"
+        "tests/test_file_transfer.py",
+        "tests/test_server.py"
     ]
     
     results = {}
@@ -6,7 +6,10 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 import time
 import numpy as np
 from src.audio_conferencing import AudioCapture, AudioPlayback
-from src.audio_conferencing import AudioStreamer
+from src.audio_conferencing import AudioStreamer, AudioMixer, JitterBuffer
+from src.audio_conferencing.mix_clock import MixClock
+from src.utils.media_header import MediaHeader, PAYLOAD_IMA_ADPCM
+from src.utils.compression import CompressionUtils
 
 def test_audio_capture():
     """Test audio capture functionality"""
@@ -109,14 +112,239 @@ def test_audio_loopback():
     return True
 
 
+def test_audio_mixer():
+    """Test mix-minus mixing with per-listener gains and mutes"""
+    print("\nTesting audio mixer...")
+    
+    mixer = AudioMixer(frame_samples=4, capacity=2)
+    for stream_id in (1, 2, 3, 4):
+        mixer.add(stream_id)
+    frame = lambda value: np.full(4, value, dtype=np.int16).tobytes()
+    
+    mixer.put(1, frame(1000))
+    mixer.put(2, frame(300))
+    mixes = {listeners: int(np.frombuffer(pcm, dtype=np.int16)[0]) for pcm, listeners in mixer.mix()}
+    assert mixes == {(1,): 300, (2,): 1000, (3, 4): 1300}
+    print(f"✓ Nobody hears themselves, identical mixes shared: {mixes}")
+    
+    assert mixer.mix() == []
+    mixer.mute(4, 1)
+    mixer.set_gain(3, 2, 0.5)
+    mixer.put(1, frame(1000))
+    mixer.put(2, frame(300))
+    mixes = {listeners: int(np.frombuffer(pcm, dtype=np.int16)[0]) for pcm, listeners in mixer.mix()}
+    assert mixes == {(1, 4): 300, (2,): 1000, (3,): 1150}
+    print(f"✓ Per-listener mute and gain: {mixes}")
+    
+    mixer.put(1, frame(30000))
+    mixer.put(2, frame(30000))
+    mixer.put(3, np.full(2, 100, dtype=np.int16).tobytes())
+    mixes = {listeners: np.frombuffer(pcm, dtype=np.int16) for pcm, listeners in mixer.mix()}
+    assert list(mixes[(1, 4)]) == [30100, 30100, 30000, 30000]
+    assert mixes[(3,)].max() == 32767
+    print("✓ Short frames zero-padded, sums saturate instead of wrapping")
+    
+    mixer.remove(1)
+    mixer.put(2, frame(300))
+    mixes = {listeners for _, listeners in mixer.mix()}
+    assert mixes == {(3,), (4,)}
+    print(f"✓ Matrix grew to {len(mixer.lengths)} rows; a lone sender gets no packet")
+    
+    print("✓ Audio mixer test PASSED")
+    return True
+
+
+def test_jitter_buffer():
+    """Test reordering, concealment, late frames and overruns in the jitter buffer"""
+    print("\nTesting jitter buffer...")
+    
+    def push(buffer, sequence):
+        header = MediaHeader(stream_id=1, sequence=sequence, timestamp=sequence * 4, payload_type=1)
+        buffer.push(header, np.full(4, 100 + sequence, dtype=np.int16).tobytes())
+    
+    def pop(buffer):
+        frame = buffer.pop()
+        return None if frame is None else int(np.frombuffer(frame, dtype=np.int16)[0])
+    
+    buffer = JitterBuffer(target=2, max_frames=4, max_conceal=2)
+    push(buffer, 1)
+    assert pop(buffer) is None
+    push(buffer, 0)
+    assert [pop(buffer), pop(buffer)] == [100, 101]
+    print("✓ Playout waits for the target depth and reorders by sequence")
+    
+    push(buffer, 3)
+    assert [pop(buffer), pop(buffer)] == [50, 103]
+    push(buffer, 2)
+    assert buffer.late == 1 and buffer.concealed == 1
+    print("✓ Missing frame concealed in time, its late arrival dropped")
+    
+    assert [pop(buffer), pop(buffer), pop(buffer)] == [51, 25, None]
+    assert buffer.underruns == 3
+    push(buffer, 40)
+    assert pop(buffer) is None
+    push(buffer, 41)
+    assert pop(buffer) == 140
+    print("✓ Concealment fades out, then playout restarts at the target depth")
+    
+    for sequence in range(42, 48):
+        push(buffer, sequence)
+    assert buffer.overruns == 3 and pop(buffer) == 144
+    print(f"✓ Overruns drop the oldest frames: {buffer.get_stats()}")
+    
+    push(buffer, 0)  # Sender restarted
+    push(buffer, 1)
+    assert [pop(buffer), pop(buffer)] == [100, 101]
+    
+    print("✓ Jitter buffer test PASSED")
+    return True
+
+
+def test_top_n_mixing():
+    """Test that only the loudest senders are mixed, with hysteresis"""
+    print("\nTesting top-N mixing...")
+    
+    mixer = AudioMixer(frame_samples=8, top_n=2, switch_margin_db=3.0, smoothing=1.0)
+    for stream_id in range(1, 7):
+        mixer.add(stream_id)
+    
+    def tick(levels):
+        """Mix one tick of square waves {stream_id: amplitude}; returns the mixed senders"""
+        for stream_id, amplitude in levels.items():
+            mixer.put(stream_id, (np.array([1, -1] * 4) * amplitude).astype(np.int16).tobytes())
+        mixes = mixer.mix()
+        assert len(mixes) <= 3
+        return {stream_id for stream_id, row in mixer.rows.items() if row in mixer.selected}
+    
+    room = {1: 100, 2: 200, 3: 3000, 4: 150, 5: 2000, 6: 50}
+    assert tick(room) == {3, 5}
+    assert mixer.senders_skipped == 4
+    print("✓ Only the two loudest of six senders mixed, at most three distinct mixes")
+    
+    room[2] = 2500  # Louder than sender 5, but by less than 3 dB
+    assert tick(room) == {3, 5}
+    room[2] = 6000
+    assert tick(room) == {2, 3}
+    assert mixer.top_n_switches == 1
+    print("✓ A new speaker takes over only once clearly louder")
+    
+    del room[3]
+    assert tick(room) == {2, 5}
+    print(f"✓ A sender that stopped frees its place: {mixer.get_stats()}")
+    
+    print("✓ Top-N mixing test PASSED")
+    return True
+
+
+def test_mix_clock():
+    """Test that the mixing clock keeps its rate through late wake-ups"""
+    print("\nTesting mixing clock...")
+    
+    clock = MixClock.for_audio(44100, 1024)
+    assert abs(clock.interval - 0.02322) < 0.0001
+    
+    # Every wake-up 5ms late: the next wait is shorter, the schedule stays put
+    clock = MixClock(0.02)
+    now = 100.0
+    assert clock.delay(now) == 0.0
+    ticks = []
+    for _ in range(50):
+        now += clock.delay(now) + 0.005
+        clock.tick(now)
+        ticks.append(now)
+    assert abs(ticks[-1] - (100.0 + 49 * 0.02 + 0.005)) < 1e-9
+    assert abs(clock.get_stats()['mean_lateness_ms'] - 5.0) < 0.01
+    print(f"✓ No drift over 50 late ticks: {clock.get_stats()}")
+    
+    now += 1.0  # Stalled for 50 intervals
+    clock.tick(now)
+    assert clock.skipped == 49 and clock.delay(now) <= 0.02
+    print("✓ Ticks missed in a stall are skipped, not burst")
+    
+    clock = MixClock(0.01)
+    start = time.monotonic()
+    for _ in range(30):
+        clock.wait()
+    elapsed = time.monotonic() - start
+    assert 0.28 <= elapsed < 0.4
+    print(f"✓ 30 real ticks of 10ms took {elapsed * 1000:.0f}ms")
+    
+    print("✓ Mixing clock test PASSED")
+    return True
+
+
+def test_audio_codecs():
+    """Test the mu-law and IMA-ADPCM codecs and codec negotiation"""
+    print("\nTesting audio codecs...")
+    
+    t = np.arange(1024) / 44100
+    pcm = (8000 * np.sin(2 * np.pi * 440 * t) + 3000 * np.sin(2 * np.pi * 1234 * t)).astype(np.int16)
+    
+    def snr(decoded):
+        error = pcm.astype(np.float64) - np.frombuffer(decoded, np.int16)
+        return 10 * np.log10(np.sum(pcm.astype(np.float64) ** 2) / np.sum(error ** 2))
+    
+    ulaw = CompressionUtils.encode_ulaw(pcm.tobytes())
+    assert len(ulaw) == 1024
+    assert snr(CompressionUtils.decode_ulaw(ulaw)) > 30
+    extremes = np.array([-32768, -1000, 0, 1000, 32767], np.int16)
+    decoded = CompressionUtils.decode_ulaw(CompressionUtils.encode_ulaw(extremes.tobytes()))
+    decoded = np.frombuffer(decoded, np.int16)
+    assert list(decoded) == [-32124, -988, 0, 988, 32124]
+    print(f"✓ mu-law: {len(pcm.tobytes()) / len(ulaw):.1f}x, {snr(CompressionUtils.decode_ulaw(ulaw)):.1f}dB")
+    
+    adpcm = CompressionUtils.encode_adpcm(pcm.tobytes())
+    assert len(pcm.tobytes()) / len(adpcm) > 3.5
+    assert snr(CompressionUtils.decode_adpcm(adpcm)) > 30
+    # Blocks are independent: a partial last block and a chunk cut short still decode
+    assert len(CompressionUtils.decode_adpcm(CompressionUtils.encode_adpcm(pcm[:1000].tobytes()))) == 2000
+    assert len(CompressionUtils.decode_adpcm(adpcm[:2 + 36 * 4])) == 256 * 2
+    assert CompressionUtils.decode_adpcm(CompressionUtils.encode_adpcm(b'')) == b''
+    print(f"✓ IMA-ADPCM: {len(pcm.tobytes()) / len(adpcm):.2f}x, {snr(CompressionUtils.decode_adpcm(adpcm)):.1f}dB")
+    
+    assert CompressionUtils.negotiate_audio_codec(['adpcm', 'ulaw']) == 'adpcm'
+    assert CompressionUtils.negotiate_audio_codec(['opus', 'adpcm', 'ulaw'], ['ulaw', 'pcm16']) == 'ulaw'
+    assert CompressionUtils.negotiate_audio_codec(None) == 'pcm16'
+    print("✓ Negotiation picks the client's first codec the server allows")
+    
+    sender = AudioStreamer(stream_id=7, codec='adpcm')
+    receiver = AudioStreamer()
+    receiver.setup_receiver('127.0.0.1', 0)
+    sender.setup_sender()
+    sender.send_audio(pcm.tobytes(), receiver.sock.getsockname())
+    received = None
+    for _ in range(20):
+        received = receiver.receive_audio()
+        if received:
+            break
+    assert receiver.last_header.payload_type == PAYLOAD_IMA_ADPCM
+    assert sender.timestamp == 1024 and snr(received) > 30
+    sender.close()
+    receiver.close()
+    print("✓ AudioStreamer sends the negotiated codec and receives PCM16")
+    
+    print("✓ Audio codecs test PASSED")
+    return True
+
+
 if __name__ == "__main__":
     print("=== Audio Module Tests ===\n")
     
     test1 = test_audio_capture()
     test2 = test_audio_playback()
     test3 = test_audio_loopback()
+    test4 = test_audio_mixer()
+    test5 = test_jitter_buffer()
+    test6 = test_top_n_mixing()
+    test7 = test_mix_clock()
+    test8 = test_audio_codecs()
     
     print("\n=== Test Summary ===")
     print(f"Audio Capture: {'✓ PASS' if test1 else '❌ FAIL'}")
     print(f"Audio Playback: {'✓ PASS' if test2 else '❌ FAIL'}")
-    print(f"Audio Loopback: {'✓ PASS' if test3 else '❌ FAIL'}")
\ No newline at end of file
+    print(f"Audio Loopback: {'✓ PASS' if test3 else '❌ FAIL'}")
+    print(f"Audio Mixer: {'✓ PASS' if test4 else '❌ FAIL'}")
+    print(f"Jitter Buffer: {'✓ PASS' if test5 else '❌ FAIL'}")
+    print(f"Top-N Mixing: {'✓ PASS' if test6 else '❌ FAIL'}")
+    print(f"Mixing Clock: {'✓ PASS' if test7 else '❌ FAIL'}")
+    print(f"Audio Codecs: {'✓ PASS' if test8 else '❌ FAIL'}")
\ No newline at end of file
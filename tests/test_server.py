@@ -0,0 +1,793 @@
+import sys
+from pathlib import Path
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import json
+import resource
+import socket
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+from src.server import CollaborationServer, create_server
+from src.async_server import AsyncCollaborationServer
+from src.utils.outbound import OutboundQueue, OutboundWriter, STREAM_CONTROL, STREAM_SCREEN, recv_wait
+from src.utils.media_header import (
+    MediaHeader, MEDIA_HEADER_SIZE, FLAG_KEYFRAME, FLAG_FEC, PAYLOAD_TILES, TRANSCODED_LAYER,
+    PAYLOAD_PCM16, PAYLOAD_ULAW, PAYLOAD_IMA_ADPCM, is_feedback
+)
+from src.utils.compression import CompressionUtils
+from src.utils.retransmit import RetransmitCache, build_nack
+from src.video_conferencing.rate_control import ReceiverReport
+from src.utils.feedback import LayerRequest
+from src.utils.speakers import SpeakerTracker, energy_db
+from src.utils.thinning import FrameThinner
+from src.utils.transcoding import Variant
+
+
+def make_config(base_port: int, mode: str, video: dict = None, audio: dict = None) -> str:
+    """Write a config using free test ports and return its path"""
+    config = {
+        "server": {
+            "host": "127.0.0.1",
+            "mode": mode,
+            "video_port": base_port,
+            "audio_port": base_port + 1,
+            "screen_port": base_port + 2,
+            "chat_port": base_port + 3,
+            "file_port": base_port + 4,
+            "control_port": base_port + 5
+        }
+    }
+    if video:
+        config["video"] = video
+    if audio:
+        config["audio"] = audio
+    path = Path(tempfile.mkdtemp()) / "config.json"
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def join(port: int, client_id: str, username: str):
+    """Open a control connection and complete the handshake"""
+    sock = socket.create_connection(("127.0.0.1", port), timeout=2.0)
+    sock.sendall(json.dumps({'client_id': client_id, 'username': username}).encode('utf-8'))
+    response = json.loads(sock.recv(4096).decode('utf-8'))
+    return sock, response
+
+
+def test_async_server():
+    """Test control handshake and chat relay in asyncio mode"""
+    print("Testing asyncio server...")
+    
+    base_port = 15400
+    server = create_server(make_config(base_port, "asyncio"))
+    assert type(server) is AsyncCollaborationServer
+    server.start()
+    
+    try:
+        alice, response = join(base_port + 5, "alice-id", "Alice")
+        assert response['status'] == 'connected'
+        print("✓ Alice connected")
+        
+        bob, response = join(base_port + 5, "bob-id", "Bob")
+        assert [c['username'] for c in response['clients']] == ['Alice', 'Bob']
+        print("✓ Bob connected and received client list")
+        
+        update = json.loads(alice.recv(4096).decode('utf-8').strip())
+        assert update['action'] == 'joined' and update['username'] == 'Bob'
+        print("✓ Join broadcast delivered")
+        
+        chat_a = socket.create_connection(("127.0.0.1", base_port + 3), timeout=2.0)
+        chat_b = socket.create_connection(("127.0.0.1", base_port + 3), timeout=2.0)
+        time.sleep(0.1)
+        chat_a.sendall(b'hello\n')
+        assert chat_b.recv(4096) == b'hello\n'
+        print("✓ Chat message relayed")
+        
+        for sock in (alice, bob, chat_a, chat_b):
+            sock.close()
+    finally:
+        server.stop()
+    
+    print("✓ Asyncio server test PASSED")
+    return True
+
+
+def test_outbound_queue():
+    """Test per-stream drop policies of the send queue"""
+    print("\nTesting outbound queue policies...")
+    
+    queue = OutboundQueue(max_bytes=1000, slow_timeout=1.0)
+    
+    # Screen frames: oldest dropped once the queue is full
+    for i in range(5):
+        assert queue.push(bytes([i]) * 300, STREAM_SCREEN, now=0.0)
+    assert queue.queued_bytes <= 1000
+    assert queue.dropped_messages == 2
+    assert bytes(queue.peek())[0] == 2
+    print(f"✓ Dropped {queue.dropped_messages} oldest screen frames")
+    
+    # Control messages are never dropped, even over the limit
+    assert queue.push(b'c' * 500, STREAM_CONTROL, now=0.0)
+    assert queue.dropped_messages == 2
+    print("✓ Control message kept over limit")
+    
+    # Staying over the limit past the timeout disconnects the peer
+    assert queue.check_limit(now=0.5)
+    assert not queue.check_limit(now=1.5)
+    print("✓ Slow consumer flagged after timeout")
+    
+    print("✓ Outbound queue test PASSED")
+    return True
+
+
+def test_slow_consumer_isolation():
+    """Test that a stalled peer does not block others and gets disconnected"""
+    print("\nTesting slow consumer isolation...")
+    
+    writer = OutboundWriter(max_bytes=256 * 1024, slow_timeout=0.5)
+    writer.start()
+    
+    fast_local, fast_peer = socket.socketpair()
+    slow_local, slow_peer = socket.socketpair()
+    writer.register(fast_local)
+    writer.register(slow_local)
+    assert not fast_local.getblocking() and not slow_local.getblocking()
+    threading.Timer(0.1, slow_peer.sendall, (b'ping',)).start()
+    assert recv_wait(slow_local, 4) == b'ping'
+    print("✓ Registered sockets are non-blocking and still readable by their handlers")
+    
+    # Handlers must keep working once descriptors pass select()'s 1024 limit
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard >= 2048:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, 2048), hard))
+        filler = [socket.socketpair() for _ in range(520)]
+        high_local, high_peer = socket.socketpair()
+        assert high_local.fileno() >= 1024
+        writer.register(high_local)
+        threading.Timer(0.1, high_peer.sendall, (b'pong',)).start()
+        assert recv_wait(high_local, 4) == b'pong'
+        writer.unregister(high_local)
+        for a, b in filler + [(high_local, high_peer)]:
+            a.close()
+            b.close()
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        print("✓ recv_wait works on descriptors above 1024")
+    
+    message = b'x' * 8192
+    total = len(message) * 100
+    received = []
+    
+    def read_fast():
+        count = 0
+        while count < total:
+            chunk = fast_peer.recv(65536)
+            if not chunk:
+                break
+            count += len(chunk)
+        received.append(count)
+    
+    reader = threading.Thread(target=read_fast, daemon=True)
+    reader.start()
+    
+    start = time.time()
+    for _ in range(100):
+        writer.send(fast_local, message)
+        writer.send(slow_local, message)
+        time.sleep(0.005)
+    assert time.time() - start < 2.0
+    print("✓ Broadcast loop never blocked on the stalled peer")
+    
+    reader.join(timeout=2.0)
+    assert received == [total]
+    print(f"✓ Fast peer received all {total} bytes")
+    
+    time.sleep(1.0)
+    writer.send(slow_local, message)
+    assert writer.get_stats()['disconnects'] == 1
+    slow_peer.settimeout(1.0)
+    while slow_peer.recv(65536):
+        pass
+    print("✓ Slow peer disconnected")
+    
+    writer.stop()
+    for sock in (fast_local, fast_peer, slow_local, slow_peer):
+        sock.close()
+    
+    print("✓ Slow consumer isolation test PASSED")
+    return True
+
+
+def test_routing_table():
+    """Test lock-free media routing snapshots"""
+    print("\nTesting routing table...")
+    
+    server = CollaborationServer(make_config(15450, "threaded"))
+    conns = [socket.socketpair() for _ in range(3)]
+    for i, (conn, _) in enumerate(conns):
+        server.register_client(f"client-{i}", f"User{i}", (f"10.0.0.{i + 1}", 40000), conn)
+    
+    table = server.routing
+    assert len(table) == 3
+    assert sorted(table.by_stream_id) == [1, 2, 3]
+    print("✓ Numeric stream IDs assigned")
+    
+    packet = MediaHeader(stream_id=1, sequence=0, timestamp=0).pack() + b'payload'
+    dests = server.route_video_packet(packet, ("10.0.0.1", 50000))
+    assert sorted(dests) == [("10.0.0.2", 15450), ("10.0.0.3", 15450)]
+    assert server.routing is not table
+    assert server.routing.by_video_addr[("10.0.0.1", 50000)].client_id == "client-0"
+    print("✓ Sender address learned, fan-out excludes sender")
+    
+    learned = server.routing
+    assert server.route_video_packet(packet, ("10.0.0.1", 50000)) == dests
+    assert server.routing is learned
+    assert server.route_video_packet(b'garbage', ("10.0.0.1", 50000)) == ()
+    print("✓ Known address routed without rebuilding, malformed packet dropped")
+    
+    server.unregister_client("client-2")
+    assert server.routing.video_fanout[1] == (("10.0.0.2", 15450),)
+    assert len(learned) == 3
+    print("✓ Leave swaps in a new snapshot, old snapshot unchanged")
+    
+    for a, b in conns:
+        a.close()
+        b.close()
+    
+    print("✓ Routing table test PASSED")
+    return True
+
+
+def test_nack_retransmit():
+    """Test that the video relay resends cached packets a receiver NACKs"""
+    print("\nTesting relay retransmission...")
+    
+    server = CollaborationServer(make_config(15460, "threaded"))
+    conns = [socket.socketpair() for _ in range(2)]
+    for i, (conn, _) in enumerate(conns):
+        server.register_client(f"client-{i}", f"User{i}", (f"10.0.0.{i + 1}", 40000), conn)
+    
+    packets = [
+        MediaHeader(stream_id=1, sequence=seq, timestamp=0).pack() + bytes([seq]) * 100
+        for seq in range(5)
+    ]
+    for packet in packets:
+        server.route_video_packet(packet, ("10.0.0.1", 50000))
+    assert server.video_cache.get_stats()['cached_packets'] == 5
+    print("✓ Relayed packets cached")
+    
+    nack = build_nack(1, [1, 3, 99])
+    assert is_feedback(nack) and not is_feedback(packets[0])
+    replies = server.handle_video_feedback(nack, ("10.0.0.2", 50001))
+    assert replies == [(packets[1], ("10.0.0.2", 50001)), (packets[3], ("10.0.0.2", 50001))]
+    print("✓ Only the NACKed packets resent, to the receiver that asked")
+    
+    report = ReceiverReport(stream_id=1, reporter_id=2, fraction_lost=0.1,
+                            jitter_ms=5, throughput_kbps=800).pack()
+    assert server.handle_video_feedback(report, ("10.0.0.2", 50001)) == \
+        [(report, ("10.0.0.1", 50000))]
+    print("✓ Receiver report forwarded to the sender's video address")
+    
+    cache = RetransmitCache(max_packets=3, max_age=1.0)
+    for seq in range(5):
+        cache.put(1, seq, b'p', now=0.0)
+    assert cache.get(1, 1) is None and cache.get(1, 4) == b'p'
+    cache.evict(now=2.0)
+    assert cache.get_stats()['cached_packets'] == 0
+    print("✓ Cache bounded by size and age")
+    
+    for a, b in conns:
+        a.close()
+        b.close()
+    
+    print("✓ Relay retransmission test PASSED")
+    return True
+
+
+def test_simulcast_relay():
+    """Test that each receiver gets only the simulcast layer chosen for it"""
+    print("\nTesting simulcast layer selection...")
+    
+    server = CollaborationServer(make_config(15470, "threaded"))
+    conns = [socket.socketpair() for _ in range(3)]
+    for i, (conn, _) in enumerate(conns):
+        server.register_client(f"client-{i}", f"User{i}", (f"10.0.0.{i + 1}", 40000), conn)
+    sender = ("10.0.0.1", 50000)
+    full, small = ("10.0.0.2", 15470), ("10.0.0.3", 15470)
+    
+    sequences = [0, 0, 0]
+    
+    def send_frame(frame_id, layers=(0, 1, 2), chunks=2):
+        """Route one frame of every layer; {layer: destinations of each chunk}"""
+        routed = {}
+        for layer in layers:
+            routed[layer] = []
+            for chunk in range(chunks):
+                packet = MediaHeader(stream_id=1, sequence=sequences[layer], timestamp=0,
+                                     frame_id=frame_id, chunk_index=chunk, chunk_count=chunks,
+                                     flags=FLAG_KEYFRAME, layer=layer).pack() + b'x' * 100
+                sequences[layer] += 1
+                routed[layer].append(server.route_video_packet(packet, sender))
+        return routed
+    
+    # The first frame shows the relay that the sender is simulcasting
+    routed = send_frame(0)
+    assert routed[0] == [(full, small), (full, small)] and routed[2] == [(), ()]
+    
+    request = LayerRequest(stream_id=1, requester_id=3, layer=2).pack()
+    assert is_feedback(request)
+    assert server.handle_video_feedback(request, ("10.0.0.3", 50001)) == []
+    routed = send_frame(1)
+    assert routed[0] == [(full, small), (full, small)]
+    assert routed[2] == [(small,), (small,)]
+    routed = send_frame(2)
+    assert routed[0] == [(full,), (full,)]
+    assert routed[1] == [(), ()]
+    assert routed[2] == [(small,), (small,)]
+    print("✓ Full layer to the large view, smallest layer to the one that asked for it")
+    
+    # Switches wait for the next frame boundary of the new layer
+    server.handle_video_feedback(LayerRequest(1, 3, 0).pack(), ("10.0.0.3", 50001))
+    routed = send_frame(3, layers=(2,), chunks=1)
+    assert routed[2] == [(small,)]
+    routed = send_frame(4)
+    assert routed[0] == [(full, small), (full, small)]
+    assert routed[2] == [(), ()]
+    print("✓ Layer switch takes effect at a keyframe, never mid-frame")
+    
+    lossy = ReceiverReport(stream_id=1, reporter_id=2, fraction_lost=0.2,
+                           jitter_ms=5, throughput_kbps=800).pack()
+    assert server.handle_video_feedback(lossy, ("10.0.0.2", 50001)) == []
+    send_frame(5)
+    routed = send_frame(6)
+    assert routed[0] == [(small,), (small,)] and routed[1] == [(full,), (full,)]
+    print("✓ Lossy receiver moved down a layer, report absorbed at the relay")
+    
+    server.handle_video_feedback(lossy, ("10.0.0.2", 50001))
+    assert server.handle_video_feedback(lossy, ("10.0.0.2", 50001)) == [(lossy, sender)]
+    stats = server.video_layers.get_stats()
+    assert stats['reports_absorbed'] == 2
+    print(f"✓ Reports reach the sender only from the lowest layer: {stats}")
+    
+    server.unregister_client("client-2")
+    assert not any(3 in key for key in server.video_layers.requested)
+    
+    for a, b in conns:
+        a.close()
+        b.close()
+    
+    print("✓ Simulcast relay test PASSED")
+    return True
+
+
+def test_selective_forwarding():
+    """Test that the relay forwards video only to clients subscribed to the sender"""
+    print("\nTesting selective forwarding...")
+    
+    base_port = 15480
+    server = CollaborationServer(make_config(base_port, "threaded"))
+    server.start()
+    
+    try:
+        socks = [join(base_port + 5, f"client-{i}", f"User{i}")[0] for i in range(3)]
+        packet = MediaHeader(stream_id=1, sequence=0, timestamp=0).pack() + b'payload'
+        assert len(server.route_video_packet(packet, ("127.0.0.1", 50000))) == 2
+        print("✓ Everybody receives every sender until they subscribe")
+        
+        # Client 3 shows only client 2; both updates arrive in one read
+        socks[2].sendall(b'{"type": "subscribe", "streams": [3]}\n'
+                         b'{"type": "subscribe", "streams": [2]}\n')
+        deadline = time.time() + 2.0
+        while server.routing.by_client_id["client-2"].subscriptions != {2} \
+                and time.time() < deadline:
+            time.sleep(0.01)
+        assert server.routing.by_client_id["client-2"].subscriptions == {2}
+        assert len(server.route_video_packet(packet, ("127.0.0.1", 50000))) == 1
+        assert len(server.routing.video_fanout[2]) == 2
+        print("✓ Unsubscribed receiver skipped, fan-out precomputed in the routing table")
+        
+        table = server.routing
+        server.set_subscriptions("client-2", [2])
+        assert server.routing is table
+        server.set_subscriptions("client-2", None)
+        assert len(server.routing.video_fanout[1]) == 2
+        print("✓ Unchanged subscriptions keep the snapshot, null restores full fan-out")
+        
+        for sock in socks:
+            sock.close()
+    finally:
+        server.stop()
+    
+    print("✓ Selective forwarding test PASSED")
+    return True
+
+
+def test_last_n_speakers():
+    """Test last-N video forwarding driven by audio energy"""
+    print("\nTesting last-N speaker forwarding...")
+    
+    def tone(amplitude):
+        samples = (np.sin(np.arange(882) * 0.1) * amplitude).astype(np.int16)
+        return samples.tobytes()
+    
+    silence, quiet, loud = tone(0), tone(1000), tone(16000)
+    assert energy_db(silence) == -100.0 and -35 < energy_db(quiet) < -25
+    print(f"✓ Energy: {energy_db(quiet):.1f} dBFS quiet, {energy_db(loud):.1f} dBFS loud")
+    
+    def talk(tracker, levels, start, duration, step=0.02):
+        """Feed {stream_id: pcm} every step seconds; returns the time reached"""
+        now = start
+        while now < start + duration:
+            for stream_id, pcm in levels.items():
+                tracker.update(stream_id, pcm, now=now)
+            tracker.evaluate(now)
+            now += step
+        return now
+    
+    tracker = SpeakerTracker(last_n=2)
+    for stream_id in (1, 2, 3, 4):
+        tracker.add(stream_id)
+    assert tracker.last_n_streams() == {1, 2}
+    now = talk(tracker, {4: loud, 1: silence}, 0.0, 0.2)
+    assert tracker.dominant is None and tracker.last_n_streams() == {1, 2}
+    now = talk(tracker, {4: loud, 1: silence}, now, 0.2)
+    assert tracker.dominant == 4 and tracker.last_n_streams() == {4, 1}
+    print("✓ Speaker promoted into the last N after 0.3s, a short burst is not")
+    
+    now = talk(tracker, {4: quiet, 3: loud}, now, 0.5)
+    assert tracker.dominant == 4 and tracker.last_n_streams() == {3, 4}
+    now = talk(tracker, {4: quiet, 3: loud}, now, 1.0)
+    assert tracker.dominant == 3
+    print("✓ Dominant speaker switches only after staying louder for 1s")
+    
+    server = CollaborationServer(make_config(15490, "threaded", {"last_n": 2}))
+    server.outbound.start()
+    conns = [socket.socketpair() for _ in range(4)]
+    for i, (conn, _) in enumerate(conns):
+        server.register_client(f"client-{i}", f"User{i}", (f"10.0.0.{i + 1}", 40000), conn)
+    assert server.routing.video_senders == {1, 2}
+    assert server.routing.video_fanout[4] == ()
+    
+    server.set_subscriptions("client-0", None, [4])
+    assert server.routing.video_fanout[4] == (("10.0.0.1", 15490),)
+    print("✓ Only the last N are forwarded, pinned streams always")
+    
+    packet = MediaHeader(stream_id=3, sequence=0, timestamp=0, payload_type=1).pack() + loud
+    server.buffer_audio_packet(packet, ("10.0.0.3", 50002))
+    assert server.speakers.levels[3] == energy_db(loud)
+    now = 1000.0
+    for _ in range(20):
+        server.speakers.update(3, loud, now=now)
+        server.update_speakers(now)
+        now += 0.02
+    assert server.routing.video_senders == {3, 1}
+    assert len(server.routing.video_fanout[3]) == 3 and server.routing.video_fanout[2] == ()
+    
+    peer = conns[1][1]
+    peer.settimeout(2.0)
+    received = b''
+    while b'dominant_speaker' not in received:
+        received += peer.recv(65536)
+    events = [json.loads(line) for line in received.decode('utf-8').splitlines()
+              if 'dominant_speaker' in line]
+    assert events[-1] == {'type': 'dominant_speaker', 'stream_id': 3, 'last_n': [1, 3]}
+    print(f"✓ Routing swapped and speaker change announced: {events[-1]}")
+    
+    server.outbound.stop()
+    for a, b in conns:
+        a.close()
+        b.close()
+    
+    print("✓ Last-N speaker test PASSED")
+    return True
+
+
+def test_frame_rate_caps():
+    """Test that capped receivers get whole frames at no more than their frame rate"""
+    print("\nTesting per-receiver frame rate caps...")
+    
+    server = CollaborationServer(make_config(15500, "threaded"))
+    conns = [socket.socketpair() for _ in range(3)]
+    for i, (conn, _) in enumerate(conns):
+        server.register_client(f"client-{i}", f"User{i}", (f"10.0.0.{i + 1}", 40000), conn)
+    full, capped = ("10.0.0.2", 15500), ("10.0.0.3", 15500)
+    server.set_subscriptions("client-2", None, [], {"1": 10})
+    assert server.routing.video_caps == {1: {capped: 100}}
+    print("✓ Caps from the subscribe message precomputed in the routing table")
+    
+    sequence = 0
+    received = {full: [], capped: []}
+    for frame_id in range(30):
+        # 30 fps: three chunks and one parity packet per frame
+        for chunk, flags in ((0, FLAG_KEYFRAME), (1, FLAG_KEYFRAME), (2, FLAG_KEYFRAME),
+                             (0, FLAG_KEYFRAME | FLAG_FEC)):
+            packet = MediaHeader(stream_id=1, sequence=sequence, timestamp=frame_id * 33,
+                                 frame_id=frame_id, chunk_index=chunk, chunk_count=3,
+                                 flags=flags).pack()
+            sequence += 1
+            for dest in server.route_video_packet(packet, ("10.0.0.1", 50000)):
+                received[dest].append(frame_id)
+    
+    assert received[full] == [f for f in range(30) for _ in range(4)]
+    frames = sorted(set(received[capped]))
+    assert frames == list(range(0, 30, 3))
+    assert all(received[capped].count(f) == 4 for f in frames)
+    print(f"✓ 30 fps thinned to {len(frames)} whole frames per second: {frames}")
+    
+    # The capped receiver's report reaches the sender scaled back to the full rate
+    for reporter, kbps in ((3, 300), (2, 900)):
+        report = ReceiverReport(stream_id=1, reporter_id=reporter, fraction_lost=0.0,
+                                jitter_ms=5, throughput_kbps=kbps)
+        [(packet, dest)] = server.handle_video_feedback(report.pack(), (f"10.0.0.{reporter}", 50000))
+        assert dest == ("10.0.0.1", 50000)
+        assert ReceiverReport.unpack(packet).throughput_kbps == 900
+    print("✓ Capped receiver's report scaled by the share of frames it kept")
+    
+    thinner = FrameThinner()
+    caps = {capped: 100}
+    kept = []
+    for frame_id in range(12):
+        payload_type = PAYLOAD_TILES if frame_id % 6 else 0
+        flags = 0 if frame_id % 6 else FLAG_KEYFRAME
+        packet = MediaHeader(stream_id=1, sequence=frame_id, timestamp=frame_id * 33,
+                             frame_id=frame_id, flags=flags, payload_type=payload_type).pack()
+        if thinner.route(packet, 1, (capped,), caps):
+            kept.append(frame_id)
+    assert kept == [0, 6, 7]
+    print(f"✓ Tile deltas stop after a skipped frame until the next keyframe: {kept}")
+    
+    # The control thread forgets clients while the relay thread routes
+    thinner = FrameThinner()
+    dests = tuple(("10.0.1.%d" % i, 15500) for i in range(200))
+    caps = {dest: 100 for dest in dests}
+    errors = []
+    
+    def relay():
+        try:
+            for frame_id in range(300):
+                packet = MediaHeader(stream_id=frame_id % 50, sequence=frame_id,
+                                     timestamp=frame_id * 33, frame_id=frame_id).pack()
+                thinner.route(packet, frame_id % 50, dests, caps)
+                thinner.kept_ratio(frame_id % 50, dests[0])
+        except Exception as e:
+            errors.append(e)
+    
+    relay_thread = threading.Thread(target=relay)
+    relay_thread.start()
+    while relay_thread.is_alive():
+        thinner.forget(99, ("10.0.9.9", 15500))
+    relay_thread.join()
+    assert errors == []
+    print("✓ Clients forgotten while frames are routed")
+    
+    server.unregister_client("client-2")
+    assert server.routing.video_caps == {}
+    assert not server.video_thinning.due
+    
+    for a, b in conns:
+        a.close()
+        b.close()
+    
+    print("✓ Frame rate cap test PASSED")
+    return True
+
+
+def test_transcoding():
+    """Test that the relay transcodes a frame once per variant for weak receivers"""
+    print("\nTesting relay transcoding...")
+    
+    server = CollaborationServer(make_config(15510, "threaded", {"transcode_workers": 1}))
+    server.video_transcoder.start()
+    conns = [socket.socketpair() for _ in range(4)]
+    for i, (conn, _) in enumerate(conns):
+        server.register_client(f"client-{i}", f"User{i}", (f"10.0.0.{i + 1}", 40000), conn)
+    half = Variant(0.5, 50)
+    server.set_subscriptions("client-2", None, [], None, {"scale": 0.5, "quality": 48})
+    server.set_subscriptions("client-3", None, [], None, {"scale": 0.3, "quality": 30})
+    quarter = Variant(0.25, 30)
+    assert server.routing.video_receivers[1] == ((2, ("10.0.0.2", 15510)),)
+    assert server.routing.video_variants[1] == {
+        half: (("10.0.0.3", 15510),), quarter: (("10.0.0.4", 15510),)
+    }
+    print("✓ Requests rounded to shared variants and routed instead of the original")
+    
+    # One 320x240 JPEG keyframe from client-0, in 1200-byte chunks
+    gradient = np.tile(np.arange(320, dtype=np.uint8), (240, 1))
+    jpeg = cv2.imencode('.jpg', cv2.merge([gradient] * 3), [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    chunks = [jpeg[i:i + 1200] for i in range(0, len(jpeg), 1200)]
+    for index, chunk in enumerate(chunks):
+        packet = MediaHeader(stream_id=1, sequence=index, timestamp=0, frame_id=7,
+                             chunk_index=index, chunk_count=len(chunks),
+                             flags=FLAG_KEYFRAME).pack() + chunk
+        assert server.route_video_packet(packet, ("10.0.0.1", 50000)) == (("10.0.0.2", 15510),)
+    
+    deadline = time.time() + 30.0
+    while server.transcoded.qsize() < 2 and time.time() < deadline:
+        time.sleep(0.05)
+    assert server.transcoded.qsize() == 2
+    
+    # The relay thread caches and sends what the pool handed over
+    sent = {}
+    
+    class Relay:
+        def sendto(self, packet, dest):
+            sent.setdefault(dest, []).append(packet)
+    
+    server.deliver_transcoded(Relay())
+    assert server.transcoded.empty()
+    stats = server.video_transcoder.get_stats()
+    assert stats['frames_transcoded'] == 1 and stats['variants_encoded'] == 2
+    
+    sizes = {}
+    for dest, packets in sent.items():
+        headers = [MediaHeader.unpack(p) for p in packets]
+        assert all(h.layer >= TRANSCODED_LAYER and h.frame_id == 7 for h in headers)
+        assert [h.sequence for h in headers] == list(range(len(packets)))
+        image = cv2.imdecode(np.frombuffer(
+            b''.join(p[MEDIA_HEADER_SIZE:] for p in packets), np.uint8), cv2.IMREAD_COLOR)
+        sizes[dest] = image.shape[:2]
+    assert sizes == {("10.0.0.3", 15510): (120, 160), ("10.0.0.4", 15510): (60, 80)}
+    print(f"✓ Frame decoded once, two variants encoded and cached: {stats}")
+    
+    layer = server.video_transcoder.layer_of(half)
+    replies = server.handle_video_feedback(build_nack(1, [0], layer), ("10.0.0.3", 15510))
+    assert replies == [(sent[("10.0.0.3", 15510)][0], ("10.0.0.3", 15510))]
+    report = ReceiverReport(stream_id=1, reporter_id=3, fraction_lost=0.5, jitter_ms=0,
+                            throughput_kbps=0, layer=layer)
+    assert server.handle_video_feedback(report.pack(), ("10.0.0.3", 15510)) == []
+    print("✓ Variant packets NACKable, their receiver reports kept from the sender")
+    
+    server.video_transcoder.close()
+    for a, b in conns:
+        a.close()
+        b.close()
+    
+    print("✓ Transcoding test PASSED")
+    return True
+
+
+def test_mix_minus():
+    """Test that the audio relay sends every listener a mix without its own voice"""
+    print("\nTesting mix-minus audio relay...")
+    
+    server = CollaborationServer(make_config(15520, "threaded", audio={"jitter_target_frames": 1}))
+    conns = [socket.socketpair() for _ in range(4)]
+    for i, (conn, _) in enumerate(conns):
+        server.register_client(f"client-{i}", f"User{i}", (f"10.0.0.{i + 1}", 40000), conn)
+    
+    for stream_id, value in ((1, 1000), (2, 300)):
+        packet = MediaHeader(stream_id=stream_id, sequence=0, timestamp=0,
+                             payload_type=1).pack() + np.full(1024, value, np.int16).tobytes()
+        server.buffer_audio_packet(packet, (f"10.0.0.{stream_id}", 50001))
+    
+    heard = {}
+    packets = server.mix_pending_audio()
+    for packet, dests in packets:
+        assert MediaHeader.unpack(packet).stream_id == 0
+        samples = np.frombuffer(packet[MEDIA_HEADER_SIZE:], np.int16)
+        assert len(samples) == 1024
+        heard[tuple(host for host, _ in dests)] = int(samples[0])
+    assert heard == {("10.0.0.1",): 300, ("10.0.0.2",): 1000, ("10.0.0.3", "10.0.0.4"): 1300}
+    print(f"✓ Three mixes for four listeners: {heard}")
+    
+    server.process_control_message(
+        "client-3", b'{"type": "audio_mix", "stream_id": 1, "muted": true}\n')
+    packet = MediaHeader(stream_id=2, sequence=1, timestamp=1024,
+                         payload_type=1).pack() + np.full(1024, 300, np.int16).tobytes()
+    server.buffer_audio_packet(packet, ("10.0.0.2", 50001))
+    packet = MediaHeader(stream_id=1, sequence=1, timestamp=1024,
+                         payload_type=1).pack() + np.full(1024, 1000, np.int16).tobytes()
+    server.buffer_audio_packet(packet, ("10.0.0.1", 50001))
+    heard = {
+        tuple(host for host, _ in dests): int(np.frombuffer(packet[MEDIA_HEADER_SIZE:], np.int16)[0])
+        for packet, dests in server.mix_pending_audio()
+    }
+    assert heard == {("10.0.0.1", "10.0.0.4"): 300, ("10.0.0.2",): 1000, ("10.0.0.3",): 1300}
+    assert server.mix_sequence == 2
+    print(f"✓ A listener's mute changes only its own mix: {heard}")
+    
+    # Both senders stop: their last frames are concealed, fading out, then the mix stops
+    levels = []
+    for _ in range(4):
+        heard = {
+            host: int(np.frombuffer(packet[MEDIA_HEADER_SIZE:], np.int16)[0])
+            for packet, dests in server.mix_pending_audio() for host, _ in dests
+        }
+        levels.append(heard.get("10.0.0.3", 0))
+    assert levels == [650, 325, 162, 0]
+    stats = server.get_audio_stats()['jitter'][2]
+    assert stats['played'] == 2 and stats['concealed'] == 3 and stats['underruns'] == 4
+    print(f"✓ Gaps concealed from the jitter buffer: {levels}, {stats}")
+    
+    for a, b in conns:
+        a.close()
+        b.close()
+    
+    print("✓ Mix-minus test PASSED")
+    return True
+
+
+def test_audio_codec_negotiation():
+    """Test that clients get the audio codec they negotiated at join"""
+    print("\nTesting audio codec negotiation...")
+    
+    server = CollaborationServer(make_config(15530, "threaded", audio={
+        "jitter_target_frames": 1, "codecs": ["ulaw", "adpcm", "pcm16"]
+    }))
+    conns = [socket.socketpair() for _ in range(4)]
+    offers = (["adpcm", "ulaw"], ["ulaw"], None, ["opus"])
+    for i, ((conn, _), offer) in enumerate(zip(conns, offers)):
+        server.register_client(f"client-{i}", f"User{i}", (f"10.0.0.{i + 1}", 40000), conn, offer)
+    codecs = [json.loads(server.build_connect_response(f"client-{i}"))['audio_codec'] for i in range(4)]
+    assert codecs == ["adpcm", "ulaw", "pcm16", "pcm16"]
+    print(f"✓ First offered codec the server allows, else PCM16: {codecs}")
+    
+    # An ADPCM and a PCM16 sender; every listener hears the other in its own codec
+    t = np.arange(1024) / 44100
+    tone = (6000 * np.sin(2 * np.pi * 440 * t)).astype(np.int16)
+    payload = CompressionUtils.encode_adpcm(tone.tobytes())
+    packet = MediaHeader(stream_id=1, sequence=0, timestamp=0,
+                         payload_type=PAYLOAD_IMA_ADPCM).pack() + payload
+    server.buffer_audio_packet(packet, ("10.0.0.1", 50001))
+    packet = MediaHeader(stream_id=3, sequence=0, timestamp=0,
+                         payload_type=PAYLOAD_PCM16).pack() + np.zeros(1024, np.int16).tobytes()
+    server.buffer_audio_packet(packet, ("10.0.0.3", 50001))
+    
+    heard = {}
+    for packet, dests in server.mix_pending_audio():
+        header = MediaHeader.unpack(packet)
+        pcm = CompressionUtils.decode_audio(packet[MEDIA_HEADER_SIZE:], header.payload_type)
+        for host, _ in dests:
+            heard[host] = (header.payload_type, len(packet) - MEDIA_HEADER_SIZE,
+                           np.frombuffer(pcm, np.int16))
+    assert {host: kind for host, (kind, _, _) in heard.items()} == {
+        "10.0.0.1": PAYLOAD_IMA_ADPCM, "10.0.0.2": PAYLOAD_ULAW,
+        "10.0.0.3": PAYLOAD_PCM16, "10.0.0.4": PAYLOAD_PCM16
+    }
+    assert heard["10.0.0.1"][1] == 578 and heard["10.0.0.2"][1] == 1024
+    assert heard["10.0.0.4"][1] == 2048
+    for host in ("10.0.0.2", "10.0.0.3"):
+        error = heard[host][2].astype(np.float64) - tone
+        assert np.sqrt(np.mean(error ** 2)) < 200
+    print(f"✓ Mixes encoded per listener codec: {sorted((h, v[1]) for h, v in heard.items())}")
+    
+    for a, b in conns:
+        a.close()
+        b.close()
+    
+    print("✓ Audio codec negotiation test PASSED")
+    return True
+
+
+if __name__ == "__main__":
+    print("=== Server Tests ===\n")
+    
+    test1 = test_async_server()
+    test2 = test_outbound_queue()
+    test3 = test_slow_consumer_isolation()
+    test4 = test_routing_table()
+    test5 = test_nack_retransmit()
+    test6 = test_simulcast_relay()
+    test7 = test_selective_forwarding()
+    test8 = test_last_n_speakers()
+    test9 = test_frame_rate_caps()
+    test10 = test_transcoding()
+    test11 = test_mix_minus()
+    test12 = test_audio_codec_negotiation()
+    
+    print("\n=== Test Summary ===")
+    print(f"Asyncio Server: {'✓ PASS' if test1 else '❌ FAIL'}")
+    print(f"Outbound Queue: {'✓ PASS' if test2 else '❌ FAIL'}")
+    print(f"Slow Consumer Isolation: {'✓ PASS' if test3 else '❌ FAIL'}")
+    print(f"Routing Table: {'✓ PASS' if test4 else '❌ FAIL'}")
+    print(f"Relay Retransmission: {'✓ PASS' if test5 else '❌ FAIL'}")
+    print(f"Simulcast Relay: {'✓ PASS' if test6 else '❌ FAIL'}")
+    print(f"Selective Forwarding: {'✓ PASS' if test7 else '❌ FAIL'}")
+    print(f"Last-N Speakers: {'✓ PASS' if test8 else '❌ FAIL'}")
+    print(f"Frame Rate Caps: {'✓ PASS' if test9 else '❌ FAIL'}")
+    print(f"Relay Transcoding: {'✓ PASS' if test10 else '❌ FAIL'}")
+    print(f"Mix-Minus Audio: {'✓ PASS' if test11 else '❌ FAIL'}")
+    print(f"Audio Codec Negotiation: {'✓ PASS' if test12 else '❌ FAIL'}")
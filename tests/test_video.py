@@ -5,7 +5,66 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import cv2
 import time
-from src.video_conferencing import VideoCapture, VideoStreamer
+import socket
+import threading
+import numpy as np
+from src.video_conferencing import VideoCapture, VideoStreamer, FrameAssembler, VideoPipeline, FrameHub
+from src.utils.media_header import MediaHeader, MEDIA_HEADER_SIZE, FLAG_KEYFRAME, peek_stream_id
+from src.utils.pacing import TokenBucket, Pacer
+from src.utils.retransmit import parse_nack
+from src.video_conferencing.rate_control import BitrateController, ReceiverReport
+from src.video_conferencing.tile_coder import TileEncoder, TileDecoder
+from src.video_conferencing.video_stream import reduced_decode_flag
+from src.video_conferencing.frame_hub import FrameRing
+from src.utils.feedback import LayerRequest
+from src.utils.simulcast import layer_for_display
+
+
+class PacketLog:
+    """Collects datagrams instead of sending them"""
+    def __init__(self):
+        self.packets = []
+    
+    def sendto(self, packet, address):
+        self.packets.append(packet)
+
+
+class FakeCapture:
+    """Delivers the given frames (arrays or camera JPEGs) in order, then nothing"""
+    resolution = (640, 480)
+    
+    def __init__(self, frames):
+        self.frames = list(frames)
+    
+    def read(self):
+        time.sleep(0.005)
+        if not self.frames:
+            return None
+        return self.frames.pop(0)
+
+
+class FakeDevice:
+    """Stands in for cv2.VideoCapture: records properties, fills the buffer it is given"""
+    def __init__(self, limit=0):
+        self.props = {}
+        self.count = 0
+        self.limit = limit
+        self.allocations = 0
+    
+    def set(self, prop, value):
+        self.props[prop] = value
+    
+    def read(self, image=None):
+        if self.count == self.limit:
+            time.sleep(0.01)
+            return False, None
+        self.count += 1
+        if image is None:
+            self.allocations += 1
+            image = np.empty((240, 320, 3), np.uint8)
+        image[:] = self.count % 256
+        time.sleep(0.001)
+        return True, image
 
 def test_video_capture():
     """Test video capture functionality"""
@@ -92,13 +151,680 @@ def test_video_streaming():
         return False
 
 
+def test_media_header():
+    """Test media header packing and stream ID routing over loopback"""
+    print("\nTesting media header...")
+    
+    header = MediaHeader(stream_id=7, sequence=42, timestamp=123456, frame_id=3,
+                         chunk_index=1, chunk_count=2, flags=FLAG_KEYFRAME)
+    packed = header.pack()
+    assert len(packed) == MEDIA_HEADER_SIZE == 24
+    assert MediaHeader.unpack(packed + b'payload') == header
+    assert peek_stream_id(packed) == 7
+    assert MediaHeader.unpack(b'short') is None
+    print(f"✓ Header round trip ({MEDIA_HEADER_SIZE} bytes)")
+    
+    receiver = VideoStreamer()
+    receiver.setup_receiver('127.0.0.1', 0)
+    sender = VideoStreamer(quality=80, stream_id=7)
+    sender.setup_sender()
+    
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    sender.send_frame(frame, receiver.sock.getsockname())
+    
+    result = None
+    for _ in range(10):
+        result = receiver.receive_frame()
+        if result is not None:
+            break
+    
+    sender.close()
+    receiver.close()
+    
+    if result is None or result[0] != 7 or result[1].shape != frame.shape:
+        print("❌ Media header test FAILED")
+        return False
+    
+    print("✓ Frame received with sender stream ID")
+    print("✓ Media header test PASSED")
+    return True
+
+
+def test_frame_assembler():
+    """Test interleaved multi-sender reassembly, eviction and late chunks"""
+    print("\nTesting frame assembler...")
+    
+    assembler = FrameAssembler(timeout=0.5)
+    
+    def chunk(stream_id, frame_id, index, count):
+        return MediaHeader(stream_id=stream_id, sequence=0, timestamp=0, frame_id=frame_id,
+                           chunk_index=index, chunk_count=count)
+    
+    # Three senders, three chunks each, interleaved and out of order
+    completed = []
+    for index in (2, 0, 1):
+        for stream_id in (1, 2, 3):
+            result = assembler.add(chunk(stream_id, 1, index, 3), bytes([stream_id, index]), now=0.0)
+            if result:
+                completed.append(result)
+    
+    assert [h.stream_id for h, _ in completed] == [1, 2, 3]
+    assert all(data == bytes([h.stream_id, 0, h.stream_id, 1, h.stream_id, 2])
+               for h, data in completed)
+    print("✓ Interleaved frames from 3 senders reassembled")
+    
+    # A partial frame expires after its deadline
+    assert assembler.add(chunk(1, 2, 0, 2), b'a', now=1.0) is None
+    assembler.evict(now=1.6)
+    assert assembler.get_stats()['dropped'] == 1
+    print("✓ Stale partial frame evicted")
+    
+    # Chunks of a frame older than the last emitted one are late
+    assert assembler.add(chunk(2, 3, 0, 1), b'x', now=2.0) is not None
+    assert assembler.add(chunk(2, 2, 0, 1), b'y', now=2.0) is None
+    stats = assembler.get_stats()
+    assert stats['completed'] == 4 and stats['late'] == 1
+    print(f"✓ Counters: {stats}")
+    
+    print("✓ Frame assembler test PASSED")
+    return True
+
+
+def test_packetizer_pacing():
+    """Test MTU-sized packets and token bucket pacing"""
+    print("\nTesting packetizer and pacer...")
+    
+    bucket = TokenBucket(rate=10000, burst=3000)
+    assert bucket.reserve(1200, now=bucket.last) == 0.0
+    assert bucket.reserve(1200, now=bucket.last) == 0.0
+    delay = bucket.reserve(1200, now=bucket.last)
+    assert abs(delay - 0.06) < 1e-9
+    print(f"✓ Token bucket delays packets past the burst ({delay * 1000:.0f} ms)")
+    
+    class VirtualClock:
+        """Time that only passes while the pacer sleeps"""
+        def __init__(self):
+            self.now = 0.0
+        
+        def __call__(self):
+            return self.now
+        
+        def sleep(self, delay):
+            self.now += delay
+    
+    clock = VirtualClock()
+    pacer = Pacer(fps=30, burst=12000, clock=clock, sleep=clock.sleep)
+    pacer.start_frame(50 * (MEDIA_HEADER_SIZE + 1200))
+    for _ in range(50):
+        pacer.wait(MEDIA_HEADER_SIZE + 1200)
+    assert pacer.max_burst <= 12000 + MEDIA_HEADER_SIZE + 1200
+    assert clock.now <= pacer.interval * pacer.spread
+    print(f"✓ Pacer bursts at most {pacer.max_burst} bytes and drains a frame in "
+          f"{clock.now * 1000:.1f} ms")
+    
+    receiver = VideoStreamer()
+    receiver.setup_receiver('127.0.0.1', 0)
+    sender = VideoStreamer(quality=95, stream_id=3, fps=30)
+    sender.setup_sender()
+    
+    frame = np.random.default_rng(0).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    start = time.monotonic()
+    sender.send_frame(frame, receiver.sock.getsockname())
+    elapsed = time.monotonic() - start
+    
+    sizes = []
+    receiver.sock.settimeout(0.5)
+    try:
+        while len(sizes) < sender.packets_sent:
+            sizes.append(len(receiver.sock.recvfrom(65536)[0]))
+    except OSError:
+        pass
+    
+    stats = sender.get_stats()
+    sender.close()
+    receiver.close()
+    
+    assert stats['packets_sent'] > 10
+    assert max(sizes) <= MEDIA_HEADER_SIZE + 1200
+    print(f"✓ {stats['packets_sent']} packets of at most {max(sizes)} bytes in {elapsed * 1000:.1f} ms")
+    
+    print("✓ Packetizer and pacer test PASSED")
+    return True
+
+
+def test_fec_recovery():
+    """Test rebuilding lost packets from XOR parity"""
+    print("\nTesting FEC recovery...")
+    
+    sender = VideoStreamer(stream_id=5, pacing=False, fec_group_size=4)
+    sender.sock = PacketLog()
+    payload = bytes(range(256)) * 40  # 10240 bytes -> 9 data packets, 3 groups
+    sender.send_payload(payload, None, FLAG_KEYFRAME)
+    
+    packets = sender.sock.packets
+    assert sender.fec_packets_sent == 3 and len(packets) == 12
+    print(f"✓ {len(packets) - 3} data + 3 parity packets")
+    
+    # Lose one data packet in every group, including the short last one
+    lost = {0, 6, 10}
+    assembler = FrameAssembler()
+    result = None
+    for index, packet in enumerate(packets):
+        if index not in lost:
+            result = assembler.add(MediaHeader.unpack(packet), packet[MEDIA_HEADER_SIZE:]) or result
+    
+    assert result is not None and result[1] == payload
+    assert assembler.get_stats()['recovered'] == 3
+    print("✓ Frame rebuilt without retransmission")
+    
+    # Two losses in one group cannot be repaired
+    assembler = FrameAssembler()
+    result = None
+    for index, packet in enumerate(packets):
+        if index not in (0, 1):
+            result = assembler.add(MediaHeader.unpack(packet), packet[MEDIA_HEADER_SIZE:]) or result
+    assert result is None
+    print("✓ Double loss in a group left incomplete")
+    
+    print("✓ FEC recovery test PASSED")
+    return True
+
+
+def test_nack_repair():
+    """Test NACKing a lost packet and completing the frame from the resend"""
+    print("\nTesting NACK retransmission...")
+    
+    sender = VideoStreamer(quality=95, stream_id=4, pacing=False)
+    sender.sock = PacketLog()
+    frame = np.random.default_rng(1).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    sender.send_frame(frame, None)
+    packets = sender.sock.packets
+    assert len(packets) > 3
+    
+    relay = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    relay.bind(('127.0.0.1', 0))
+    relay.settimeout(1.0)
+    receiver = VideoStreamer()
+    receiver.setup_receiver('127.0.0.1', 0)
+    address = receiver.sock.getsockname()
+    
+    # Packet 2 is lost on the way
+    for index, packet in enumerate(packets):
+        if index != 2:
+            relay.sendto(packet, address)
+    assert receiver.receive_frame() is None
+    
+    stream_id, sequences = parse_nack(relay.recvfrom(65536)[0])
+    assert (stream_id, sequences) == (4, [2])
+    print("✓ Receiver NACKed the missing sequence number")
+    
+    relay.sendto(packets[2], address)
+    result = receiver.receive_frame()
+    stats = receiver.nacks.get_stats()
+    
+    relay.close()
+    receiver.close()
+    
+    assert result is not None and result[0] == 4 and result[1].shape == frame.shape
+    assert stats['repaired_packets'] == 1
+    print(f"✓ Frame completed from the resent packet: {stats}")
+    
+    print("✓ NACK retransmission test PASSED")
+    return True
+
+
+def test_bitrate_controller():
+    """Test receiver reports driving the quality/resolution/fps ladder"""
+    print("\nTesting adaptive bitrate...")
+    
+    controller = BitrateController(quality=80, fps=30)
+    lossy = ReceiverReport(stream_id=1, reporter_id=2, fraction_lost=0.2,
+                           jitter_ms=10, throughput_kbps=1000)
+    clean = lossy._replace(fraction_lost=0.0)
+    
+    assert controller.on_report(lossy, 1000, now=10.0)
+    assert not controller.on_report(lossy, 1000, now=10.5)  # Held after a change
+    assert controller.on_report(lossy, 1000, now=11.0)
+    assert controller.level == 2 and controller.current.quality < 80
+    print(f"✓ Loss stepped down to {controller.current}")
+    
+    assert not controller.on_report(clean, 1000, now=14.0)
+    assert controller.on_report(clean, 1000, now=16.5)
+    assert controller.level == 1
+    print(f"✓ Clean reports stepped back up after the hold: {controller.get_stats()['decisions']}")
+    
+    assert abs(ReceiverReport.unpack(lossy.pack()).fraction_lost - 0.2) < 1e-4
+    print("✓ Report round trip")
+    
+    # Reports flow from a receiver back to the sender over loopback
+    receiver = VideoStreamer(stream_id=2, abr=True, report_interval=0.05)
+    receiver.setup_receiver('127.0.0.1', 0)
+    sender = VideoStreamer(quality=80, stream_id=1, abr=True)
+    sender.setup_sender()
+    
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    for _ in range(5):
+        sender.send_frame(frame, receiver.sock.getsockname())
+        receiver.receive_frame()
+        time.sleep(0.05)
+    sender.poll_feedback()
+    stats = sender.get_stats()['abr']
+    assert stats['receivers'] == 1 and stats['level'] == 0
+    print(f"✓ Sender controller received reports: {stats}")
+    
+    # A gallery tile getting 150 kbps of layer 2 is no bottleneck while the
+    # sender sends 3000 kbps in layer 0 and 150 kbps in layer 2
+    sender.simulcast_layers = 3
+    now = time.monotonic()
+    sender.rate_marks = [(now - 1.0, 0)] * len(sender.rate_marks)
+    sender.layer_bytes_sent = [375000, 75000, 18750] + sender.layer_bytes_sent[3:]
+    tile = ReceiverReport(stream_id=1, reporter_id=3, fraction_lost=0.0,
+                          jitter_ms=0, throughput_kbps=150, layer=2)
+    receiver.sock.sendto(tile.pack(), ('127.0.0.1', sender.sock.getsockname()[1]))
+    time.sleep(0.05)
+    sender.poll_feedback()
+    stats = sender.get_stats()['abr']
+    assert stats['receivers'] == 2 and stats['level'] == 0
+    print("✓ A simulcast layer's report is compared with that layer's send rate")
+    
+    sender.close()
+    receiver.close()
+    
+    print("✓ Adaptive bitrate test PASSED")
+    return True
+
+
+def test_tile_coding():
+    """Test sending only changed tiles between keyframes"""
+    print("\nTesting tile coding...")
+    
+    encoder = TileEncoder(tile_size=32, threshold=6.0, keyframe_interval=2.0)
+    decoder = TileDecoder()
+    frame = cv2.GaussianBlur(
+        np.random.default_rng(2).integers(0, 255, (240, 320, 3), dtype=np.uint8), (0, 0), 3
+    )
+    
+    payload, keyframe = encoder.encode(frame, now=0.0)
+    assert keyframe
+    decoder.keyframe(1, cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR))
+    full_size = len(payload)
+    
+    assert encoder.encode(frame, now=0.1) is None
+    print("✓ Unchanged frame not sent")
+    
+    moved = frame.copy()
+    cv2.rectangle(moved, (100, 100), (150, 150), (255, 255, 255), -1)
+    payload, keyframe = encoder.encode(moved, now=0.2)
+    assert not keyframe and len(payload) < full_size / 4
+    assert encoder.tiles_sent == 4
+    print(f"✓ Delta frame: {encoder.tiles_sent} tiles, {len(payload)} vs {full_size} bytes")
+    
+    shown = decoder.decode(1, payload)
+    assert shown.shape == moved.shape
+    assert np.abs(shown[100:150, 100:150].astype(int) - 255).mean() < 10
+    assert TileDecoder().decode(1, payload) is None
+    print("✓ Receiver patched tiles onto its picture (and waits for a keyframe otherwise)")
+    
+    assert encoder.encode(moved, now=2.5)[1]
+    print("✓ Periodic keyframe refresh")
+    
+    print("✓ Tile coding test PASSED")
+    return True
+
+
+def test_video_pipeline():
+    """Test that pooled encoding keeps frames in capture order"""
+    print("\nTesting capture/encode/send pipeline...")
+    
+    streamer = VideoStreamer(stream_id=3, pacing=False, nack=False)
+    streamer.sock = PacketLog()
+    shown = []
+    frames = [np.full((240, 320, 3), 10 + i * 20, np.uint8) for i in range(10)]
+    pipeline = VideoPipeline(FakeCapture(frames), streamer, None, workers=3,
+                             queue_size=16, on_frame=shown.append)
+    pipeline.start()
+    deadline = time.time() + 5.0
+    while pipeline.frames_sent < 10 and time.time() < deadline:
+        time.sleep(0.05)
+    pipeline.stop()
+    assert len(shown) == 10
+    print(f"✓ {pipeline.workers} encoder workers, local preview saw every frame")
+    
+    frames = {}
+    for packet in streamer.sock.packets:
+        header = MediaHeader.unpack(packet)
+        frames.setdefault(header.frame_id, []).append(packet[MEDIA_HEADER_SIZE:])
+    levels = []
+    for frame_id in sorted(frames):
+        image = cv2.imdecode(np.frombuffer(b''.join(frames[frame_id]), np.uint8), cv2.IMREAD_COLOR)
+        levels.append(int(round((image.mean() - 10) / 20)))
+    assert levels == list(range(10))
+    print("✓ Frames sent in capture order")
+    
+    stats = pipeline.get_stats()
+    assert stats['frames_sent'] == 10 and stats['queued'] == 0
+    assert all(stats[stage]['avg_ms'] >= 0 for stage in ('capture', 'backpressure', 'encode', 'queue_wait', 'send', 'latency'))
+    print(f"✓ Stage timing: encode {stats['encode']['avg_ms']} ms, latency {stats['latency']['avg_ms']} ms")
+    
+    print("✓ Video pipeline test PASSED")
+    return True
+
+
+def test_reduced_decode():
+    """Test decoding small gallery tiles at reduced JPEG resolution"""
+    print("\nTesting reduced-resolution decode...")
+    
+    assert reduced_decode_flag((640, 480), (640, 480)) == (1, cv2.IMREAD_COLOR)
+    assert reduced_decode_flag((640, 480), (320, 300)) == (2, cv2.IMREAD_REDUCED_COLOR_2)
+    assert reduced_decode_flag((1280, 720), (160, 160)) == (8, cv2.IMREAD_REDUCED_COLOR_8)
+    print("✓ Largest factor that still covers the shown size chosen")
+    
+    frame = cv2.GaussianBlur(
+        np.random.default_rng(3).integers(0, 255, (480, 640, 3), dtype=np.uint8), (0, 0), 3
+    )
+    data = cv2.imencode('.jpg', frame)[1].tobytes()
+    receiver = VideoStreamer()
+    
+    assert receiver.decode_jpeg(7, data).shape == (480, 640, 3)
+    receiver.set_display_size(7, (160, 120))
+    start = time.perf_counter()
+    small = receiver.decode_jpeg(7, data)
+    reduced_time = time.perf_counter() - start
+    assert small.shape == (120, 160, 3) and receiver.reduced_decodes == 1
+    assert receiver.source_sizes[7] == (640, 480)
+    print(f"✓ 4x4 gallery tile decoded at {small.shape[1]}x{small.shape[0]} "
+          f"in {reduced_time * 1000:.2f} ms")
+    
+    receiver.tile_streams.add(7)
+    assert receiver.decode_jpeg(7, data).shape == (480, 640, 3)
+    receiver.set_display_size(7, None)
+    assert 7 not in receiver.source_sizes and 7 not in receiver.tile_streams
+    print("✓ Tile-coded streams stay full size, departed senders forgotten")
+    
+    print("✓ Reduced decode test PASSED")
+    return True
+
+
+def test_mjpeg_passthrough():
+    """Test sending camera JPEGs without decoding and re-encoding them"""
+    print("\nTesting MJPEG passthrough...")
+    
+    frame = cv2.GaussianBlur(
+        np.random.default_rng(4).integers(0, 255, (480, 640, 3), dtype=np.uint8), (0, 0), 3
+    )
+    jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+    
+    capture = VideoCapture(passthrough=True)
+    capture.capture = FakeDevice()
+    raw = np.frombuffer(jpeg, np.uint8).reshape(1, -1)
+    assert capture._compressed(raw) == jpeg
+    assert capture._compressed(frame) is frame and not capture.passthrough
+    assert capture.capture.props[cv2.CAP_PROP_CONVERT_RGB] == 1
+    print("✓ Raw MJPEG kept compressed, decoded frames fall back")
+    
+    streamer = VideoStreamer(quality=80, stream_id=6, pacing=False, nack=False)
+    assert streamer.encode_compressed(jpeg, 80)[0] is jpeg
+    smaller = streamer.encode_compressed(jpeg, 60, 0.5)[0]
+    assert cv2.imdecode(np.frombuffer(smaller, np.uint8), cv2.IMREAD_COLOR).shape == (240, 320, 3)
+    print("✓ Re-encoded only when rate control lowers quality or resolution")
+    
+    streamer.sock = PacketLog()
+    previews = []
+    pipeline = VideoPipeline(FakeCapture([jpeg] * 3), streamer, None, on_frame=previews.append)
+    pipeline.preview_size = (160, 120)
+    pipeline.start()
+    deadline = time.time() + 5.0
+    while pipeline.frames_sent < 3 and time.time() < deadline:
+        time.sleep(0.05)
+    pipeline.stop()
+    
+    first = MediaHeader.unpack(streamer.sock.packets[0]).frame_id
+    sent = b''.join(packet[MEDIA_HEADER_SIZE:] for packet in streamer.sock.packets
+                    if MediaHeader.unpack(packet).frame_id == first)
+    assert sent == jpeg and pipeline.frames_sent == 3
+    assert previews[0].shape == (120, 160, 3)
+    print(f"✓ Camera JPEG sent byte for byte, preview decoded at {previews[0].shape[1]}x{previews[0].shape[0]}")
+    
+    print("✓ MJPEG passthrough test PASSED")
+    return True
+
+
+def test_frame_hub():
+    """Test several consumers sharing captured frames without stealing them"""
+    print("\nTesting frame hub...")
+    
+    hub = FrameHub()
+    encoder = hub.subscribe()
+    preview = hub.subscribe()
+    frames = [np.full((48, 64, 3), i, np.uint8) for i in range(1, 6)]
+    
+    assert encoder.get(timeout=0.01) is None
+    hub.publish(frames[0])
+    sequence, frame = encoder.get()
+    assert sequence == 1 and frame is frames[0] and preview.read() is frames[0]
+    assert not frame.flags.writeable
+    print("✓ Both subscribers got the same frame, shared read-only without a copy")
+    
+    for frame in frames[1:]:
+        hub.publish(frame)
+        assert encoder.read() is frame
+    assert preview.get() == (5, frames[4])
+    assert encoder.get_stats() == {'frames_read': 5, 'frames_skipped': 0}
+    assert preview.get_stats() == {'frames_read': 2, 'frames_skipped': 3}
+    print("✓ Slow subscriber skipped to the latest frame, fast one saw every frame")
+    
+    def publish_later():
+        time.sleep(0.05)
+        hub.publish(frames[0])
+    
+    threading.Thread(target=publish_later, daemon=True).start()
+    assert encoder.get(timeout=1.0)[0] == 6
+    hub.close()
+    assert encoder.get(timeout=1.0) is None
+    print("✓ Waiting subscriber woken by publish and by close")
+    
+    print("✓ Frame hub test PASSED")
+    return True
+
+
+def test_frame_ring():
+    """Test capture into a ring of preallocated, reference-counted buffers"""
+    print("\nTesting preallocated frame ring...")
+    
+    ring = FrameRing((48, 64, 3), slots=2)
+    first = ring.acquire()
+    view = first[10:20]
+    second = ring.acquire()
+    assert first is ring.slots[0] and second is ring.slots[1]
+    ring.acquire()
+    assert ring.misses == 1
+    del first
+    assert ring.acquire() is not ring.slots[0]
+    del view
+    assert ring.acquire() is ring.slots[0]
+    print("✓ Slots reused only once no frame or view references them")
+    
+    capture = VideoCapture(buffers=4)
+    capture.capture = FakeDevice(200)
+    capture.running = True
+    reader = threading.Thread(target=capture._capture_loop, daemon=True)
+    reader.start()
+    
+    seen = set()
+    deadline = time.time() + 5.0
+    while capture.capture.count < 200 and time.time() < deadline:
+        frame = capture.read()
+        if frame is not None and int(frame[0, 0, 0]) != 1:
+            seen.add(id(frame))
+            assert not frame.flags.writeable
+    capture.running = False
+    reader.join(timeout=1.0)
+    
+    stats = capture.get_stats()
+    assert capture.capture.allocations == 1 and stats['ring_misses'] == 0
+    assert seen <= {id(slot) for slot in capture.ring.slots}
+    print(f"✓ {stats['frames_captured']} frames captured with one allocation: {stats}")
+    
+    print("✓ Frame ring test PASSED")
+    return True
+
+
+def test_simulcast():
+    """Test encoding simulcast layers and asking the relay for the one shown"""
+    print("\nTesting simulcast layers...")
+    
+    frame = cv2.GaussianBlur(
+        np.random.default_rng(5).integers(0, 255, (480, 640, 3), dtype=np.uint8), (0, 0), 3
+    )
+    sender = VideoStreamer(quality=80, stream_id=4, fps=30, simulcast_layers=3)
+    layers = sender.encode_layers(frame, 80)
+    shapes = [cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR).shape
+              for payload, _, _, _ in layers]
+    assert [layer for _, _, _, layer in layers] == [0, 1, 2]
+    assert shapes == [(480, 640, 3), (240, 320, 3), (120, 160, 3)]
+    assert all(flags & FLAG_KEYFRAME for _, flags, _, _ in layers)
+    
+    jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+    passthrough = sender.encode_layers(jpeg, 80)
+    assert passthrough[0][0] is jpeg and len(passthrough) == 3
+    print(f"✓ Layers {[s[1] for s in shapes]} wide, camera JPEG kept as layer 0")
+    
+    receiver = VideoStreamer()
+    receiver.setup_receiver('127.0.0.1', 0)
+    sender.setup_sender()
+    start = time.monotonic()
+    sender.send_layers(layers, receiver.sock.getsockname())
+    elapsed = time.monotonic() - start
+    
+    headers = []
+    receiver.sock.settimeout(0.5)
+    try:
+        while len(headers) < sender.packets_sent:
+            headers.append(MediaHeader.unpack(receiver.sock.recvfrom(65536)[0]))
+    except OSError:
+        pass
+    sender.close()
+    receiver.close()
+    
+    for layer in range(3):
+        sequences = [h.sequence for h in headers if h.layer == layer]
+        assert sequences == list(range(len(sequences)))
+    assert elapsed < 1.0 / 30
+    print(f"✓ {len(headers)} packets, sequence numbers per layer, "
+          f"all layers paced within one frame interval ({elapsed * 1000:.1f} ms)")
+    
+    assert layer_for_display((640, 480), (640, 480)) == 0
+    assert layer_for_display((640, 480), (200, 150)) == 1
+    assert layer_for_display((640, 480), (160, 120)) == 2
+    
+    receiver = VideoStreamer(stream_id=9)
+    receiver.set_display_size(4, (160, 120))
+    small = cv2.imencode('.jpg', frame[::2, ::2])[1].tobytes()
+    receiver.decode_jpeg(4, small, layer=1)
+    assert receiver.wanted_layers[4] == 2
+    
+    receiver.sock = PacketLog()
+    receiver.feedback_addr = ('127.0.0.1', 5000)
+    receiver.send_feedback()
+    receiver.send_feedback()
+    assert [LayerRequest.unpack(p) for p in receiver.sock.packets] == [LayerRequest(4, 9, 2)]
+    receiver.set_display_size(4, None)
+    assert 4 not in receiver.wanted_layers
+    print("✓ Receiver asks once for the smallest layer that fills its video box")
+    
+    print("✓ Simulcast test PASSED")
+    return True
+
+
+def test_skipped_frames():
+    """Test that frames the relay skips on purpose are not NACKed or counted as lost"""
+    print("\nTesting relay-skipped frames...")
+    
+    frame = np.random.default_rng(6).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+    
+    def packets(stream_id, sequence, frame_id, layer=0):
+        """A two-chunk keyframe starting at sequence"""
+        half = len(jpeg) // 2
+        return [
+            MediaHeader(stream_id=stream_id, sequence=sequence + i, timestamp=frame_id * 33,
+                        frame_id=frame_id, chunk_index=i, chunk_count=2,
+                        flags=FLAG_KEYFRAME, layer=layer).pack() + part
+            for i, part in enumerate((jpeg[:half], jpeg[half:]))
+        ]
+    
+    relay = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    relay.bind(('127.0.0.1', 0))
+    relay.settimeout(0.2)
+    receiver = VideoStreamer(stream_id=9)
+    receiver.setup_receiver('127.0.0.1', 0)
+    receiver.thinned_streams = {5}
+    address = receiver.sock.getsockname()
+    
+    def deliver(sent):
+        for packet in sent:
+            relay.sendto(packet, address)
+        for _ in sent:
+            receiver.receive_frame()
+    
+    # Capped stream 5: the relay skipped frames 1 and 2
+    deliver(packets(5, 0, 0) + packets(5, 6, 3))
+    # Stream 6 switched to layer 2 and back to layer 0
+    deliver(packets(6, 0, 0) + packets(6, 0, 1, layer=2) + packets(6, 10, 5))
+    
+    assert not receiver.nacks.missing and receiver.loss.lost == 0
+    print(f"✓ Thinned frames and layer switches not NACKed: {receiver.loss.get_stats()}")
+    
+    # A real loss inside a frame is still repaired
+    deliver(packets(5, 8, 4)[1:])
+    assert (5, 0, 8) in receiver.nacks.missing and receiver.loss.lost == 1
+    assert receiver.loss.stream_stats(5)['packets_lost'] == 1
+    assert receiver.loss.stream_stats(6)['packets_lost'] == 0
+    print(f"✓ Chunk lost inside a frame still NACKed, counted for its stream only: "
+          f"{receiver.loss.get_stats()['loss_by_stream']}")
+    
+    relay.close()
+    receiver.close()
+    
+    print("✓ Skipped frames test PASSED")
+    return True
+
+
 if __name__ == "__main__":
     print("=== Video Module Tests ===\n")
     
     test1 = test_video_capture()
     test2 = test_video_streaming()
+    test3 = test_media_header()
+    test4 = test_frame_assembler()
+    test5 = test_packetizer_pacing()
+    test6 = test_fec_recovery()
+    test7 = test_nack_repair()
+    test8 = test_bitrate_controller()
+    test9 = test_tile_coding()
+    test10 = test_video_pipeline()
+    test11 = test_reduced_decode()
+    test12 = test_mjpeg_passthrough()
+    test13 = test_frame_hub()
+    test14 = test_frame_ring()
+    test15 = test_simulcast()
+    test16 = test_skipped_frames()
     
     print("\n=== Test Summary ===")
     print(f"Video Capture: {'✓ PASS' if test1 else '❌ FAIL'}")
     print(f"Video Streaming: {'✓ PASS' if test2 else '❌ FAIL'}")
+    print(f"Media Header: {'✓ PASS' if test3 else '❌ FAIL'}")
+    print(f"Frame Assembler: {'✓ PASS' if test4 else '❌ FAIL'}")
+    print(f"Packetizer/Pacer: {'✓ PASS' if test5 else '❌ FAIL'}")
+    print(f"FEC Recovery: {'✓ PASS' if test6 else '❌ FAIL'}")
+    print(f"NACK Retransmission: {'✓ PASS' if test7 else '❌ FAIL'}")
+    print(f"Adaptive Bitrate: {'✓ PASS' if test8 else '❌ FAIL'}")
+    print(f"Tile Coding: {'✓ PASS' if test9 else '❌ FAIL'}")
+    print(f"Video Pipeline: {'✓ PASS' if test10 else '❌ FAIL'}")
+    print(f"Reduced Decode: {'✓ PASS' if test11 else '❌ FAIL'}")
+    print(f"MJPEG Passthrough: {'✓ PASS' if test12 else '❌ FAIL'}")
+    print(f"Frame Hub: {'✓ PASS' if test13 else '❌ FAIL'}")
+    print(f"Frame Ring: {'✓ PASS' if test14 else '❌ FAIL'}")
+    print(f"Simulcast: {'✓ PASS' if test15 else '❌ FAIL'}")
+    print(f"Skipped Frames: {'✓ PASS' if test16 else '❌ FAIL'}")
 